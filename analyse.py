@@ -1,25 +1,37 @@
+import datetime
 import sqlite3
-from typing import List
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import connections
 import db as database_module
-from counter import get_counter, Counter
+import parallel
+import streaks
+from counter import get_counter, load_counters, Counter
 
 def list_all_habits_details(db_conn: sqlite3.Connection) -> List[Counter]:
-    """Returns a list of Counter objects for all habits."""
-    habit_names = database_module.get_habits_list(db_conn)
-    return [get_counter(db_conn, name) for name in habit_names if get_counter(db_conn, name) is not None]
+    """Returns a list of Counter objects for all habits, preloaded with their completion histories."""
+    return load_counters(db_conn)
 
 def list_habits_by_periodicity_details(db_conn: sqlite3.Connection, periodicity: str) -> List[Counter]:
-    """Returns a list of Counter objects for habits of a given periodicity."""
-    habit_names = database_module.habit_by_periodicity(db_conn, periodicity)
-    return [get_counter(db_conn, name) for name in habit_names if get_counter(db_conn, name) is not None]
+    """Returns a list of Counter objects for habits of a given periodicity, preloaded with their histories."""
+    return load_counters(db_conn, periodicity)
 
 def longest_streak_all_habits(db_conn: sqlite3.Connection) -> int:
-    """Calculates the longest streak among all habits."""
-    all_habit_names = database_module.get_habits_list(db_conn)
-    if not all_habit_names:
-        return 0
-    streaks = [counter.get_longest_streak(db_conn) for name in all_habit_names if (counter := get_counter(db_conn, name))]
-    return max(streaks) if streaks else 0
+    """Calculates the longest streak among all habits, in a process pool for large populations."""
+    all_streaks = parallel.compute_streaks_parallel(db_conn)
+    return max((longest for _, longest in all_streaks.values()), default=0)
+
+def streaks_for_all_habits(db_conn: sqlite3.Connection) -> Dict[int, Tuple[int, int]]:
+    """
+    Returns {habit_id: (current_streak, longest_streak)} for every habit. Above
+    config.PARALLEL_ANALYTICS_THRESHOLD habits they are computed in a process pool (see parallel.py).
+    """
+    return parallel.compute_streaks_parallel(db_conn)
+
+def habit_streak_report(db_conn: sqlite3.Connection) -> List[Tuple[Counter, int, int]]:
+    """Returns (habit, current_streak, longest_streak) for every habit, ordered by name; histories are not loaded."""
+    all_streaks = streaks_for_all_habits(db_conn)
+    return [(counter, *all_streaks.get(counter.habit_id, (0, 0)))
+            for counter in load_counters(db_conn, with_histories=False)]
 
 def calculate_longest_streak_for_habit(db_conn: sqlite3.Connection, name: str) -> int:
     """Calculates the longest streak for a specific habit by name."""
@@ -29,4 +41,113 @@ def calculate_longest_streak_for_habit(db_conn: sqlite3.Connection, name: str) -
 def calculate_current_streak_for_habit(db_conn: sqlite3.Connection, name: str) -> int:
     """Calculates the current streak for a specific habit by name."""
     counter = get_counter(db_conn, name)
-    return counter.get_current_streak(db_conn) if counter else 0
\ No newline at end of file
+    return counter.get_current_streak(db_conn) if counter else 0
+
+# --- Leaderboard ---
+class LeaderboardEntry(NamedTuple):
+    """One row of the streak leaderboard."""
+    name: str
+    periodicity: str
+    streak: int
+
+def streak_leaderboard(db_conn: sqlite3.Connection, limit: int = 10, by: str = "current",
+                       periodicity: Optional[str] = None,
+                       current_system_date: Optional[datetime.datetime] = None) -> List[LeaderboardEntry]:
+    """
+    Returns the top `limit` habits by current or longest streak (`by`), optionally of one periodicity.
+    Reads the indexed leaderboard columns of the persisted streak states instead of recomputing streaks.
+    Current streaks that expired because a period passed without a check-in are demoted first by a sweep,
+    which only visits still-live runs; a demotion is kept, so dates before the last sweep are not answered exactly.
+    """
+    today = current_system_date or datetime.datetime.now()
+    missing = streaks.build_missing_streak_states(db_conn)
+    read_only = connections.is_read_only(db_conn)
+    if not read_only:
+        database_module.sweep_expired_streaks(db_conn, min(today.toordinal(), datetime.date.today().toordinal()))
+    entries = [LeaderboardEntry(row['name'], row['periodicity'], row['streak'])
+               for row in database_module.get_streak_leaderboard(db_conn, limit, by, today.toordinal(), periodicity)]
+    if read_only and missing:
+        # States built on a read-only connection are not persisted, so they are ranked here.
+        for habit_id, state in missing.items():
+            row = database_module.get_habit_details_by_id(db_conn, habit_id)
+            streak = state.longest_run if by == "longest" else streaks.current_streak_from_state(
+                state, row['periodicity'], today, row['interval_days']) or 0
+            if streak and (periodicity is None or row['periodicity'] == periodicity):
+                entries.append(LeaderboardEntry(row['name'], row['periodicity'], streak))
+        entries = sorted(entries, key=lambda entry: (-entry.streak, entry.name))[:limit]
+    return entries
+
+# --- Rollup Analytics ---
+# Date ranges are inclusive at both ends and are answered from the daily/weekly rollup tables.
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+def completion_rate(db_conn: sqlite3.Connection, name: str, start: datetime.date, end: datetime.date) -> float:
+    """
+    Returns the share of the habit's periods (days, weeks, months or every-N-days blocks) between start and end
+    in which it was completed. Weekly habits are counted from weekly_rollup, whose weeks are their periods and
+    which also covers compacted history; the others over the (habit_id, period_key) index and the history bitmap.
+    Periods before the habit was created are not counted.
+    """
+    habit = database_module.get_habit_details_by_name(db_conn, name)
+    if not habit:
+        return 0.0
+    periodicity, interval_days = habit['periodicity'], habit['interval_days']
+    creation_date = datetime.datetime.fromisoformat(habit['creation_date'])
+    first_period = max(streaks.period_of(periodicity, start, interval_days),
+                       streaks.period_of(periodicity, creation_date, interval_days))
+    last_period = streaks.period_of(periodicity, end, interval_days)
+    if last_period < first_period:
+        return 0.0
+    if periodicity == "Weekly":
+        weeks = database_module.get_weekly_rollup(db_conn, habit['id'], first_period, last_period)
+        return len(weeks) / (last_period - first_period + 1)
+    periods = database_module.get_period_keys_for_habit(db_conn, habit['id'], first_period, last_period)
+    bitmap = database_module.get_history_bitmap(db_conn, habit['id'])
+    if bitmap is None:
+        completed = len(periods)
+    else:
+        base_period, mask = streaks.period_bitmap(periodicity, bitmap['base_day'], bitmap['bits'], periods,
+                                                  interval_days)
+        if first_period > base_period:
+            mask >>= first_period - base_period
+        else:
+            mask <<= base_period - first_period
+        completed = bin(mask & ((1 << (last_period - first_period + 1)) - 1)).count("1")
+    return completed / (last_period - first_period + 1)
+
+def completion_heatmap(db_conn: sqlite3.Connection, name: str, start: datetime.date,
+                       end: datetime.date) -> List[Tuple[datetime.date, int]]:
+    """Returns (date, completions) for every day between start and end, including days without completions."""
+    habit_id = database_module.get_habit_id_by_name(db_conn, name)
+    first_day, last_day = streaks.day_ordinal(start), streaks.day_ordinal(end)
+    if not habit_id or last_day < first_day:
+        return []
+    counts = dict(database_module.get_daily_rollup(db_conn, habit_id, first_day, last_day))
+    return [(datetime.date.fromordinal(day), counts.get(day, 0)) for day in range(first_day, last_day + 1)]
+
+def completion_heatmaps(db_conn: sqlite3.Connection, start: datetime.date,
+                        end: datetime.date) -> Dict[str, List[int]]:
+    """
+    Returns {habit name: completions per day from start to end} for every habit in one range scan,
+    e.g. for a dashboard of 365-day heatmaps.
+    """
+    first_day, last_day = streaks.day_ordinal(start), streaks.day_ordinal(end)
+    days = max(0, last_day - first_day + 1)
+    names = {row['id']: row['name'] for row in database_module.get_all_habit_details(db_conn)}
+    heatmaps = {habit_id: [0] * days for habit_id in names}
+    for habit_id, day, completions in database_module.iter_daily_rollups(db_conn, first_day, last_day):
+        heatmaps[habit_id][day - first_day] = completions
+    return {names[habit_id]: counts for habit_id, counts in heatmaps.items()}
+
+def weekday_distribution(db_conn: sqlite3.Connection, name: str, start: Optional[datetime.date] = None,
+                         end: Optional[datetime.date] = None) -> Dict[str, int]:
+    """Returns the number of completions per weekday, Monday first, optionally limited to a date range."""
+    distribution = dict.fromkeys(WEEKDAY_NAMES, 0)
+    habit_id = database_module.get_habit_id_by_name(db_conn, name)
+    if not habit_id:
+        return distribution
+    first_day = streaks.day_ordinal(start) if start else 1
+    last_day = streaks.day_ordinal(end) if end else datetime.date.max.toordinal()
+    for row in database_module.get_weekday_totals(db_conn, habit_id, first_day, last_day):
+        distribution[WEEKDAY_NAMES[row['weekday']]] = row['completions']
+    return distribution
@@ -0,0 +1,104 @@
+"""asyncio facade over Counter and analyse: blocking SQLite work runs on a bounded pool of worker threads."""
+import asyncio
+import datetime
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+
+import analyse
+import config
+import connections
+from counter import Counter, get_counter
+
+if TYPE_CHECKING:
+    from writer import WriteQueue
+
+T = TypeVar("T")
+
+
+class AsyncHabitTracker:
+    """
+    Awaitable versions of the Counter and analyse operations with the same semantics as the sync API.
+    Calls run on at most `max_workers` threads, each with its own connection from a ConnectionManager,
+    so many habits can be processed concurrently with asyncio.gather. Pass a WriteQueue to funnel the
+    writes of all workers through one group-committing connection instead of contending for the lock.
+    """
+
+    def __init__(self, db_path: Union[str, Path, None] = None, max_workers: Optional[int] = None,
+                 profile: Optional[str] = None, writer: Optional["WriteQueue"] = None):
+        self.manager = connections.ConnectionManager(db_path, profile)
+        self.writer = writer
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or config.ASYNC_MAX_WORKERS,
+                                            thread_name_prefix="habit-async")
+
+    def _call(self, func: Callable[..., T], *args) -> T:
+        """Runs func(connection, *args) on the worker's connection, rolling back if it fails midway."""
+        conn = self.manager.connection()
+        try:
+            return func(conn, *args)
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._call, func, *args))
+
+    async def store(self, counter: Counter) -> Counter:
+        """Stores a new habit and returns it with its ID set."""
+        await self._run(lambda conn: counter.store(conn))
+        return counter
+
+    async def get_counter(self, name: str) -> Optional[Counter]:
+        """Returns the habit with the given name, or None."""
+        return await self._run(get_counter, name)
+
+    async def increment(self, counter: Counter, increment_time: Optional[datetime.datetime] = None) -> None:
+        """Records a completion for the habit."""
+        await self._run(lambda conn: counter.increment(conn, increment_time, writer=self.writer))
+
+    async def reset(self, counter: Counter) -> None:
+        """Resets all completion records for the habit."""
+        await self._run(lambda conn: counter.reset(conn, writer=self.writer))
+
+    async def delete(self, counter: Counter) -> None:
+        """Deletes the habit and all its data."""
+        await self._run(lambda conn: counter.delete(conn, writer=self.writer))
+
+    async def get_current_streak(self, counter: Counter,
+                                 current_system_date: Optional[datetime.datetime] = None) -> int:
+        """Returns the habit's current streak."""
+        return await self._run(lambda conn: counter.get_current_streak(conn, current_system_date))
+
+    async def get_longest_streak(self, counter: Counter) -> int:
+        """Returns the habit's longest streak."""
+        return await self._run(lambda conn: counter.get_longest_streak(conn))
+
+    async def list_all_habits_details(self) -> List[Counter]:
+        """Returns all habits, preloaded with their completion histories."""
+        return await self._run(analyse.list_all_habits_details)
+
+    async def list_habits_by_periodicity_details(self, periodicity: str) -> List[Counter]:
+        """Returns the habits of a periodicity, preloaded with their completion histories."""
+        return await self._run(analyse.list_habits_by_periodicity_details, periodicity)
+
+    async def longest_streak_all_habits(self) -> int:
+        """Returns the longest streak among all habits."""
+        return await self._run(analyse.longest_streak_all_habits)
+
+    async def streaks_for_all_habits(self) -> Dict[int, Tuple[int, int]]:
+        """Returns {habit_id: (current_streak, longest_streak)} for every habit."""
+        return await self._run(analyse.streaks_for_all_habits)
+
+    async def close(self) -> None:
+        """Waits for running calls, then closes the worker pool and its connections."""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.manager.close()
+
+    async def __aenter__(self) -> "AsyncHabitTracker":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
@@ -0,0 +1 @@
+"""Synthetic data generation and timed performance scenarios; run with `python -m benchmarks.run`."""
@@ -0,0 +1,123 @@
+"""Seedable generator of synthetic habits and completion histories, written with bulk inserts."""
+import datetime
+import os
+import random
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import config
+import connections
+import db as database_module
+import streaks
+
+# Habits are inserted and committed in chunks of this many, so memory stays bounded for large populations.
+HABIT_CHUNK_SIZE = 500
+
+
+class DatasetSpec(NamedTuple):
+    """Parameters of a synthetic dataset; the same spec and seed always produce the same data."""
+    habits: int = 100
+    years: float = 1.0
+    density: float = 0.7          # probability of a check-in per period (day, week, month or interval)
+    weekly_ratio: float = 0.3     # share of Weekly habits
+    seed: int = 0
+    monthly_ratio: float = 0.1    # share of Monthly habits
+    custom_ratio: float = 0.1     # share of Custom habits, each with an interval of 2 to 10 days
+
+
+class DatasetSummary(NamedTuple):
+    """What generate() wrote."""
+    habits: int
+    completions: int
+    start: datetime.datetime
+    end: datetime.datetime
+
+
+def _periods(periodicity: str, start: datetime.datetime, days: int,
+             interval_days: Optional[int]) -> List[Tuple[int, int]]:
+    """Splits the day range into the habit's periods, as (first day offset, length) pairs."""
+    periods: List[Tuple[int, int]] = []
+    first_ordinal = start.toordinal()
+    previous = None
+    for offset in range(days):
+        period = streaks.period_of_day(periodicity, first_ordinal + offset, interval_days)
+        if period == previous:
+            periods[-1] = (periods[-1][0], periods[-1][1] + 1)
+        else:
+            periods.append((offset, 1))
+            previous = period
+    return periods
+
+
+def _choose_periodicity(rng: random.Random, spec: DatasetSpec) -> Tuple[str, Optional[int]]:
+    """Draws a habit's periodicity (and interval for Custom habits) according to the spec's ratios."""
+    draw = rng.random()
+    if draw < spec.weekly_ratio:
+        return "Weekly", None
+    if draw < spec.weekly_ratio + spec.monthly_ratio:
+        return "Monthly", None
+    if draw < spec.weekly_ratio + spec.monthly_ratio + spec.custom_ratio:
+        return "Custom", rng.randint(2, 10)
+    return "Daily", None
+
+
+def generate(db_conn: sqlite3.Connection, spec: DatasetSpec,
+             end: Optional[datetime.datetime] = None) -> DatasetSummary:
+    """
+    Writes `spec.habits` habits with `spec.years` of history ending at `end` (default: now).
+    Each habit is created at the start of the range and checks in with probability `spec.density`
+    per period, on a random day of it and at a random time of day.
+    """
+    if not db_conn:
+        raise ValueError("Database connection is required")
+    ratios = (spec.weekly_ratio, spec.monthly_ratio, spec.custom_ratio)
+    if not 0 <= spec.density <= 1 or min(ratios) < 0 or sum(ratios) > 1:
+        raise ValueError("Density must be between 0 and 1, and the periodicity ratios may not exceed 1 together")
+
+    rng = random.Random(spec.seed)
+    end = (end or datetime.datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    days = max(1, int(spec.years * 365))
+    start = end - datetime.timedelta(days=days)
+    database_module.create_tables_if_not_exist(db_conn)
+
+    # Period boundaries depend only on the periodicity and interval, so they are split once per kind.
+    period_cache: Dict[Tuple[str, Optional[int]], List[Tuple[int, int]]] = {}
+    completions = 0
+    for chunk_start in range(0, spec.habits, HABIT_CHUNK_SIZE):
+        chunk = range(chunk_start, min(chunk_start + HABIT_CHUNK_SIZE, spec.habits))
+        habits = [(f"Habit {n:06d}", *_choose_periodicity(rng, spec)) for n in chunk]
+        # add_habits_bulk has no interval column, so Custom habits are added one by one in the same transaction.
+        database_module.add_habits_bulk(db_conn, [(name, "Synthetic benchmark habit", periodicity, start)
+                                                  for name, periodicity, interval in habits if interval is None],
+                                        commit=False)
+        for name, periodicity, interval in habits:
+            if interval is not None:
+                database_module.add_habit_to_db(db_conn, name, "Synthetic benchmark habit", periodicity, start,
+                                                interval_days=interval, commit=False)
+        for name, periodicity, interval in habits:
+            habit_id = database_module.get_habit_id_by_name(db_conn, name)
+            kind = (periodicity, interval)
+            if kind not in period_cache:
+                period_cache[kind] = _periods(periodicity, start, days, interval)
+            timestamps = [start + datetime.timedelta(days=first + rng.randrange(length), seconds=rng.randrange(86400))
+                          for first, length in period_cache[kind] if rng.random() < spec.density]
+            completions += database_module.add_increments_bulk(db_conn, habit_id, timestamps, commit=False)
+        db_conn.commit()
+    return DatasetSummary(spec.habits, completions, start, end)
+
+
+def create_database(db_path: Union[str, Path], spec: DatasetSpec,
+                    end: Optional[datetime.datetime] = None) -> DatasetSummary:
+    """Creates a fresh benchmark database at `db_path`, replacing an earlier one. Refuses the live database."""
+    db_path = Path(db_path)
+    if db_path.resolve() == Path(config.DB_FILE).resolve():
+        raise ValueError(f"Refusing to overwrite the application database at {db_path}")
+    for path in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")):
+        if path.exists():
+            os.remove(path)
+    db_conn = connections.open_connection(db_path)
+    try:
+        return generate(db_conn, spec, end)
+    finally:
+        db_conn.close()
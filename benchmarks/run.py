@@ -0,0 +1,167 @@
+"""
+Timed benchmark scenarios over a synthetic database, with JSON output for run-to-run comparison:
+
+    python -m benchmarks.run --habits 2000 --years 3 --output results.json
+    python -m benchmarks.run --habits 2000 --years 3 --compare results.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import analyse
+import config
+import connections
+import db as database_module
+import streaks
+from benchmarks.generator import DatasetSpec, create_database
+from counter import get_counter
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def measure(operation: Callable[[], object], repeat: int, ops: int = 1) -> Dict[str, float]:
+    """Runs `operation` `repeat` times and summarizes wall time; `ops` is the work done per run."""
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        # Counter methods report to stdout; that is not part of what is being measured.
+        with contextlib.redirect_stdout(io.StringIO()):
+            operation()
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    return {"repeat": repeat, "ops": ops, "min_ms": best * 1000, "median_ms": statistics.median(timings) * 1000,
+            "ops_per_sec": ops / best if best else 0.0}
+
+
+def run_scenarios(db_path: Path, repeat: int = 5, sample: int = 100, increments: int = 500,
+                  seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """Times each scenario against an existing benchmark database, migrating it first if it is older."""
+    results: Dict[str, Dict[str, float]] = {}
+    db_conn = connections.open_connection(db_path)
+    try:
+        # A database kept with --reuse-db may predate the current schema; upgrading it is not part of any timing.
+        database_module.create_tables_if_not_exist(db_conn)
+        names = [row["name"] for row in db_conn.execute("SELECT name FROM habits ORDER BY id")]
+        sampled = random.Random(seed).sample(names, min(sample, len(names)))
+
+        results["get_current_streak"] = measure(
+            lambda: [get_counter(db_conn, name).get_current_streak(db_conn) for name in sampled], repeat, len(sampled))
+        results["get_longest_streak"] = measure(
+            lambda: [get_counter(db_conn, name).get_longest_streak(db_conn) for name in sampled], repeat, len(sampled))
+
+        def from_history() -> None:
+            for name in sampled:
+                counter = get_counter(db_conn, name)
+                counter.load_increment_dates(db_conn)
+                counter.get_longest_streak(db_conn)
+        results["get_longest_streak_from_history"] = measure(from_history, repeat, len(sampled))
+
+        results["longest_streak_all_habits"] = measure(
+            lambda: analyse.longest_streak_all_habits(db_conn), repeat, len(names))
+        results["streak_leaderboard_top10"] = measure(lambda: analyse.streak_leaderboard(db_conn, 10), repeat)
+        results["list_all_habits_details"] = measure(
+            lambda: analyse.list_all_habits_details(db_conn), repeat, len(names))
+        today = datetime.date.today()
+        results["completion_heatmaps_365d"] = measure(
+            lambda: analyse.completion_heatmaps(db_conn, today - datetime.timedelta(days=364), today),
+            repeat, len(names))
+
+        # Increments go to a dedicated habit, each one day after the previous one, i.e. the common append case.
+        bench_habit = get_counter(db_conn, names[0])
+        next_day = [datetime.datetime.now() + datetime.timedelta(days=1)]
+
+        def increment_batch() -> None:
+            for _ in range(increments):
+                bench_habit.increment(db_conn, increment_time=next_day[0])
+                next_day[0] += datetime.timedelta(days=1)
+        results["increment"] = measure(increment_batch, repeat, increments)
+    finally:
+        db_conn.close()
+
+    env = dict(os.environ, HABIT_DB_PATH=str(db_path))
+    command = [sys.executable, str(BASE_DIR / "habit.py"), "streak", names[0]]
+    results["startup_cli_streak"] = measure(
+        lambda: subprocess.run(command, env=env, cwd=BASE_DIR, check=True, capture_output=True), repeat)
+    return results
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> List[str]:
+    """Formats the change of each scenario's best time relative to a baseline run."""
+    lines = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before and before.get("min_ms"):
+            change = (result["min_ms"] / before["min_ms"] - 1) * 100
+            lines.append(f"{name:34} {before['min_ms']:10.2f} ms -> {result['min_ms']:10.2f} ms  ({change:+.1f}%)")
+        else:
+            lines.append(f"{name:34} {'':>13} -> {result['min_ms']:10.2f} ms  (new)")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command-line entry point: generates the dataset, runs every scenario and writes JSON results."""
+    parser = argparse.ArgumentParser(description="Benchmark the habit tracker on synthetic data.")
+    defaults = DatasetSpec()
+    parser.add_argument("--habits", type=int, default=defaults.habits)
+    parser.add_argument("--years", type=float, default=defaults.years)
+    parser.add_argument("--density", type=float, default=defaults.density)
+    parser.add_argument("--weekly-ratio", type=float, default=defaults.weekly_ratio)
+    parser.add_argument("--monthly-ratio", type=float, default=defaults.monthly_ratio)
+    parser.add_argument("--custom-ratio", type=float, default=defaults.custom_ratio)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--db", type=Path, help="benchmark database path (default: a temporary file)")
+    parser.add_argument("--reuse-db", action="store_true", help="run against --db without regenerating it")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sample", type=int, default=100, help="habits timed by the per-habit scenarios")
+    parser.add_argument("--increments", type=int, default=500, help="increments per run of the increment scenario")
+    parser.add_argument("--output", "-o", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+    if args.reuse_db and not args.db:
+        parser.error("--reuse-db requires --db")
+
+    spec = DatasetSpec(args.habits, args.years, args.density, args.weekly_ratio, args.seed,
+                       args.monthly_ratio, args.custom_ratio)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db or Path(tmp_dir) / "benchmark.db"
+        dataset = None
+        if not args.reuse_db:
+            started = time.perf_counter()
+            summary = create_database(db_path, spec)
+            dataset = {"habits": summary.habits, "completions": summary.completions,
+                       "generate_s": time.perf_counter() - started}
+            print(f"Generated {summary.habits} habits with {summary.completions} completions "
+                  f"in {dataset['generate_s']:.1f} s", file=sys.stderr)
+        results = run_scenarios(db_path, args.repeat, args.sample, args.increments, args.seed)
+
+    report = {
+        "meta": {"spec": spec._asdict(), "dataset": dataset, "python": platform.python_version(),
+                 "platform": platform.platform(), "sqlite": sqlite3.sqlite_version,
+                 "numpy_backend": streaks.numpy_enabled(), "pragma_profile": config.SQLITE_PRAGMA_PROFILE,
+                 "created": datetime.datetime.now().isoformat(timespec="seconds")},
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))["results"]
+        print("\n".join(compare(results, baseline)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
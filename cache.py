@@ -0,0 +1,209 @@
+"""
+Opt-in, bounded LRU cache of habit details, completion histories and computed streaks per connection.
+
+Entries are dropped precisely when Counter.increment/reset/delete, the importer or compaction write through
+the cached connection; such a write is only accounted for if nothing untracked changed the connection before it.
+Every lookup also compares PRAGMA data_version (bumped by commits of other connections and processes)
+and the connection's total_changes (bumped by any other write on it); if either moved, the whole cache
+is cleared, so stale data is never served.
+"""
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+import config
+import db as database_module
+
+
+class CacheStats(NamedTuple):
+    """Hit/miss counters of a cache."""
+    hits: int
+    misses: int
+    invalidations: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class _Entry:
+    """Everything cached for one habit; history and streaks are filled in on first use."""
+    __slots__ = ("details", "history", "streaks")
+
+    def __init__(self, details: sqlite3.Row):
+        self.details = details
+        self.history: Optional[array] = None
+        self.streaks: Dict[Hashable, int] = {}
+
+
+class CounterCache:
+    """LRU cache for one connection, holding at most `max_entries` habits."""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or config.CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._ids_by_name: Dict[str, int] = {}
+        self._version: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.invalidations, len(self._entries))
+
+    @staticmethod
+    def _current_version(db_conn: sqlite3.Connection) -> Tuple[int, int]:
+        return db_conn.execute("PRAGMA data_version").fetchone()[0], db_conn.total_changes
+
+    def _validate(self, db_conn: sqlite3.Connection) -> None:
+        """Clears everything if the database changed in a way no invalidate() call accounted for."""
+        version = self._current_version(db_conn)
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._ids_by_name.clear()
+            self._version = version
+
+    def _accept_own_writes(self, db_conn: sqlite3.Connection, changes_before: Optional[int]) -> None:
+        """
+        Marks the writes made through this connection since total_changes was `changes_before` as accounted for.
+        Only possible if the cache was in sync right before them: any earlier untracked write, or a commit by
+        another connection, is left for the next lookup to detect.
+        """
+        version = self._current_version(db_conn)
+        if changes_before is not None and self._version == (version[0], changes_before):
+            self._version = version
+
+    def _remember(self, details: sqlite3.Row) -> _Entry:
+        entry = _Entry(details)
+        self._entries[details["id"]] = entry
+        self._ids_by_name[details["name"]] = details["id"]
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._ids_by_name.pop(evicted.details["name"], None)
+        return entry
+
+    def _entry(self, db_conn: sqlite3.Connection, habit_id: int) -> Optional[_Entry]:
+        entry = self._entries.get(habit_id)
+        if entry is not None:
+            self._entries.move_to_end(habit_id)
+            return entry
+        details = database_module.get_habit_details_by_id(db_conn, habit_id)
+        return self._remember(details) if details else None
+
+    def get_details(self, db_conn: sqlite3.Connection, name: str) -> Optional[sqlite3.Row]:
+        """Returns the habits row for a name, like db.get_habit_details_by_name."""
+        with self._lock:
+            self._validate(db_conn)
+            habit_id = self._ids_by_name.get(name)
+            if habit_id is not None:
+                self.hits += 1
+                self._entries.move_to_end(habit_id)
+                return self._entries[habit_id].details
+            self.misses += 1
+            details = database_module.get_habit_details_by_name(db_conn, name)
+            if details is None:  # Unknown names are not cached; creating the habit must not need an invalidation.
+                return None
+            return self._remember(details).details
+
+    def get_history(self, db_conn: sqlite3.Connection, habit_id: int) -> array:
+        """Returns a copy of the habit's completion history as a sorted array of epoch seconds."""
+        with self._lock:
+            self._validate(db_conn)
+            entry = self._entry(db_conn, habit_id)
+            if entry is not None and entry.history is not None:
+                self.hits += 1
+                return array(entry.history.typecode, entry.history)
+            self.misses += 1
+            history = array('q', database_module.get_increment_timestamps_for_habit(db_conn, habit_id))
+            if entry is not None:
+                entry.history = history
+            return array(history.typecode, history)
+
+    def get_streak(self, db_conn: sqlite3.Connection, habit_id: int, key: Hashable,
+                   compute: Callable[[], int]) -> int:
+        """Returns a cached streak value, calling compute() on a miss."""
+        with self._lock:
+            self._validate(db_conn)
+            entry = self._entry(db_conn, habit_id)
+            if entry is not None and key in entry.streaks:
+                self.hits += 1
+                return entry.streaks[key]
+            self.misses += 1
+            changes_before = db_conn.total_changes
+        value = compute()
+        with self._lock:
+            # compute() may persist a rebuilt streak state, which only touches derived data.
+            self._accept_own_writes(db_conn, changes_before)
+            entry = self._entries.get(habit_id)
+            if entry is not None:
+                entry.streaks[key] = value
+        return value
+
+    def invalidate(self, db_conn: sqlite3.Connection, habit_id: Optional[int],
+                   changes_before: Optional[int] = None) -> None:
+        """
+        Drops one habit after a write through this connection. With the connection's total_changes from right
+        before the write, the write is accepted as accounted for; otherwise the next lookup clears everything.
+        """
+        with self._lock:
+            entry = self._entries.pop(habit_id, None)
+            if entry is not None:
+                self._ids_by_name.pop(entry.details["name"], None)
+                self.invalidations += 1
+            self._accept_own_writes(db_conn, changes_before)
+
+    def clear(self) -> None:
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._ids_by_name.clear()
+            self._version = None
+
+
+# Caches are registered per connection object. sqlite3.Connection supports neither weak references nor
+# attributes, so the registry keeps the connection itself to make sure its id() is not reused.
+_registry: Dict[int, Tuple[sqlite3.Connection, CounterCache]] = {}
+_registry_lock = threading.Lock()
+
+
+def enable(db_conn: sqlite3.Connection, max_entries: Optional[int] = None) -> CounterCache:
+    """Enables caching for a connection and returns its cache; call disable() before discarding the connection."""
+    with _registry_lock:
+        registered = _registry.get(id(db_conn))
+        if registered is not None and registered[0] is db_conn:
+            return registered[1]
+        counter_cache = CounterCache(max_entries)
+        _registry[id(db_conn)] = (db_conn, counter_cache)
+        return counter_cache
+
+
+def disable(db_conn: sqlite3.Connection) -> None:
+    """Disables caching for a connection and releases it from the registry."""
+    with _registry_lock:
+        registered = _registry.get(id(db_conn))
+        if registered is not None and registered[0] is db_conn:
+            del _registry[id(db_conn)]
+
+
+def get_cache(db_conn: sqlite3.Connection) -> Optional[CounterCache]:
+    """Returns the cache of a connection, or None if caching is not enabled for it."""
+    registered = _registry.get(id(db_conn))
+    if registered is not None and registered[0] is db_conn:
+        return registered[1]
+    return None
+
+
+def invalidate(db_conn: sqlite3.Connection, habit_id: Optional[int], changes_before: Optional[int] = None) -> None:
+    """
+    Drops a habit from the connection's cache, if it has one. Pass db_conn.total_changes as read right before
+    the write, so that the write does not also clear every other habit.
+    """
+    counter_cache = get_cache(db_conn)
+    if counter_cache is not None:
+        counter_cache.invalidate(db_conn, habit_id, changes_before)
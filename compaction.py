@@ -0,0 +1,99 @@
+"""
+Cold-history compaction: completions older than a horizon are folded into one day bitmap per habit
+(history_bitmaps) and deleted from counters, so a multi-year habit keeps a few hundred bytes instead of
+thousands of rows. Readers in db.py merge the bitmap back in, with compacted days at midnight; the time
+of day and repeated check-ins on one day are not kept, so a compacted day exports as one completion, and
+in 'period' increment mode the count of a folded period row survives only in period_day_counts, which
+keeps the rollups exact. Completions backdated into a compacted range are
+stored as ordinary rows and folded in by the next run.
+
+    python compaction.py                   # compact everything older than config.COMPACTION_HORIZON_DAYS
+    python compaction.py --horizon-days 90
+"""
+import argparse
+import datetime
+import sqlite3
+from typing import NamedTuple, Optional
+
+import cache as cache_module
+import config
+import db as database_module
+
+
+class CompactionSummary(NamedTuple):
+    """What compact_all() folded."""
+    habits: int
+    rows: int
+    bitmap_bytes: int
+
+
+def compact_habit(db_conn: sqlite3.Connection, habit_id: int, horizon: datetime.datetime,
+                  commit: bool = True, record_change: bool = True) -> int:
+    """
+    Folds a habit's completions before `horizon` into its history bitmap and deletes those rows.
+    Streak states and rollups are unaffected, as the set of completed days stays the same. The run is
+    written to the change log, so replicas fold the same rows. Returns the number of rows folded.
+    """
+    if not db_conn:
+        raise ValueError("Database connection is required")
+    cursor = db_conn.cursor()
+    # increment_ts is indexed together with habit_id, so both the read and the delete are range scans.
+    horizon_ts = database_module.to_timestamp(horizon)
+    cursor.execute("SELECT day_ordinal FROM counters WHERE habit_id = ? AND increment_ts < ?", (habit_id, horizon_ts))
+    days = {row[0] for row in cursor.fetchall()}
+    if not days:
+        return 0
+    changes_before = db_conn.total_changes
+    bitmap = database_module.get_history_bitmap(db_conn, habit_id)
+    if bitmap is not None:
+        days.update(database_module.bitmap_days(bitmap['base_day'], bitmap['bits']))
+    base_day, bits = database_module.encode_day_bitmap(days)
+    database_module.save_history_bitmap(db_conn, habit_id, base_day, bits, commit=False)
+    cursor.execute("DELETE FROM counters WHERE habit_id = ? AND increment_ts < ?", (habit_id, horizon_ts))
+    folded = cursor.rowcount
+    if record_change:
+        database_module.log_change(db_conn, "compact", habit_id, {"horizon": horizon.isoformat()})
+    # The history is unchanged, but cached copies would still hold the exact times of the folded rows.
+    cache_module.invalidate(db_conn, habit_id, changes_before)
+    if commit:
+        db_conn.commit()
+    return folded
+
+
+def compact_all(db_conn: sqlite3.Connection, horizon_days: Optional[int] = None,
+                now: Optional[datetime.datetime] = None) -> CompactionSummary:
+    """
+    Compacts every habit's history older than `horizon_days` (default: config.COMPACTION_HORIZON_DAYS).
+    Each habit is committed on its own, so the application can keep writing while the job runs.
+    """
+    horizon_days = config.COMPACTION_HORIZON_DAYS if horizon_days is None else horizon_days
+    horizon = (now or datetime.datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0) \
+        - datetime.timedelta(days=horizon_days)
+    habits = rows = 0
+    for habit_id in database_module.get_habit_ids(db_conn):
+        folded = compact_habit(db_conn, habit_id, horizon)
+        if folded:
+            habits += 1
+            rows += folded
+    bitmap_bytes = db_conn.execute("SELECT COALESCE(SUM(LENGTH(bits)), 0) FROM history_bitmaps").fetchone()[0]
+    return CompactionSummary(habits, rows, bitmap_bytes)
+
+
+def main() -> None:
+    """Command-line entry point running one compaction pass over the application database."""
+    parser = argparse.ArgumentParser(description="Fold old completion history into per-habit day bitmaps.")
+    parser.add_argument("--horizon-days", type=int, default=config.COMPACTION_HORIZON_DAYS,
+                        help="keep completions of the last N days as individual rows")
+    args = parser.parse_args()
+
+    db_conn = database_module.get_db()
+    try:
+        summary = compact_all(db_conn, args.horizon_days)
+    finally:
+        db_conn.close()
+    print(f"Compacted {summary.rows} completion(s) of {summary.habits} habit(s); "
+          f"history bitmaps now take {summary.bitmap_bytes} bytes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,17 +7,91 @@ BASE_DIR = Path(__file__).resolve().parent
 
 # --- Database Configuration ---
 # Use environment variable if set, otherwise default to a local file.
-DB_FILE = os.environ.get('HABIT_DB_PATH', BASE_DIR / 'data' / 'user_habits.db')
+DB_FILE = Path(os.environ.get('HABIT_DB_PATH', BASE_DIR / 'data' / 'user_habits.db'))
+
+# Pragma profiles applied to every connection. WAL lets readers run alongside the single writer,
+# foreign_keys makes ON DELETE CASCADE fire, and busy_timeout (ms) waits for locks instead of failing.
+SQLITE_PRAGMA_PROFILES = {
+    'default': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'foreign_keys': 'ON',
+        'busy_timeout': 5000,
+        'cache_size': -16000,     # negative values are KiB, i.e. 16 MiB of page cache
+        'mmap_size': 268435456,   # 256 MiB
+    },
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'foreign_keys': 'ON',
+        'busy_timeout': 5000,
+    },
+    'minimal': {
+        'foreign_keys': 'ON',
+    },
+}
+SQLITE_PRAGMA_PROFILE = os.environ.get('HABIT_DB_PRAGMA_PROFILE', 'default')
+
+# Group commit (writer.WriteQueue): a batch is committed once it holds this many operations,
+# or once its first operation has waited this many milliseconds.
+WRITE_QUEUE_MAX_BATCH_SIZE = int(os.environ.get('HABIT_WRITE_QUEUE_MAX_BATCH_SIZE', 256))
+WRITE_QUEUE_MAX_LATENCY_MS = float(os.environ.get('HABIT_WRITE_QUEUE_MAX_LATENCY_MS', 5))
+
+# Worker threads of async_api.AsyncHabitTracker; each worker keeps its own connection.
+ASYNC_MAX_WORKERS = int(os.environ.get('HABIT_ASYNC_MAX_WORKERS', 4))
+
+# HTTP service mode (server.py): listen address and number of pooled database connections.
+SERVER_HOST = os.environ.get('HABIT_SERVER_HOST', '127.0.0.1')
+SERVER_PORT = int(os.environ.get('HABIT_SERVER_PORT', 8765))
+SERVER_POOL_SIZE = int(os.environ.get('HABIT_SERVER_POOL_SIZE', 4))
+
+# Multi-tenant sharding (sharding.ShardRouter): users are hashed onto this many shard database files.
+SHARD_DIR = Path(os.environ.get('HABIT_SHARD_DIR', DB_FILE.parent / 'shards'))
+SHARD_COUNT = int(os.environ.get('HABIT_SHARD_COUNT', 8))
+
+# Parallel analytics (parallel.py): worker processes, and the habit count below which streaks stay serial.
+ANALYTICS_WORKERS = int(os.environ.get('HABIT_ANALYTICS_WORKERS', os.cpu_count() or 1))
+PARALLEL_ANALYTICS_THRESHOLD = int(os.environ.get('HABIT_PARALLEL_ANALYTICS_THRESHOLD', 2000))
+
+# Opt-in per-connection cache (cache.enable): maximum number of habits kept.
+CACHE_MAX_ENTRIES = int(os.environ.get('HABIT_CACHE_MAX_ENTRIES', 1024))
+
+# History compaction (compaction.py): completions older than this many days are folded into day bitmaps.
+COMPACTION_HORIZON_DAYS = int(os.environ.get('HABIT_COMPACTION_HORIZON_DAYS', 365))
+
+# How increments are stored: 'event' keeps one row per check-in (same-second repeats are ignored); 'period'
+# keeps one row per habit and period with a completion count. Switching to 'period' deduplicates existing
+# rows once (migrations.enable_period_upserts); the change cannot be undone by switching back.
+INCREMENT_MODE = os.environ.get('HABIT_INCREMENT_MODE', 'event')
+
+# Read replica (replicator.py): a copy of the database, kept up to date from the change log, that analytics
+# connections read instead of DB_FILE once it exists. Unset means no replica.
+REPLICA_DB_FILE = Path(os.environ['HABIT_REPLICA_DB_PATH']) if os.environ.get('HABIT_REPLICA_DB_PATH') else None
+# Whether writes append to the change log the replica follows. Defaults to on only when a replica is
+# configured, so setups without one do not pay an extra INSERT per write; HABIT_CHANGE_LOG=1/0 overrides it.
+CHANGE_LOG_ENABLED = (os.environ['HABIT_CHANGE_LOG'].lower() in ('1', 'true', 'yes')
+                      if os.environ.get('HABIT_CHANGE_LOG') else REPLICA_DB_FILE is not None)
+REPLICATION_BATCH_SIZE = int(os.environ.get('HABIT_REPLICATION_BATCH_SIZE', 1000))
+REPLICATION_POLL_SECONDS = float(os.environ.get('HABIT_REPLICATION_POLL_SECONDS', 1.0))
 
 # --- Logging Configuration ---
 LOG_DIR = BASE_DIR / 'logs'
 LOG_FILE = LOG_DIR / 'habit_tracker.log'
 LOG_LEVEL = os.environ.get('HABIT_LOG_LEVEL', 'INFO')
 
+# Opt-in instrumentation (instrumentation.py): statements slower than SLOW_QUERY_MS go to the log file,
+# and the INSTRUMENTATION_TOP_N hottest functions and statements are logged at exit.
+INSTRUMENTATION_ENABLED = os.environ.get('HABIT_INSTRUMENT', '').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.environ.get('HABIT_SLOW_QUERY_MS', 50))
+INSTRUMENTATION_TOP_N = int(os.environ.get('HABIT_INSTRUMENTATION_TOP_N', 15))
+
 # --- Application Settings ---
-ALLOWED_PERIODICITIES = ['Daily', 'Weekly']
+# 'Custom' habits repeat every N days (Counter's interval_days).
+ALLOWED_PERIODICITIES = ['Daily', 'Weekly', 'Monthly', 'Custom']
 MAX_NAME_LENGTH = 100
 MAX_DESCRIPTION_LENGTH = 500
+# 'auto' uses the vectorized NumPy streak backend when NumPy is installed; 'python' always uses the pure-Python one.
+STREAK_BACKEND = os.environ.get('HABIT_STREAK_BACKEND', 'auto')
 
 # Ensure required directories exist for database and logs
 DB_FILE.parent.mkdir(parents=True, exist_ok=True)
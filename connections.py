@@ -0,0 +1,183 @@
+"""
+Connection management: tuned pragmas, thread-local connection reuse and read-only analytics connections,
+which read the replica (config.REPLICA_DB_FILE, see replicator.py) instead of the primary once it exists.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import config
+import migrations
+
+
+def get_pragmas(profile: Optional[str] = None) -> Dict[str, Union[str, int]]:
+    """Returns the pragmas of a named profile from config.SQLITE_PRAGMA_PROFILES."""
+    profile = profile or config.SQLITE_PRAGMA_PROFILE
+    if profile not in config.SQLITE_PRAGMA_PROFILES:
+        raise ValueError(f"Unknown SQLite pragma profile '{profile}'. "
+                         f"Choose one of: {', '.join(config.SQLITE_PRAGMA_PROFILES)}.")
+    return config.SQLITE_PRAGMA_PROFILES[profile]
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Dict[str, Union[str, int]], read_only: bool = False) -> None:
+    """Applies pragmas to a connection. journal_mode is persistent, so read-only connections skip it."""
+    for name, value in pragmas.items():
+        if read_only and name == "journal_mode":
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def open_connection(db_path: Union[str, Path, None] = None, read_only: bool = False,
+                    profile: Optional[str] = None, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Opens a new connection to the database file (config.DB_FILE by default) with the pragma profile applied.
+    Read-only connections are opened with mode=ro, so analytics can never write or take the write lock.
+    """
+    db_path = Path(db_path or config.DB_FILE)
+    if read_only:
+        conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True,
+                               check_same_thread=check_same_thread)
+    else:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    apply_pragmas(conn, get_pragmas(profile), read_only)
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def analytics_db_path(db_path: Union[str, Path, None] = None,
+                      replica_path: Union[str, Path, None] = None) -> Path:
+    """Returns the file analytics should read: the replica if one is configured and exists, else the database."""
+    replica_path = replica_path or config.REPLICA_DB_FILE
+    if replica_path and Path(replica_path).exists():
+        return Path(replica_path)
+    return Path(db_path or config.DB_FILE)
+
+
+def open_analytics_connection(db_path: Union[str, Path, None] = None, replica_path: Union[str, Path, None] = None,
+                              profile: Optional[str] = None) -> sqlite3.Connection:
+    """Opens a read-only connection for reports, on the replica when there is one (see analytics_db_path)."""
+    return open_connection(analytics_db_path(db_path, replica_path), read_only=True, profile=profile)
+
+
+def database_path(conn: sqlite3.Connection) -> Optional[Path]:
+    """Returns the file of the connection's main database, or None for in-memory and temporary databases."""
+    for row in conn.execute("PRAGMA database_list"):
+        if row[1] == "main":
+            return Path(row[2]) if row[2] else None
+    return None
+
+
+def is_read_only(conn: sqlite3.Connection) -> bool:
+    """Returns True for connections opened by open_connection(read_only=True)."""
+    return bool(conn.execute("PRAGMA query_only").fetchone()[0])
+
+
+class ConnectionManager:
+    """
+    Hands out one reusable writer connection and one read-only connection per thread for a database file.
+    The schema is brought up to date once, when the first writer connection is opened. Read-only connections
+    go to `replica_path` instead when that file exists.
+    """
+
+    def __init__(self, db_path: Union[str, Path, None] = None, profile: Optional[str] = None,
+                 replica_path: Union[str, Path, None] = None):
+        self.db_path = Path(db_path or config.DB_FILE)
+        self.replica_path = Path(replica_path) if replica_path else None
+        self.profile = profile
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._schema_checked = False
+
+    def _open(self, read_only: bool) -> sqlite3.Connection:
+        # Connections are only used by the thread that opened them, but close() may run on another thread.
+        db_path = self.db_path
+        if read_only and self.replica_path and self.replica_path.exists():
+            db_path = self.replica_path
+        conn = open_connection(db_path, read_only, self.profile, check_same_thread=False)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns this thread's writer connection, opening it on first use."""
+        conn = getattr(self._local, "writer", None)
+        if conn is None:
+            conn = self._open(read_only=False)
+            with self._lock:
+                if not self._schema_checked:
+                    migrations.apply_migrations(conn)
+                    self._schema_checked = True
+            self._local.writer = conn
+        return conn
+
+    def read_connection(self) -> sqlite3.Connection:
+        """Returns this thread's read-only connection for analytics, opening it on first use."""
+        conn = getattr(self._local, "reader", None)
+        if conn is None:
+            self.connection()  # Make sure the file and schema exist before opening it read-only.
+            conn = self._open(read_only=True)
+            self._local.reader = conn
+        return conn
+
+    def close(self) -> None:
+        """Closes every connection handed out by this manager, on all threads."""
+        with self._lock:
+            open_connections, self._connections = self._connections, []
+        for conn in open_connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class ConnectionPool:
+    """
+    A fixed number of writer connections shared by many short-lived threads, e.g. HTTP request handlers,
+    where thread-local connections would be opened and leaked per client. Borrowers block while all are in use.
+    """
+
+    def __init__(self, db_path: Union[str, Path, None] = None, size: int = 4, profile: Optional[str] = None):
+        if size < 1:
+            raise ValueError("Pool size must be a positive integer")
+        self.db_path = Path(db_path or config.DB_FILE)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._connections = [open_connection(self.db_path, profile=profile, check_same_thread=False)
+                             for _ in range(size)]
+        migrations.apply_migrations(self._connections[0])
+        for conn in self._connections:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a connection; an uncommitted transaction is rolled back before it is returned to the pool."""
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        """Closes every pooled connection."""
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+
+_default_manager: Optional[ConnectionManager] = None
+_default_manager_lock = threading.Lock()
+
+
+def get_manager() -> ConnectionManager:
+    """Returns the process-wide connection manager for config.DB_FILE, reading from config.REPLICA_DB_FILE if set."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = ConnectionManager(replica_path=config.REPLICA_DB_FILE)
+        return _default_manager
@@ -1,37 +1,67 @@
+import bisect
 import datetime
 import sqlite3
-from typing import List, Optional, Union
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
 
+import cache as cache_module
+import config
 import db as database_module
+import streaks
+
+if TYPE_CHECKING:
+    from writer import WriteQueue
+
+# Completion histories are sorted arrays of epoch seconds (see db.to_timestamp). Typecode 'q' is a
+# guaranteed 64-bit signed integer; 'l' is only 32 bits on Windows and would overflow in 2038.
+HISTORY_TYPECODE = 'q'
 
 class Counter:
     """Represents a single habit, encapsulating its data and business logic."""
 
+    # No per-instance __dict__: analytics screens keep one Counter per habit in memory at once.
+    __slots__ = ('name', 'description', 'periodicity', 'interval_days', 'creation_date', 'habit_id', '_timestamps',
+                 '_history_loaded')
+
     def __init__(self, name: str, description: str, periodicity: str,
                  creation_date: Optional[datetime.datetime] = None,
-                 habit_id: Optional[int] = None):
+                 habit_id: Optional[int] = None, interval_days: Optional[int] = None):
 
         if not name or not isinstance(name, str) or len(name.strip()) == 0:
             raise ValueError("Name cannot be empty and must be a string")
         if not isinstance(description, str):
             raise ValueError("Description must be a string")
-        if periodicity not in ['Daily', 'Weekly']:
-            raise ValueError("Periodicity must be 'Daily' or 'Weekly'.")
+        if periodicity not in config.ALLOWED_PERIODICITIES:
+            raise ValueError(f"Periodicity must be one of {', '.join(config.ALLOWED_PERIODICITIES)}.")
+        if periodicity == 'Custom' and (not isinstance(interval_days, int) or interval_days < 1):
+            raise ValueError("Custom habits need an interval of at least one day.")
+        if periodicity != 'Custom' and interval_days is not None:
+            raise ValueError("An interval is only allowed for Custom habits.")
 
         self.name: str = name.strip()
         self.description: str = description.strip()
         self.periodicity: str = periodicity
+        self.interval_days: Optional[int] = interval_days
         self.creation_date: datetime.datetime = (creation_date or datetime.datetime.now()).replace(microsecond=0)
         self.habit_id: Optional[int] = habit_id
-        self._increment_dates: List[datetime.datetime] = []
+        self._timestamps: array = array(HISTORY_TYPECODE)
+        self._history_loaded: bool = False
+
+    @property
+    def _increment_dates(self) -> List[datetime.datetime]:
+        """The completion history as datetime objects, built on demand from the epoch-second array."""
+        return [database_module.from_timestamp(timestamp) for timestamp in self._timestamps]
 
     def store(self, db: sqlite3.Connection) -> None:
         """Stores the new habit definition in the database."""
         if not db:
             raise ValueError("Database connection is required")
         try:
-            database_module.add_habit_to_db(db, self.name, self.description, self.periodicity, self.creation_date)
+            changes_before = db.total_changes
+            database_module.add_habit_to_db(db, self.name, self.description, self.periodicity, self.creation_date,
+                                            self.interval_days)
             self.habit_id = database_module.get_habit_id_by_name(db, self.name)
+            cache_module.invalidate(db, self.habit_id, changes_before)
             if self.habit_id:
                 print(f"Habit '{self.name}' stored with ID {self.habit_id}.")
             else:
@@ -40,8 +70,13 @@ class Counter:
             print(f"Error storing habit '{self.name}': {e}")
             raise
 
-    def increment(self, db: sqlite3.Connection, increment_time: Optional[datetime.datetime] = None) -> None:
-        """Records a completion for the habit."""
+    def increment(self, db: sqlite3.Connection, increment_time: Optional[datetime.datetime] = None,
+                  writer: Optional["WriteQueue"] = None) -> None:
+        """
+        Records a completion for the habit.
+        With a writer, the completion is group-committed by its background thread; this call still
+        returns only once the write is durable.
+        """
         if not db:
             raise ValueError("Database connection is required")
         if not self.habit_id:
@@ -49,31 +84,54 @@ class Counter:
             if not self.habit_id:
                 raise ValueError(f"Cannot increment habit '{self.name}'. Please ensure it is stored correctly.")
         actual_increment_time = (increment_time or datetime.datetime.now()).replace(microsecond=0)
-        database_module.add_increment_date_to_db(db, self.habit_id, actual_increment_time)
-        self._increment_dates.append(actual_increment_time)
+        changes_before = db.total_changes
+        if writer:
+            writer.submit_increment(self.habit_id, actual_increment_time).result()
+        else:
+            database_module.add_increment_date_to_db(db, self.habit_id, actual_increment_time, commit=False)
+            streaks.record_increment(db, self.habit_id, self.periodicity, self.creation_date, actual_increment_time,
+                                     self.interval_days)
+            db.commit()
+        cache_module.invalidate(db, self.habit_id, changes_before)
+        self._add_timestamp(database_module.to_timestamp(actual_increment_time))
         print(f"Increment recorded for '{self.name}' on {actual_increment_time.strftime('%Y-%m-%d %H:%M')}.")
 
-    def reset(self, db: sqlite3.Connection) -> None:
-        """Resets all completion records for this habit."""
+    def reset(self, db: sqlite3.Connection, writer: Optional["WriteQueue"] = None) -> None:
+        """Resets all completion records for this habit, optionally through a group-commit writer."""
         if not db:
             raise ValueError("Database connection is required")
         if not self.habit_id:
             self.habit_id = database_module.get_habit_id_by_name(db, self.name)
             if not self.habit_id:
                 raise ValueError(f"Cannot reset habit '{self.name}': ID unknown.")
-        database_module.reset_increments_for_habit(db, self.habit_id)
-        self._increment_dates = []
+        changes_before = db.total_changes
+        if writer:
+            writer.submit_reset(self.habit_id).result()
+        else:
+            database_module.reset_increments_for_habit(db, self.habit_id, commit=False)
+            database_module.save_streak_state(db, self.habit_id, *streaks.EMPTY_STREAK_STATE, commit=False)
+            db.commit()
+        cache_module.invalidate(db, self.habit_id, changes_before)
+        self._timestamps = array(HISTORY_TYPECODE)
+        self._history_loaded = True
         print(f"All increments for habit '{self.name}' have been reset.")
 
-    def delete(self, db: sqlite3.Connection) -> None:
-        """Deletes the habit and all its data from the database."""
+    def delete(self, db: sqlite3.Connection, writer: Optional["WriteQueue"] = None) -> None:
+        """Deletes the habit and all its data from the database, optionally through a group-commit writer."""
         if not db:
             raise ValueError("Database connection is required")
         if not self.habit_id:
             self.habit_id = database_module.get_habit_id_by_name(db, self.name)
             if not self.habit_id:
                 raise ValueError(f"Cannot delete habit '{self.name}': ID unknown.")
-        database_module.delete_habit_from_db(db, self.habit_id)
+        changes_before = db.total_changes
+        if writer:
+            writer.submit_delete(self.habit_id).result()
+        else:
+            database_module.delete_habit_from_db(db, self.habit_id)
+        cache_module.invalidate(db, self.habit_id, changes_before)
+        self._timestamps = array(HISTORY_TYPECODE)
+        self._history_loaded = False
         print(f"Habit '{self.name}' and all its data deleted.")
 
     def load_increment_dates(self, db: sqlite3.Connection) -> None:
@@ -82,131 +140,122 @@ class Counter:
             raise ValueError("Database connection is required")
         if not self.habit_id:
             self.habit_id = database_module.get_habit_id_by_name(db, self.name)
-        if self.habit_id:
-            self._increment_dates = database_module.get_increment_dates_for_habit(db, self.habit_id)
+        counter_cache = cache_module.get_cache(db)
+        if self.habit_id and counter_cache is not None:
+            self._timestamps = counter_cache.get_history(db, self.habit_id)
+        elif self.habit_id:
+            self._timestamps = array(HISTORY_TYPECODE,
+                                     database_module.get_increment_timestamps_for_habit(db, self.habit_id))
         else:
-            self._increment_dates = []
+            self._timestamps = array(HISTORY_TYPECODE)
+        self._history_loaded = True
 
-    @staticmethod
-    def _get_normalized_date(dt: datetime.datetime) -> datetime.date:
-        """Returns just the date part of a datetime object."""
-        return dt.date()
+    def set_increment_dates(self, increment_dates: Iterable[datetime.datetime]) -> None:
+        """Hydrates the internal cache with a history of datetime objects in any order."""
+        self.set_increment_timestamps(sorted(database_module.to_timestamp(d) for d in increment_dates))
 
-    @staticmethod
-    def _get_week_start(dt: Union[datetime.datetime, datetime.date]) -> datetime.date:
-        """Returns the date of Monday for the week of the given datetime or date."""
-        current_date = dt if isinstance(dt, datetime.date) else dt.date()
-        return current_date - datetime.timedelta(days=current_date.weekday())
+    def set_increment_timestamps(self, timestamps: Iterable[int]) -> None:
+        """Hydrates the internal cache with a chronologically sorted history of epoch seconds, e.g. by load_counters."""
+        self._timestamps = timestamps if isinstance(timestamps, array) else array(HISTORY_TYPECODE, timestamps)
+        self._history_loaded = True
+
+    def _add_timestamp(self, timestamp: int) -> None:
+        """Inserts a completion into the sorted history, ignoring one at an already recorded second like the DB."""
+        position = bisect.bisect_left(self._timestamps, timestamp)
+        if position == len(self._timestamps) or self._timestamps[position] != timestamp:
+            self._timestamps.insert(position, timestamp)
+
+    def _ensure_increment_dates(self, db: sqlite3.Connection) -> None:
+        """Loads the completion history only if it has not been loaded or preloaded yet."""
+        if not self._history_loaded:
+            self.load_increment_dates(db)
+
+    def _get_streak_state(self, db: sqlite3.Connection) -> streaks.StreakState:
+        """Reads the persisted streak state, rebuilding it from the history if it is missing."""
+        if not self.habit_id:
+            self.habit_id = database_module.get_habit_id_by_name(db, self.name)
+            if not self.habit_id:
+                return streaks.EMPTY_STREAK_STATE
+        state = streaks.load_streak_state(db, self.habit_id)
+        if state is None:
+            state = streaks.rebuild_streak_state(db, self.habit_id, self.periodicity, self.creation_date,
+                                                 interval_days=self.interval_days)
+        return state
 
     def get_current_streak(self, db_conn: sqlite3.Connection,
                            current_system_date: Optional[datetime.datetime] = None) -> int:
         """
         Calculates the current streak, defined as a consecutive sequence of completions ending today or yesterday.
-        This logic is complex because it must handle both daily and weekly periodicities correctly.
+        Reads the persisted streak state unless the history is already in memory; the full calculation below
+        is only needed when the last completion lies after the given date.
         """
         if not db_conn:
             raise ValueError("Database connection is required")
 
-        self.load_increment_dates(db_conn)
-        if not self._increment_dates:
-            return 0
-
         effective_system_dt = current_system_date or datetime.datetime.now()
-        normalized_creation_date = self._get_normalized_date(self.creation_date)
-
-        # FIX: Define the 'check_against_period' variable within each branch
-        if self.periodicity == "Daily":
-            all_unique_completion_periods = sorted(list(set(
-                self._get_normalized_date(c) for c in self._increment_dates
-                if self._get_normalized_date(c) >= normalized_creation_date
-            )))
-            delta = datetime.timedelta(days=1)
-            effective_today_normalized = self._get_normalized_date(effective_system_dt)
-            min_acceptable_date = effective_today_normalized - delta
-            check_against_period = effective_today_normalized # Set the variable for daily check
-        elif self.periodicity == "Weekly":
-            normalized_creation_week_start = self._get_week_start(self.creation_date)
-            all_unique_completion_periods = sorted(list(set(
-                self._get_week_start(c) for c in self._increment_dates
-                if self._get_week_start(c) >= normalized_creation_week_start
-            )))
-            delta = datetime.timedelta(weeks=1)
-            effective_today_week_start = self._get_week_start(effective_system_dt)
-            min_acceptable_date = effective_today_week_start - delta
-            check_against_period = effective_today_week_start # Set the variable for weekly check
-        else:
-            return 0
-
-        if not all_unique_completion_periods:
-            return 0
+        counter_cache = cache_module.get_cache(db_conn)
+        if counter_cache is not None and self.habit_id:
+            return counter_cache.get_streak(db_conn, self.habit_id, ("current", effective_system_dt.date()),
+                                            lambda: self._calculate_current_streak(db_conn, effective_system_dt))
+        return self._calculate_current_streak(db_conn, effective_system_dt)
 
-        last_relevant_completion = None
-        for period_start in reversed(all_unique_completion_periods):
-            # FIX: Use the 'check_against_period' variable which is now guaranteed to be defined
-            if period_start <= check_against_period:
-                last_relevant_completion = period_start
-                break
+    def _calculate_current_streak(self, db_conn: sqlite3.Connection, effective_system_dt: datetime.datetime) -> int:
+        """Computes the current streak as of the given date, bypassing the cache."""
+        if not self._history_loaded:
+            streak = streaks.current_streak_from_state(self._get_streak_state(db_conn), self.periodicity,
+                                                       effective_system_dt, self.interval_days)
+            if streak is not None:
+                return streak
 
-        if last_relevant_completion is None or last_relevant_completion < min_acceptable_date:
+        self._ensure_increment_dates(db_conn)
+        if not self._timestamps:
             return 0
-
-        current_streak = 0
-        expected_period = last_relevant_completion
-        try:
-            start_index = all_unique_completion_periods.index(last_relevant_completion)
-            for i in range(start_index, -1, -1):
-                if all_unique_completion_periods[i] == expected_period:
-                    current_streak += 1
-                    expected_period -= delta
-                else:
-                    break
-        except ValueError:
-            return 0
-        return current_streak
+        return streaks.compute_streaks_from_timestamps(self.periodicity, self.creation_date, self._timestamps,
+                                                       effective_system_dt, self.interval_days)[0]
 
     def get_longest_streak(self, db_conn: sqlite3.Connection) -> int:
         """
-        Calculates the longest streak ever achieved for the habit by iterating through all completions.
+        Calculates the longest streak ever achieved for the habit.
+        Reads the persisted streak state unless the history is already in memory.
         """
         if not db_conn:
             raise ValueError("Database connection is required")
 
-        self.load_increment_dates(db_conn)
-        if not self._increment_dates:
-            return 0
+        counter_cache = cache_module.get_cache(db_conn)
+        if counter_cache is not None and self.habit_id:
+            return counter_cache.get_streak(db_conn, self.habit_id, "longest",
+                                            lambda: self._calculate_longest_streak(db_conn))
+        return self._calculate_longest_streak(db_conn)
 
-        min_period_start = (self._get_normalized_date(self.creation_date) if self.periodicity == "Daily"
-                            else self._get_week_start(self.creation_date))
-
-        if self.periodicity == "Daily":
-            processed_periods = sorted(list(set(
-                self._get_normalized_date(c) for c in self._increment_dates
-                if self._get_normalized_date(c) >= min_period_start
-            )))
-            delta = datetime.timedelta(days=1)
-        elif self.periodicity == "Weekly":
-            processed_periods = sorted(list(set(
-                self._get_week_start(c) for c in self._increment_dates
-                if self._get_week_start(c) >= min_period_start
-            )))
-            delta = datetime.timedelta(weeks=1)
-        else:
-            return 0
+    def _calculate_longest_streak(self, db_conn: sqlite3.Connection) -> int:
+        """Computes the longest streak, bypassing the cache."""
+        if not self._history_loaded:
+            return self._get_streak_state(db_conn).longest_run
 
-        if not processed_periods:
+        self._ensure_increment_dates(db_conn)
+        if not self._timestamps:
             return 0
+        return streaks.compute_streaks_from_timestamps(self.periodicity, self.creation_date, self._timestamps,
+                                                       datetime.datetime.now(), self.interval_days)[1]
 
-        max_streak = current_streak = 0
-        for i, period in enumerate(processed_periods):
-            if i == 0 or period != processed_periods[i - 1] + delta:
-                current_streak = 1
-            else:
-                current_streak += 1
-            max_streak = max(max_streak, current_streak)
-        return max_streak
+    @property
+    def periodicity_label(self) -> str:
+        """The periodicity for display, e.g. 'Weekly' or 'Every 3 days'."""
+        return f"Every {self.interval_days} days" if self.periodicity == 'Custom' else self.periodicity
 
     def __str__(self):
-        return f"Habit: '{self.name}' ({self.periodicity}), Created: {self.creation_date.strftime('%Y-%m-%d')}"
+        return f"Habit: '{self.name}' ({self.periodicity_label}), Created: {self.creation_date.strftime('%Y-%m-%d')}"
+
+def _counter_from_row(habit_details: sqlite3.Row) -> Counter:
+    """Builds a Counter object from a row of the habits table."""
+    return Counter(
+        name=habit_details['name'],
+        description=habit_details['description'],
+        periodicity=habit_details['periodicity'],
+        creation_date=datetime.datetime.fromisoformat(habit_details['creation_date']),
+        habit_id=habit_details['id'],
+        interval_days=habit_details['interval_days']
+    )
 
 def get_counter(db_conn: sqlite3.Connection, name: str) -> Optional[Counter]:
     """Helper to fetch habit details from the DB and create a Counter object."""
@@ -215,13 +264,34 @@ def get_counter(db_conn: sqlite3.Connection, name: str) -> Optional[Counter]:
     if not name or not isinstance(name, str):
         raise ValueError("Habit name is required and must be a string")
 
-    habit_details = database_module.get_habit_details_by_name(db_conn, name)
+    counter_cache = cache_module.get_cache(db_conn)
+    if counter_cache is not None:
+        habit_details = counter_cache.get_details(db_conn, name)
+    else:
+        habit_details = database_module.get_habit_details_by_name(db_conn, name)
     if habit_details:
-        return Counter(
-            name=habit_details['name'],
-            description=habit_details['description'],
-            periodicity=habit_details['periodicity'],
-            creation_date=datetime.datetime.fromisoformat(habit_details['creation_date']),
-            habit_id=habit_details['id']
-        )
-    return None
\ No newline at end of file
+        return _counter_from_row(habit_details)
+    return None
+
+def load_counters(db_conn: sqlite3.Connection, periodicity: Optional[str] = None,
+                  with_histories: bool = True) -> List[Counter]:
+    """
+    Bulk-loads all habits (optionally of one periodicity) together with their completion histories.
+    Uses one query for the habits and one streaming query for the increments, so the returned
+    Counter objects can compute streaks without going back to the database.
+    With with_histories=False only the habits are read, e.g. when the streaks come from elsewhere.
+    """
+    if not db_conn:
+        raise ValueError("Database connection is required")
+
+    counters = [_counter_from_row(row) for row in database_module.get_all_habit_details(db_conn, periodicity)]
+    if not with_histories:
+        return counters
+    # Histories go straight into compact integer arrays; no datetime object is created per completion.
+    histories: Dict[int, array] = {counter.habit_id: array(HISTORY_TYPECODE) for counter in counters}
+    for habit_id, timestamp in database_module.iter_all_increment_timestamps(db_conn, periodicity):
+        if habit_id in histories:
+            histories[habit_id].append(timestamp)
+    for counter in counters:
+        counter.set_increment_timestamps(histories[counter.habit_id])
+    return counters
\ No newline at end of file
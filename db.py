@@ -1,52 +1,134 @@
 import sqlite3
 import datetime
-import os
-from typing import List, Optional
+import heapq
+import itertools
+import json
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
 
-DATABASE_DIR = "data"
-DATABASE_NAME = os.path.join(DATABASE_DIR, "user_habits.db")
+import config
+import connections
+import migrations
+
+DATABASE_DIR = config.DB_FILE.parent
+DATABASE_NAME = config.DB_FILE
+
+# Increments are stored as INTEGER seconds since 1970-01-01 of the (naive) local wall-clock time, which is
+# also their unique and sort key, plus the proleptic Gregorian day ordinal, so the read path never parses
+# ISO-8601 strings. The ISO text is only derived where it is exported or logged.
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_DAY_ORDINAL = EPOCH.toordinal()
+SECONDS_PER_DAY = 86400
+
+_HABIT_COLUMNS = "id, name, description, periodicity, creation_date, interval_days"
+
+# Completions are inserted through a SELECT on the habit, so SQLite derives the stored period key
+# from the habit's periodicity (see migrations.period_key_sql) in the same statement.
+_INSERT_COMPLETION_SQL = (
+    "INSERT OR IGNORE INTO counters (habit_id, increment_ts, day_ordinal, period_key) "
+    f"SELECT id, :ts, :day, {migrations.period_key_sql(':day', 'periodicity', 'interval_days')} "
+    "FROM habits WHERE id = :habit_id")
+# config.INCREMENT_MODE 'period': a completion in a period that already has a row adds to its count, and the
+# row keeps the earliest completion time. Only a repeat of that stored time is ignored, as other times are not kept.
+_UPSERT_COMPLETION_SQL = (
+    "INSERT INTO counters (habit_id, increment_ts, day_ordinal, period_key) "
+    f"SELECT id, :ts, :day, {migrations.period_key_sql(':day', 'periodicity', 'interval_days')} "
+    "FROM habits WHERE id = :habit_id "
+    "ON CONFLICT (habit_id, increment_ts) DO NOTHING "
+    "ON CONFLICT (habit_id, period_key) DO UPDATE SET completions = completions + 1, "
+    "increment_ts = min(increment_ts, excluded.increment_ts), day_ordinal = min(day_ordinal, excluded.day_ordinal)")
+
+# strftime() format of datetime.isoformat() for whole seconds, used to derive the ISO text of increment_ts.
+_ISO_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+def _completion_sql() -> str:
+    """The statement that records a completion under the configured increment mode."""
+    return _UPSERT_COMPLETION_SQL if config.INCREMENT_MODE == "period" else _INSERT_COMPLETION_SQL
+
+def to_timestamp(dt: datetime.datetime) -> int:
+    """Converts a naive datetime into integer epoch seconds of its wall-clock time."""
+    return int((dt - EPOCH).total_seconds())
+
+def from_timestamp(timestamp: int) -> datetime.datetime:
+    """Converts integer epoch seconds back into a naive datetime."""
+    return EPOCH + datetime.timedelta(seconds=timestamp)
+
+def day_ordinal_from_timestamp(timestamp: int) -> int:
+    """Returns the day ordinal (as in date.toordinal()) of integer epoch seconds."""
+    return EPOCH_DAY_ORDINAL + timestamp // SECONDS_PER_DAY
 
 def ensure_data_dir_exists():
     """Creates the data directory if it doesn't already exist."""
-    os.makedirs(DATABASE_DIR, exist_ok=True)
+    DATABASE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Database files whose schema has already been checked in this process.
+_schema_checked: Set[str] = set()
 
 def get_db() -> sqlite3.Connection:
-    """Gets a new database connection."""
+    """
+    Gets a new database connection to config.DB_FILE with the configured pragma profile applied.
+    The schema is created or upgraded on first use; afterwards the check only reads PRAGMA user_version,
+    and it is skipped entirely for the rest of the process.
+    """
     ensure_data_dir_exists()
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
+    conn = connections.open_connection(DATABASE_NAME)
+    if str(DATABASE_NAME) not in _schema_checked:
+        migrations.apply_migrations(conn)
+        _schema_checked.add(str(DATABASE_NAME))
     return conn
 
 def create_tables_if_not_exist(db: sqlite3.Connection):
-    """Creates the habit and counter tables if they aren't already present."""
-    cursor = db.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS habits (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT UNIQUE NOT NULL,
-                        description TEXT,
-                        periodicity TEXT NOT NULL CHECK(periodicity IN ('Daily', 'Weekly')),
-                        creation_date TEXT NOT NULL
-                    )''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS counters (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        habit_id INTEGER NOT NULL,
-                        increment_date TEXT NOT NULL,
-                        FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
-                    )''')
-    db.commit()
+    """Creates the tables and indexes if they aren't already present, upgrading older databases in place."""
+    migrations.apply_migrations(db)
 
 # --- Habit Table Functions ---
-def add_habit_to_db(db: sqlite3.Connection, name: str, description: str, periodicity: str, creation_date: datetime.datetime):
-    """Adds a new habit to the database."""
+def add_habit_to_db(db: sqlite3.Connection, name: str, description: str, periodicity: str, creation_date: datetime.datetime,
+                    interval_days: Optional[int] = None, habit_id: Optional[int] = None, commit: bool = True,
+                    record_change: bool = True):
+    """
+    Adds a new habit to the database. interval_days is required for, and only allowed with, 'Custom' habits.
+    habit_id is only given when replaying a change (see replicator.py); otherwise SQLite assigns it.
+    """
     cursor = db.cursor()
     try:
-        cursor.execute("INSERT INTO habits (name, description, periodicity, creation_date) VALUES (?, ?, ?, ?)",
-                       (name, description, periodicity, creation_date.isoformat()))
-        db.commit()
+        cursor.execute("INSERT INTO habits (id, name, description, periodicity, creation_date, interval_days) "
+                       "VALUES (?, ?, ?, ?, ?, ?)",
+                       (habit_id, name, description, periodicity, creation_date.isoformat(), interval_days))
+        if record_change:
+            log_change(db, "add_habit", cursor.lastrowid, _habit_payload(name, description, periodicity,
+                                                                          creation_date.isoformat(), interval_days))
+        if commit:
+            db.commit()
     except sqlite3.IntegrityError:
         print(f"Error: Habit with name '{name}' already exists.")
         raise
 
+def add_habits_bulk(db: sqlite3.Connection,
+                    habits: Iterable[Tuple[str, str, str, datetime.datetime]], commit: bool = True) -> int:
+    """
+    Adds many (name, description, periodicity, creation_date) habits in a single transaction.
+    Nothing is stored if any of them already exists. Returns the number of habits added.
+    """
+    cursor = db.cursor()
+    try:
+        last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM habits").fetchone()[0]
+        cursor.executemany("INSERT INTO habits (name, description, periodicity, creation_date) VALUES (?, ?, ?, ?)",
+                           ((name, description, periodicity, creation_date.isoformat())
+                            for name, description, periodicity, creation_date in habits))
+        added = cursor.rowcount
+        # AUTOINCREMENT ids only grow, so the new habits are exactly those above the previous maximum.
+        cursor.execute(f"SELECT {_HABIT_COLUMNS} FROM habits WHERE id > ? ORDER BY id", (last_id,))
+        for row in cursor.fetchall():
+            log_change(db, "add_habit", row['id'], _habit_payload(row['name'], row['description'], row['periodicity'],
+                                                                  row['creation_date'], row['interval_days']))
+        if commit:
+            db.commit()
+    except sqlite3.Error:
+        if commit:
+            db.rollback()
+        raise
+    return added
+
 def get_habit_id_by_name(db: sqlite3.Connection, name: str) -> Optional[int]:
     """Retrieves a habit's ID by its name."""
     cursor = db.cursor()
@@ -57,7 +139,13 @@ def get_habit_id_by_name(db: sqlite3.Connection, name: str) -> Optional[int]:
 def get_habit_details_by_name(db: sqlite3.Connection, name: str) -> Optional[sqlite3.Row]:
     """Retrieves all details for a habit by its name."""
     cursor = db.cursor()
-    cursor.execute("SELECT id, name, description, periodicity, creation_date FROM habits WHERE name = ?", (name,))
+    cursor.execute(f"SELECT {_HABIT_COLUMNS} FROM habits WHERE name = ?", (name,))
+    return cursor.fetchone()
+
+def get_habit_details_by_id(db: sqlite3.Connection, habit_id: int) -> Optional[sqlite3.Row]:
+    """Retrieves all details for a habit by its ID."""
+    cursor = db.cursor()
+    cursor.execute(f"SELECT {_HABIT_COLUMNS} FROM habits WHERE id = ?", (habit_id,))
     return cursor.fetchone()
 
 def get_habits_list(db: sqlite3.Connection) -> List[str]:
@@ -66,46 +154,615 @@ def get_habits_list(db: sqlite3.Connection) -> List[str]:
     cursor.execute("SELECT name FROM habits ORDER BY name")
     return [row['name'] for row in cursor.fetchall()]
 
+def count_habits(db: sqlite3.Connection) -> int:
+    """Returns the number of habits."""
+    return db.execute("SELECT COUNT(*) FROM habits").fetchone()[0]
+
 def habit_by_periodicity(db: sqlite3.Connection, periodicity: str) -> List[str]:
     """Returns a list of habit names for a given periodicity."""
     cursor = db.cursor()
     cursor.execute("SELECT name FROM habits WHERE periodicity = ? ORDER BY name", (periodicity,))
     return [row['name'] for row in cursor.fetchall()]
 
-def delete_habit_from_db(db: sqlite3.Connection, habit_id: int):
+def get_all_habit_details(db: sqlite3.Connection, periodicity: Optional[str] = None) -> List[sqlite3.Row]:
+    """Retrieves the details of all habits (optionally of one periodicity) in a single query, ordered by name."""
+    cursor = db.cursor()
+    if periodicity:
+        cursor.execute(f"SELECT {_HABIT_COLUMNS} FROM habits "
+                       "WHERE periodicity = ? ORDER BY name", (periodicity,))
+    else:
+        cursor.execute(f"SELECT {_HABIT_COLUMNS} FROM habits ORDER BY name")
+    return cursor.fetchall()
+
+def get_habit_ids(db: sqlite3.Connection) -> List[int]:
+    """Returns the IDs of all habits in ascending order."""
+    return [row[0] for row in db.execute("SELECT id FROM habits ORDER BY id")]
+
+def get_habit_details_in_id_range(db: sqlite3.Connection, first_id: int, last_id: int) -> List[sqlite3.Row]:
+    """Retrieves the details of the habits with first_id <= id <= last_id, ordered by id."""
+    cursor = db.cursor()
+    cursor.execute(f"SELECT {_HABIT_COLUMNS} FROM habits "
+                   "WHERE id BETWEEN ? AND ? ORDER BY id", (first_id, last_id))
+    return cursor.fetchall()
+
+def delete_habit_from_db(db: sqlite3.Connection, habit_id: int, commit: bool = True, record_change: bool = True):
     """Deletes a habit from the database. Associated counters are deleted by CASCADE constraint."""
+    if record_change:
+        log_change(db, "delete_habit", habit_id)
+    delete_streak_state(db, habit_id, commit=False)
+    delete_rollups(db, habit_id, commit=False)
+    delete_history_bitmap(db, habit_id, commit=False)
     cursor = db.cursor()
     cursor.execute("DELETE FROM habits WHERE id = ?", (habit_id,))
-    db.commit()
+    if commit:
+        db.commit()
 
 # --- Counter Table Functions ---
-def add_increment_date_to_db(db: sqlite3.Connection, habit_id: int, increment_datetime: datetime.datetime):
-    """Adds a single completion record for a habit."""
+def add_increment_date_to_db(db: sqlite3.Connection, habit_id: int, increment_datetime: datetime.datetime,
+                             commit: bool = True, record_change: bool = True):
+    """
+    Adds a single completion record for a habit, or counts it on the period's record in 'period' increment mode.
+    A second record at the exact same second is ignored, and so is a record for a habit that does not exist.
+    """
+    cursor = db.cursor()
+    timestamp = to_timestamp(increment_datetime)
+    day = day_ordinal_from_timestamp(timestamp)
+    cursor.execute(_completion_sql(), {"habit_id": habit_id, "ts": timestamp, "day": day})
+    if cursor.rowcount:
+        _add_day_counts(db, habit_id, {day: 1})
+        if record_change:
+            log_change(db, "increment", habit_id, {"dates": [increment_datetime.isoformat()]})
+    if commit:
+        db.commit()
+
+def add_increments_bulk(db: sqlite3.Connection, habit_id: int, increment_datetimes: Iterable[datetime.datetime],
+                        commit: bool = True, record_change: bool = True) -> int:
+    """
+    Adds many completion records for a habit with one executemany inside a single transaction.
+    Records at a second that is already stored are ignored. Only the days of the new records are added to
+    the habit's rollups, and its streak state is dropped and rebuilt on the next streak read. Returns the number
+    of records added (in 'period' increment mode: the number of completions counted).
+    """
+    cursor = db.cursor()
+    increment_datetimes = list(increment_datetimes)
+    day_counts: Dict[int, int] = {}
+    if config.INCREMENT_MODE == "period":
+        # The upserts land on the period's row, so only the rowcount of each one tells which days to count.
+        for ts in map(to_timestamp, increment_datetimes):
+            day = day_ordinal_from_timestamp(ts)
+            if cursor.execute(_UPSERT_COMPLETION_SQL, {"habit_id": habit_id, "ts": ts, "day": day}).rowcount:
+                day_counts[day] = day_counts.get(day, 0) + 1
+        added = sum(day_counts.values())
+    else:
+        # The records already stored in the batch's time range are read first, so the new ones are known
+        # without a rowcount per statement.
+        timestamps = sorted(set(map(to_timestamp, increment_datetimes)))
+        if timestamps:
+            cursor.execute("SELECT increment_ts FROM counters WHERE habit_id = ? AND increment_ts BETWEEN ? AND ?",
+                           (habit_id, timestamps[0], timestamps[-1]))
+            stored = {row[0] for row in cursor.fetchall()}
+            timestamps = [ts for ts in timestamps if ts not in stored]
+        before = db.total_changes
+        cursor.executemany(_INSERT_COMPLETION_SQL, ({"habit_id": habit_id, "ts": ts, "day": day_ordinal_from_timestamp(ts)}
+                                                    for ts in timestamps))
+        added = db.total_changes - before
+        if added:  # nothing is inserted for a habit that does not exist
+            for ts in timestamps:
+                day = day_ordinal_from_timestamp(ts)
+                day_counts[day] = day_counts.get(day, 0) + 1
+    _add_day_counts(db, habit_id, day_counts)
+    if added and record_change:
+        # Replaying all of them is idempotent, as the same records are ignored again.
+        log_change(db, "increment", habit_id, {"dates": [dt.isoformat() for dt in increment_datetimes]})
+    delete_streak_state(db, habit_id, commit=False)
+    if commit:
+        db.commit()
+    return added
+
+def get_increment_timestamps_for_habit(db: sqlite3.Connection, habit_id: int) -> List[int]:
+    """
+    Fetches all completion times of a habit as integer epoch seconds, sorted chronologically.
+    Days folded into the habit's history bitmap are included at midnight.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT increment_ts FROM counters WHERE habit_id = ? ORDER BY increment_ts", (habit_id,))
+    timestamps = [row[0] for row in cursor.fetchall()]
+    bitmap = get_history_bitmap(db, habit_id)
+    if bitmap is None:
+        return timestamps
+    return list(heapq.merge(timestamps, compacted_timestamps(bitmap['base_day'], bitmap['bits'])))
+
+def get_period_keys_for_habit(db: sqlite3.Connection, habit_id: int, first_period: Optional[int] = None,
+                              last_period: Optional[int] = None) -> List[int]:
+    """
+    Returns the distinct period keys of a habit's raw completions, ascending, optionally limited to
+    first_period <= period_key <= last_period; an index-only scan. Compacted days are not included.
+    """
+    cursor = db.cursor()
+    if first_period is None and last_period is None:
+        cursor.execute("SELECT DISTINCT period_key FROM counters WHERE habit_id = ? ORDER BY period_key", (habit_id,))
+    else:
+        cursor.execute("SELECT DISTINCT period_key FROM counters WHERE habit_id = ? AND period_key BETWEEN ? AND ? "
+                       "ORDER BY period_key", (habit_id, first_period, last_period))
+    return [row[0] for row in cursor.fetchall()]
+
+def get_period_keys_for_compacted_habits(db: sqlite3.Connection,
+                                         periodicity: Optional[str] = None) -> Dict[int, List[int]]:
+    """
+    Returns {habit_id: distinct period keys of its raw completions, ascending} for every habit with a history
+    bitmap, optionally of one periodicity, in a single query.
+    """
     cursor = db.cursor()
-    cursor.execute("INSERT INTO counters (habit_id, increment_date) VALUES (?, ?)",
-                   (habit_id, increment_datetime.isoformat()))
-    db.commit()
+    # CROSS JOIN keeps history_bitmaps as the outer loop, so only the compacted habits' index ranges are read.
+    cursor.execute("SELECT DISTINCT b.habit_id, c.period_key FROM history_bitmaps b "
+                   "JOIN habits h ON h.id = b.habit_id CROSS JOIN counters c ON c.habit_id = b.habit_id "
+                   "WHERE :periodicity IS NULL OR h.periodicity = :periodicity ORDER BY b.habit_id, c.period_key",
+                   {"periodicity": periodicity})
+    return {habit_id: [row[1] for row in rows] for habit_id, rows in itertools.groupby(cursor, key=itemgetter(0))}
 
 def get_increment_dates_for_habit(db: sqlite3.Connection, habit_id: int) -> List[datetime.datetime]:
-    """Fetches all completion timestamps for a specific habit, sorted chronologically."""
+    """
+    Fetches all completion timestamps for a specific habit, sorted chronologically.
+    In 'period' increment mode there is one entry per completed period, its earliest completion.
+    """
+    return [from_timestamp(timestamp) for timestamp in get_increment_timestamps_for_habit(db, habit_id)]
+
+def iter_all_increment_timestamps(db: sqlite3.Connection,
+                                  periodicity: Optional[str] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Streams (habit_id, epoch seconds) pairs for all habits, grouped by habit and sorted chronologically.
+    Compacted days are merged in at midnight.
+    """
+    cursor = db.cursor()
+    if periodicity:
+        bitmaps = _load_history_bitmaps(db, "WHERE h.periodicity = ?", (periodicity,))
+        cursor.execute("SELECT c.habit_id, c.increment_ts FROM counters c JOIN habits h ON h.id = c.habit_id "
+                       "WHERE h.periodicity = ? ORDER BY c.habit_id, c.increment_ts", (periodicity,))
+    else:
+        bitmaps = _load_history_bitmaps(db)
+        cursor.execute("SELECT habit_id, increment_ts FROM counters ORDER BY habit_id, increment_ts")
+    rows = ((row[0], row[1]) for row in cursor)
+    yield from _merge_compacted(rows, bitmaps, itemgetter(0), itemgetter(1), lambda habit_id, timestamp: (habit_id, timestamp))
+
+def iter_increment_timestamps_in_id_range(db: sqlite3.Connection, first_id: int,
+                                          last_id: int) -> Iterator[Tuple[int, int]]:
+    """Streams (habit_id, epoch seconds) pairs of the habits with first_id <= id <= last_id, grouped by habit."""
+    bitmaps = _load_history_bitmaps(db, "WHERE b.habit_id BETWEEN ? AND ?", (first_id, last_id))
     cursor = db.cursor()
-    cursor.execute("SELECT increment_date FROM counters WHERE habit_id = ? ORDER BY increment_date", (habit_id,))
-    return [datetime.datetime.fromisoformat(row['increment_date']) for row in cursor.fetchall()]
+    cursor.execute("SELECT habit_id, increment_ts FROM counters WHERE habit_id BETWEEN ? AND ? "
+                   "ORDER BY habit_id, increment_ts", (first_id, last_id))
+    rows = ((row[0], row[1]) for row in cursor)
+    yield from _merge_compacted(rows, bitmaps, itemgetter(0), itemgetter(1), lambda habit_id, timestamp: (habit_id, timestamp))
+
+def iter_all_increment_dates(db: sqlite3.Connection,
+                             periodicity: Optional[str] = None) -> Iterator[Tuple[int, datetime.datetime]]:
+    """Streams (habit_id, timestamp) pairs for all habits, grouped by habit and sorted chronologically."""
+    for habit_id, timestamp in iter_all_increment_timestamps(db, periodicity):
+        yield habit_id, from_timestamp(timestamp)
+
+def _fetch_in_batches(cursor: sqlite3.Cursor, batch_size: int) -> Iterator[sqlite3.Row]:
+    """Yields the rows of an executed cursor, fetching at most batch_size rows at a time."""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+def iter_habits(db: sqlite3.Connection, name: Optional[str] = None, periodicity: Optional[str] = None,
+                batch_size: int = 1000) -> Iterator[sqlite3.Row]:
+    """Streams habit rows, optionally filtered by name and periodicity, ordered by id."""
+    conditions, params = [], []
+    if name:
+        conditions.append("name = ?")
+        params.append(name)
+    if periodicity:
+        conditions.append("periodicity = ?")
+        params.append(periodicity)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor = db.cursor()
+    cursor.execute(f"SELECT {_HABIT_COLUMNS} FROM habits {where} ORDER BY id",
+                   params)
+    return _fetch_in_batches(cursor, batch_size)
+
+def iter_completions(db: sqlite3.Connection, name: Optional[str] = None, periodicity: Optional[str] = None,
+                     start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                     batch_size: int = 1000) -> Iterator[sqlite3.Row]:
+    """
+    Streams (habit_name, increment_date, completions) rows ordered by habit and time, optionally filtered by
+    habit name, periodicity and a [start, end) date range, without materializing the result. completions is
+    above 1 only for the period rows of the 'period' increment mode. Compacted days are included at midnight,
+    as dicts with the same keys and one completion each.
+    """
+    conditions, params = [], []
+    if name:
+        conditions.append("h.name = ?")
+        params.append(name)
+    if periodicity:
+        conditions.append("h.periodicity = ?")
+        params.append(periodicity)
+    bitmaps = _load_history_bitmaps(db, f"WHERE {' AND '.join(conditions)}" if conditions else "", params)
+    if start:
+        conditions.append("c.increment_ts >= ?")
+        params.append(to_timestamp(start))
+    if end:
+        conditions.append("c.increment_ts < ?")
+        params.append(to_timestamp(end))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor = db.cursor()
+    cursor.execute("SELECT h.id AS habit_id, h.name AS habit_name, "
+                   f"strftime('{_ISO_FORMAT}', c.increment_ts, 'unixepoch') AS increment_date, c.increment_ts, c.completions "
+                   f"FROM habits h JOIN counters c ON c.habit_id = h.id {where} ORDER BY h.id, c.increment_ts", params)
+    rows = _fetch_in_batches(cursor, batch_size)
+    if not bitmaps:
+        return rows
+
+    def compacted_row(habit_id: int, timestamp: int) -> Dict[str, object]:
+        return {"habit_id": habit_id, "habit_name": bitmaps[habit_id]['name'],
+                "increment_date": from_timestamp(timestamp).isoformat(), "increment_ts": timestamp,
+                "completions": 1}
+    return _merge_compacted(rows, bitmaps, lambda row: row['habit_id'], lambda row: row['increment_ts'],
+                            compacted_row, to_timestamp(start) if start else None, to_timestamp(end) if end else None)
 
-def reset_increments_for_habit(db: sqlite3.Connection, habit_id: int):
+def reset_increments_for_habit(db: sqlite3.Connection, habit_id: int, commit: bool = True,
+                               record_change: bool = True):
     """Deletes all completion records for a specific habit."""
+    if record_change:
+        log_change(db, "reset", habit_id)
     cursor = db.cursor()
     cursor.execute("DELETE FROM counters WHERE habit_id = ?", (habit_id,))
-    db.commit()
+    delete_history_bitmap(db, habit_id, commit=False)
+    delete_rollups(db, habit_id, commit=False)
+    if commit:
+        db.commit()
+
+# --- Rollup Table Functions ---
+def _add_day_counts(db: sqlite3.Connection, habit_id: int, day_counts: Dict[int, int]):
+    """
+    Adds {day ordinal: completions} to the habit's rollups and, in 'period' increment mode, to its
+    period_day_counts, from which rebuild_rollups recounts them. Does not commit.
+    """
+    for day, completions in day_counts.items():
+        add_to_rollups(db, habit_id, day, completions)
+    if config.INCREMENT_MODE == "period":
+        db.executemany("INSERT INTO period_day_counts (habit_id, day_ordinal, completions) VALUES (?, ?, ?) "
+                       "ON CONFLICT (habit_id, day_ordinal) DO UPDATE SET completions = completions + excluded.completions",
+                       ((habit_id, day, completions) for day, completions in day_counts.items()))
+
+def add_to_rollups(db: sqlite3.Connection, habit_id: int, day: int, completions: int = 1):
+    """Adds completions on a day ordinal to the habit's daily and weekly rollups. Does not commit."""
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO daily_rollup (habit_id, day_ordinal, completions) VALUES (?, ?, ?) "
+                   "ON CONFLICT (habit_id, day_ordinal) DO UPDATE SET completions = completions + excluded.completions",
+                   (habit_id, day, completions))
+    cursor.execute("INSERT INTO weekly_rollup (habit_id, week, completions) VALUES (?, ?, ?) "
+                   "ON CONFLICT (habit_id, week) DO UPDATE SET completions = completions + excluded.completions",
+                   (habit_id, (day - 1) // 7, completions))
+
+def delete_rollups(db: sqlite3.Connection, habit_id: int, commit: bool = True):
+    """Deletes the daily and weekly rollups of a habit, and the day counts they are rebuilt from in 'period' mode."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM period_day_counts WHERE habit_id = ?", (habit_id,))
+    cursor.execute("DELETE FROM daily_rollup WHERE habit_id = ?", (habit_id,))
+    cursor.execute("DELETE FROM weekly_rollup WHERE habit_id = ?", (habit_id,))
+    if commit:
+        db.commit()
+
+def rebuild_rollups(db: sqlite3.Connection, habit_id: Optional[int] = None, commit: bool = True) -> int:
+    """
+    Recounts the rollups of one habit, or of every habit, from the counters table and history bitmaps.
+    A compacted day without raw completions counts as one completion. In 'period' increment mode a period's
+    row only holds its total, so the check-ins per day are read from period_day_counts instead of counters.
+    Returns the number of daily rollup rows written.
+    """
+    cursor = db.cursor()
+    where, params = ("WHERE habit_id = ?", (habit_id,)) if habit_id is not None else ("", ())
+    cursor.execute(f"DELETE FROM daily_rollup {where}", params)
+    cursor.execute(f"DELETE FROM weekly_rollup {where}", params)
+    source = "period_day_counts" if config.INCREMENT_MODE == "period" else "counters"
+    cursor.execute(f"INSERT INTO daily_rollup (habit_id, day_ordinal, completions) "
+                   f"SELECT habit_id, day_ordinal, SUM(completions) FROM {source} {where} GROUP BY habit_id, day_ordinal",
+                   params)
+    written = cursor.rowcount
+    bitmaps = _load_history_bitmaps(db, "WHERE b.habit_id = ?" if habit_id is not None else "", params)
+    for bitmap_habit_id, bitmap in bitmaps.items():
+        before = db.total_changes
+        cursor.executemany("INSERT OR IGNORE INTO daily_rollup (habit_id, day_ordinal, completions) VALUES (?, ?, 1)",
+                           ((bitmap_habit_id, day) for day in bitmap_days(bitmap['base_day'], bitmap['bits'])))
+        written += db.total_changes - before
+    cursor.execute(f"INSERT INTO weekly_rollup (habit_id, week, completions) "
+                   f"SELECT habit_id, (day_ordinal - 1) / 7, SUM(completions) FROM daily_rollup {where} "
+                   f"GROUP BY habit_id, (day_ordinal - 1) / 7", params)
+    if commit:
+        db.commit()
+    return written
+
+def get_daily_rollup(db: sqlite3.Connection, habit_id: int, first_day: int, last_day: int) -> List[sqlite3.Row]:
+    """Returns the (day_ordinal, completions) rows of a habit with first_day <= day_ordinal <= last_day."""
+    cursor = db.cursor()
+    cursor.execute("SELECT day_ordinal, completions FROM daily_rollup "
+                   "WHERE habit_id = ? AND day_ordinal BETWEEN ? AND ? ORDER BY day_ordinal",
+                   (habit_id, first_day, last_day))
+    return cursor.fetchall()
+
+def get_weekly_rollup(db: sqlite3.Connection, habit_id: int, first_week: int, last_week: int) -> List[sqlite3.Row]:
+    """Returns the (week, completions) rows of a habit with first_week <= week <= last_week."""
+    cursor = db.cursor()
+    cursor.execute("SELECT week, completions FROM weekly_rollup "
+                   "WHERE habit_id = ? AND week BETWEEN ? AND ? ORDER BY week", (habit_id, first_week, last_week))
+    return cursor.fetchall()
+
+def get_weekday_totals(db: sqlite3.Connection, habit_id: int, first_day: int, last_day: int) -> List[sqlite3.Row]:
+    """
+    Returns (weekday, completions, active_days) rows of a habit over a day range, Monday = 0.
+    Day ordinal 1 is a Monday, so the weekday is (day_ordinal - 1) % 7.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT (day_ordinal - 1) % 7 AS weekday, SUM(completions) AS completions, COUNT(*) AS active_days "
+                   "FROM daily_rollup WHERE habit_id = ? AND day_ordinal BETWEEN ? AND ? "
+                   "GROUP BY weekday ORDER BY weekday", (habit_id, first_day, last_day))
+    return cursor.fetchall()
+
+def iter_daily_rollups(db: sqlite3.Connection, first_day: int, last_day: int) -> Iterator[Tuple[int, int, int]]:
+    """Streams (habit_id, day_ordinal, completions) for every habit over a day range, grouped by habit."""
+    cursor = db.cursor()
+    # CROSS JOIN fixes the loop order, so the rollup is read with one primary-key range scan per habit.
+    cursor.execute("SELECT h.id, r.day_ordinal, r.completions FROM habits h "
+                   "CROSS JOIN daily_rollup r ON r.habit_id = h.id AND r.day_ordinal BETWEEN ? AND ? "
+                   "ORDER BY h.id, r.day_ordinal", (first_day, last_day))
+    for row in cursor:
+        yield row[0], row[1], row[2]
+
+# --- History Bitmap Functions ---
+# Compacted history is one BLOB per habit: bit i (little-endian) is set if the habit was completed on
+# day ordinal base_day + i. See compaction.py.
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+_Row = TypeVar("_Row")
+
+def encode_day_bitmap(days: Iterable[int]) -> Optional[Tuple[int, bytes]]:
+    """Packs day ordinals into (base_day, bits) with base_day being the earliest day; None if there are none."""
+    days = set(days)
+    if not days:
+        return None
+    base_day = min(days)
+    mask = 0
+    for day in days:
+        mask |= 1 << (day - base_day)
+    return base_day, mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+
+def bitmap_days(base_day: int, bits: bytes) -> Iterator[int]:
+    """Yields the day ordinals set in a history bitmap in ascending order."""
+    for offset, value in enumerate(bits):
+        if value:
+            for bit in _BYTE_BITS[value]:
+                yield base_day + offset * 8 + bit
+
+def compacted_timestamps(base_day: int, bits: bytes, start: Optional[int] = None,
+                         end: Optional[int] = None) -> Iterator[int]:
+    """Yields the compacted days of a bitmap as midnight epoch seconds, optionally limited to [start, end)."""
+    for day in bitmap_days(base_day, bits):
+        timestamp = (day - EPOCH_DAY_ORDINAL) * SECONDS_PER_DAY
+        if end is not None and timestamp >= end:
+            return
+        if start is None or timestamp >= start:
+            yield timestamp
+
+def get_history_bitmap(db: sqlite3.Connection, habit_id: int) -> Optional[sqlite3.Row]:
+    """Retrieves the (base_day, bits) history bitmap of a habit, or None if none of its history is compacted."""
+    cursor = db.cursor()
+    cursor.execute("SELECT base_day, bits FROM history_bitmaps WHERE habit_id = ?", (habit_id,))
+    return cursor.fetchone()
+
+def save_history_bitmap(db: sqlite3.Connection, habit_id: int, base_day: int, bits: bytes, commit: bool = True):
+    """Inserts or replaces the history bitmap of a habit."""
+    cursor = db.cursor()
+    cursor.execute("INSERT OR REPLACE INTO history_bitmaps (habit_id, base_day, bits) VALUES (?, ?, ?)",
+                   (habit_id, base_day, bits))
+    if commit:
+        db.commit()
+
+def delete_history_bitmap(db: sqlite3.Connection, habit_id: int, commit: bool = True):
+    """Deletes the history bitmap of a habit."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM history_bitmaps WHERE habit_id = ?", (habit_id,))
+    if commit:
+        db.commit()
+
+def iter_history_bitmaps(db: sqlite3.Connection, periodicity: Optional[str] = None) -> Iterator[sqlite3.Row]:
+    """
+    Streams (habit_id, periodicity, interval_days, creation_date, base_day, bits) of every compacted habit,
+    optionally of one periodicity, by id.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT b.habit_id, h.periodicity, h.interval_days, h.creation_date, b.base_day, b.bits "
+                   "FROM history_bitmaps b JOIN habits h ON h.id = b.habit_id "
+                   "WHERE :periodicity IS NULL OR h.periodicity = :periodicity ORDER BY b.habit_id",
+                   {"periodicity": periodicity})
+    return _fetch_in_batches(cursor, 1000)
+
+def _load_history_bitmaps(db: sqlite3.Connection, where: str = "", params: Iterable = ()) -> Dict[int, sqlite3.Row]:
+    """Loads the bitmaps of the habits matching a WHERE clause over history_bitmaps b and habits h, keyed by id."""
+    cursor = db.cursor()
+    cursor.execute(f"SELECT b.habit_id, h.name, b.base_day, b.bits FROM history_bitmaps b "
+                   f"JOIN habits h ON h.id = b.habit_id {where}", tuple(params))
+    return {row['habit_id']: row for row in cursor.fetchall()}
+
+def _merge_compacted(rows: Iterable[_Row], bitmaps: Dict[int, sqlite3.Row], habit_of: Callable[[_Row], int],
+                     timestamp_of: Callable[[_Row], int], compacted_row: Callable[[int, int], _Row],
+                     start: Optional[int] = None, end: Optional[int] = None) -> Iterator[_Row]:
+    """
+    Merges the compacted days of `bitmaps` into a stream of completion rows grouped by ascending habit id and
+    sorted by time, keeping that order. compacted_row(habit_id, timestamp) builds the row of a compacted day.
+    """
+    pending = sorted(bitmaps)
+    position = 0
+
+    def compacted(habit_id: int) -> Iterator[_Row]:
+        bitmap = bitmaps[habit_id]
+        return (compacted_row(habit_id, timestamp)
+                for timestamp in compacted_timestamps(bitmap['base_day'], bitmap['bits'], start, end))
+
+    for habit_id, group in itertools.groupby(rows, key=habit_of):
+        while position < len(pending) and pending[position] < habit_id:
+            yield from compacted(pending[position])
+            position += 1
+        if position < len(pending) and pending[position] == habit_id:
+            yield from heapq.merge(group, compacted(habit_id), key=timestamp_of)
+            position += 1
+        else:
+            yield from group
+    for habit_id in pending[position:]:
+        yield from compacted(habit_id)
+
+# --- Change Log Functions ---
+# Every habit add/delete, increment and reset is appended to change_log in the transaction of the write,
+# with an AUTOINCREMENT sequence number, so replicator.py can tail it. Writes replayed on a replica pass
+# record_change=False.
+CHANGE_OPERATIONS = ("add_habit", "delete_habit", "increment", "reset", "compact")
+
+def _habit_payload(name: str, description: str, periodicity: str, creation_date: str,
+                   interval_days: Optional[int]) -> Dict[str, object]:
+    return {"name": name, "description": description, "periodicity": periodicity,
+            "creation_date": creation_date, "interval_days": interval_days}
+
+def log_change(db: sqlite3.Connection, operation: str, habit_id: int, payload: Optional[Dict[str, object]] = None):
+    """Appends one change to the change log, without committing. Does nothing unless config.CHANGE_LOG_ENABLED."""
+    if not config.CHANGE_LOG_ENABLED:
+        return
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO change_log (operation, habit_id, payload) VALUES (?, ?, ?)",
+                   (operation, habit_id, json.dumps(payload) if payload is not None else None))
+
+def get_changes_after(db: sqlite3.Connection, seq: int, limit: int) -> List[sqlite3.Row]:
+    """Returns up to `limit` changes with a sequence number above `seq`, in order."""
+    cursor = db.cursor()
+    cursor.execute("SELECT seq, operation, habit_id, payload FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                   (seq, limit))
+    return cursor.fetchall()
+
+def get_change_log_bounds(db: sqlite3.Connection) -> Tuple[Optional[int], int]:
+    """
+    Returns the lowest sequence number still in the change log (None if it is empty) and the highest one
+    ever assigned (0 if none), which pruning does not lower.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT (SELECT MIN(seq) FROM change_log), "
+                   "COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'change_log'), 0)")
+    first, last = cursor.fetchone()
+    return first, last
+
+def prune_change_log(db: sqlite3.Connection, up_to_seq: int, commit: bool = True) -> int:
+    """Deletes the changes up to and including `up_to_seq`, e.g. once every replica has applied them."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM change_log WHERE seq <= ?", (up_to_seq,))
+    if commit:
+        db.commit()
+    return cursor.rowcount
+
+def get_replication_checkpoint(db: sqlite3.Connection) -> Optional[int]:
+    """Returns the sequence number of the last change applied to this replica, or None if it is not one."""
+    cursor = db.cursor()
+    cursor.execute("SELECT last_seq FROM replication_checkpoint WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def save_replication_checkpoint(db: sqlite3.Connection, last_seq: int, commit: bool = True):
+    """Records the last applied sequence number; saved in the transaction of the batch it concludes."""
+    cursor = db.cursor()
+    cursor.execute("INSERT OR REPLACE INTO replication_checkpoint (id, last_seq, updated_at) VALUES (1, ?, ?)",
+                   (last_seq, datetime.datetime.now().replace(microsecond=0).isoformat()))
+    if commit:
+        db.commit()
+
+# --- Streak State Table Functions ---
+# The leaderboard columns are derived in the same statement: live_run starts out as the current run,
+# and expires_day is when it breaks under the habit's periodicity (see migrations.streak_expiry_day_sql).
+_SAVE_STREAK_STATE_SQL = (
+    "INSERT OR REPLACE INTO streak_state (habit_id, last_period, current_run, longest_run, live_run, expires_day) "
+    "SELECT id, :last_period, :current_run, :longest_run, :current_run, "
+    f"{migrations.streak_expiry_day_sql(':last_period', 'periodicity', 'interval_days')} "
+    "FROM habits WHERE id = :habit_id")
+
+def get_streak_state(db: sqlite3.Connection, habit_id: int) -> Optional[sqlite3.Row]:
+    """Retrieves the persisted streak state (last period, current run, longest run) of a habit."""
+    cursor = db.cursor()
+    cursor.execute("SELECT habit_id, last_period, current_run, longest_run FROM streak_state WHERE habit_id = ?",
+                   (habit_id,))
+    return cursor.fetchone()
+
+def save_streak_state(db: sqlite3.Connection, habit_id: int, last_period: Optional[int], current_run: int,
+                      longest_run: int, commit: bool = True):
+    """Inserts or replaces the persisted streak state of a habit."""
+    cursor = db.cursor()
+    cursor.execute(_SAVE_STREAK_STATE_SQL, {"habit_id": habit_id, "last_period": last_period,
+                                            "current_run": current_run, "longest_run": longest_run})
+    if commit:
+        db.commit()
+
+def delete_streak_state(db: sqlite3.Connection, habit_id: int, commit: bool = True):
+    """Drops the persisted streak state of a habit so that it is rebuilt on the next streak read."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM streak_state WHERE habit_id = ?", (habit_id,))
+    if commit:
+        db.commit()
+
+def clear_streak_states(db: sqlite3.Connection, commit: bool = True):
+    """Deletes every persisted streak state, e.g. before a full rebuild."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM streak_state")
+    if commit:
+        db.commit()
+
+def sweep_expired_streaks(db: sqlite3.Connection, today_day: int, commit: bool = True) -> int:
+    """
+    Zeroes the live run of every streak broken on or before day ordinal `today_day`.
+    Only rows in the partial expiry index are visited. Returns the number of streaks demoted.
+    """
+    cursor = db.cursor()
+    cursor.execute("UPDATE streak_state INDEXED BY idx_streak_state_expiry SET live_run = 0 "
+                   "WHERE live_run > 0 AND expires_day <= ?", (today_day,))
+    if commit:
+        db.commit()
+    return cursor.rowcount
+
+def get_habit_ids_without_streak_state(db: sqlite3.Connection) -> List[int]:
+    """Returns the ids of habits whose streak state has not been built yet, e.g. after a reset."""
+    cursor = db.cursor()
+    cursor.execute("SELECT id FROM habits WHERE id NOT IN (SELECT habit_id FROM streak_state) ORDER BY id")
+    return [row[0] for row in cursor.fetchall()]
+
+def get_streak_leaderboard(db: sqlite3.Connection, limit: int, by: str = "current", today_day: Optional[int] = None,
+                           periodicity: Optional[str] = None) -> List[sqlite3.Row]:
+    """
+    Returns up to `limit` rows (habit_id, name, periodicity, streak) with the highest positive current
+    (live, not expired as of `today_day`) or longest streaks, highest first and by name within a tie.
+    Reads streak_state in index order and stops after `limit` matches.
+    """
+    if by == "current":
+        streak, condition = "s.live_run", "s.live_run > 0 AND s.expires_day > :today_day"
+    elif by == "longest":
+        streak, condition = "s.longest_run", "s.longest_run > 0"
+    else:
+        raise ValueError(f"Unknown leaderboard order: {by}")
+    if periodicity:
+        condition += " AND h.periodicity = :periodicity"
+    cursor = db.cursor()
+    cursor.execute(f"SELECT s.habit_id, h.name, h.periodicity, {streak} AS streak "
+                   f"FROM streak_state s JOIN habits h ON h.id = s.habit_id "
+                   f"WHERE {condition} ORDER BY {streak} DESC, h.name LIMIT :limit",
+                   {"today_day": today_day, "periodicity": periodicity, "limit": limit})
+    return cursor.fetchall()
 
 def initialize_database():
-    """Ensures the database and its tables are created upon first import."""
+    """Ensures the database and its tables are created. get_db() also does this lazily on first use."""
     try:
-        with get_db() as conn:
+        conn = connections.open_connection(DATABASE_NAME)
+        try:
             print("Database connection successful. Checking for tables...")
-            create_tables_if_not_exist(conn)
+            applied = migrations.apply_migrations(conn)
+            if applied:
+                print(f"Database schema upgraded to version {applied[-1]}.")
+            _schema_checked.add(str(DATABASE_NAME))
+        finally:
+            conn.close()
     except sqlite3.Error as e:
-        print(f"Fatal database error on initialization: {e}")
-
-# Run initialization when this module is first imported.
-initialize_database()
\ No newline at end of file
+        print(f"Fatal database error on initialization: {e}")
\ No newline at end of file
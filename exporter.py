@@ -0,0 +1,94 @@
+"""Constant-memory streaming export of habits and completion history as CSV or JSONL."""
+import argparse
+import csv
+import datetime
+import json
+import sqlite3
+import sys
+from typing import Dict, Iterator, List, Optional, TextIO
+
+import config
+import db as database_module
+
+HABIT_FIELDS = ["id", "name", "description", "periodicity", "creation_date", "interval_days"]
+# Matches the input format of importer.py, so exports can be imported into another database. completions is
+# above 1 for the period rows of the 'period' increment mode; importer.py ignores it and counts each row once.
+COMPLETION_FIELDS = ["habit_name", "timestamp", "completions"]
+
+
+def iter_habit_records(db_conn: sqlite3.Connection, habit: Optional[str] = None,
+                       periodicity: Optional[str] = None, batch_size: int = 1000) -> Iterator[Dict[str, object]]:
+    """Yields one dict per habit, read from the database in batches."""
+    for row in database_module.iter_habits(db_conn, habit, periodicity, batch_size):
+        yield {field: row[field] for field in HABIT_FIELDS}
+
+
+def iter_completion_records(db_conn: sqlite3.Connection, habit: Optional[str] = None,
+                            periodicity: Optional[str] = None, start: Optional[datetime.datetime] = None,
+                            end: Optional[datetime.datetime] = None,
+                            batch_size: int = 1000) -> Iterator[Dict[str, object]]:
+    """Yields one {habit_name, timestamp, completions} dict per completion in the [start, end) range, read in batches."""
+    for row in database_module.iter_completions(db_conn, habit, periodicity, start, end, batch_size):
+        yield {"habit_name": row["habit_name"], "timestamp": row["increment_date"], "completions": row["completions"]}
+
+
+def write_records(records: Iterator[Dict[str, object]], out: TextIO, fields: List[str], file_format: str) -> int:
+    """Writes records to `out` one at a time as CSV (with a header) or JSONL. Returns the number written."""
+    if file_format == "csv":
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        write = writer.writerow
+    elif file_format == "jsonl":
+        def write(record: Dict[str, object]) -> None:
+            out.write(json.dumps(record) + "\n")
+    else:
+        raise ValueError(f"Unsupported export format '{file_format}'. Use 'csv' or 'jsonl'.")
+
+    count = 0
+    for record in records:
+        write(record)
+        count += 1
+    return count
+
+
+def export(db_conn: sqlite3.Connection, out: TextIO, kind: str = "completions", file_format: str = "csv",
+           habit: Optional[str] = None, periodicity: Optional[str] = None,
+           start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+           batch_size: int = 1000) -> int:
+    """Streams habits or completions to `out`. Returns the number of records written."""
+    if not db_conn:
+        raise ValueError("Database connection is required")
+    if kind == "habits":
+        return write_records(iter_habit_records(db_conn, habit, periodicity, batch_size), out, HABIT_FIELDS,
+                             file_format)
+    if kind == "completions":
+        return write_records(iter_completion_records(db_conn, habit, periodicity, start, end, batch_size), out,
+                             COMPLETION_FIELDS, file_format)
+    raise ValueError(f"Unknown export kind '{kind}'. Use 'habits' or 'completions'.")
+
+
+def main() -> None:
+    """Command-line entry point for exporting habits or completion history."""
+    parser = argparse.ArgumentParser(description="Export habits or completion history as CSV or JSONL.")
+    parser.add_argument("kind", choices=["habits", "completions"])
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--output", "-o", help="output file (default: stdout)")
+    parser.add_argument("--habit", help="only export this habit")
+    parser.add_argument("--periodicity", choices=config.ALLOWED_PERIODICITIES, help="only export habits of this periodicity")
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat, help="first timestamp to include (ISO-8601)")
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat, help="first timestamp to exclude (ISO-8601)")
+    args = parser.parse_args()
+
+    db_conn = database_module.get_db()
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        count = export(db_conn, out, args.kind, args.format, args.habit, args.periodicity, args.start, args.end)
+    finally:
+        if args.output:
+            out.close()
+        db_conn.close()
+    print(f"Exported {count} {args.kind} record(s).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
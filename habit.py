@@ -0,0 +1,231 @@
+"""
+Scriptable, non-interactive command line for cron jobs and shell hooks, e.g.:
+
+    python habit.py inc "Read Daily"
+    python habit.py streak --all --json
+    python habit.py list
+
+Only the standard library is imported up front; each command imports what it needs, and the
+database schema check happens on first connection. Pass --timing to report the startup cost.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+_STARTED = time.perf_counter()
+# Mirrors config.ALLOWED_PERIODICITIES without importing config before a command needs it; the CLI test
+# checks that the two lists stay equal.
+PERIODICITIES = ["Daily", "Weekly", "Monthly", "Custom"]
+
+
+def _connect():
+    """Opens a database connection; imported lazily so that --help never touches the database."""
+    import db as database_module
+    return database_module.get_db()
+
+
+def _parse_datetime(value: str):
+    """Parses an ISO-8601 --at value."""
+    import datetime
+    return datetime.datetime.fromisoformat(value)
+
+
+def cmd_create(args: argparse.Namespace) -> int:
+    """Creates a habit unless one with the same name exists."""
+    from counter import Counter, get_counter
+    db_conn = _connect()
+    try:
+        if get_counter(db_conn, args.name):
+            print(f"Habit '{args.name}' already exists.", file=sys.stderr)
+            return 1
+        Counter(args.name, args.description, args.periodicity, interval_days=args.every).store(db_conn)
+    finally:
+        db_conn.close()
+    return 0
+
+
+def cmd_inc(args: argparse.Namespace) -> int:
+    """Records a completion, now or at --at."""
+    from counter import get_counter
+    db_conn = _connect()
+    try:
+        counter = get_counter(db_conn, args.name)
+        if counter is None:
+            print(f"Habit '{args.name}' not found.", file=sys.stderr)
+            return 1
+        counter.increment(db_conn, increment_time=args.at)
+    finally:
+        db_conn.close()
+    return 0
+
+
+def cmd_reset(args: argparse.Namespace) -> int:
+    """Deletes all completions of a habit."""
+    from counter import get_counter
+    db_conn = _connect()
+    try:
+        counter = get_counter(db_conn, args.name)
+        if counter is None:
+            print(f"Habit '{args.name}' not found.", file=sys.stderr)
+            return 1
+        counter.reset(db_conn)
+    finally:
+        db_conn.close()
+    return 0
+
+
+def cmd_delete(args: argparse.Namespace) -> int:
+    """Deletes a habit and all its data."""
+    from counter import get_counter
+    db_conn = _connect()
+    try:
+        counter = get_counter(db_conn, args.name)
+        if counter is None:
+            print(f"Habit '{args.name}' not found.", file=sys.stderr)
+            return 1
+        counter.delete(db_conn)
+    finally:
+        db_conn.close()
+    return 0
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    """Lists habits with their current and longest streaks, computed in one query."""
+    import db as database_module
+    import streaks
+    db_conn = _connect()
+    try:
+        habits = database_module.get_all_habit_details(db_conn, args.periodicity)
+        all_streaks = streaks.compute_all_streaks(db_conn, periodicity=args.periodicity)
+    finally:
+        db_conn.close()
+    records = [{"name": row["name"], "periodicity": row["periodicity"], "interval_days": row["interval_days"],
+                "current_streak": all_streaks[row["id"]][0], "longest_streak": all_streaks[row["id"]][1]}
+               for row in habits]
+    if args.json:
+        print(json.dumps(records))
+    else:
+        for record in records:
+            print(f"- '{record['name']}' ({record['periodicity']}) | Current Streak: {record['current_streak']}, "
+                  f"Longest: {record['longest_streak']}")
+    return 0
+
+
+def cmd_streak(args: argparse.Namespace) -> int:
+    """Prints the streaks of one habit, or of all habits with --all."""
+    import streaks
+    import db as database_module
+    if not args.all and not args.name:
+        print("Give a habit name or --all.", file=sys.stderr)
+        return 2
+    db_conn = _connect()
+    try:
+        if args.all:
+            names = {row["id"]: row["name"] for row in database_module.get_all_habit_details(db_conn)}
+            result = {names[habit_id]: {"current": current, "longest": longest}
+                      for habit_id, (current, longest) in streaks.compute_all_streaks(db_conn).items()}
+        else:
+            from counter import get_counter
+            counter = get_counter(db_conn, args.name)
+            if counter is None:
+                print(f"Habit '{args.name}' not found.", file=sys.stderr)
+                return 1
+            result = {counter.name: {"current": counter.get_current_streak(db_conn),
+                                     "longest": counter.get_longest_streak(db_conn)}}
+    finally:
+        db_conn.close()
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for name, values in sorted(result.items()):
+            print(f"{name}: current {values['current']}, longest {values['longest']}")
+    return 0
+
+
+def cmd_top(args: argparse.Namespace) -> int:
+    """Prints the habits with the highest current or longest streaks from the indexed leaderboard."""
+    import analyse
+    db_conn = _connect()
+    try:
+        entries = analyse.streak_leaderboard(db_conn, args.limit, "longest" if args.longest else "current",
+                                             args.periodicity)
+    finally:
+        db_conn.close()
+    if args.json:
+        print(json.dumps([entry._asdict() for entry in entries]))
+    else:
+        for rank, entry in enumerate(entries, 1):
+            print(f"{rank}. {entry.name} ({entry.periodicity}): {entry.streak}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the argument parser with one subcommand per action."""
+    parser = argparse.ArgumentParser(prog="habit", description="Non-interactive habit tracker commands.")
+    parser.add_argument("--timing", action="store_true", help="report startup and total run time on stderr")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    create = subcommands.add_parser("create", help="create a new habit")
+    create.add_argument("name")
+    create.add_argument("--periodicity", choices=PERIODICITIES, required=True)
+    create.add_argument("--every", type=int, metavar="DAYS", help="interval of a Custom habit")
+    create.add_argument("--description", default="")
+    create.set_defaults(handler=cmd_create)
+
+    inc = subcommands.add_parser("inc", help="record a completion")
+    inc.add_argument("name")
+    inc.add_argument("--at", type=_parse_datetime, help="completion time (ISO-8601, default: now)")
+    inc.set_defaults(handler=cmd_inc)
+
+    reset = subcommands.add_parser("reset", help="delete all completions of a habit")
+    reset.add_argument("name")
+    reset.set_defaults(handler=cmd_reset)
+
+    delete = subcommands.add_parser("delete", help="delete a habit and all its data")
+    delete.add_argument("name")
+    delete.set_defaults(handler=cmd_delete)
+
+    list_habits = subcommands.add_parser("list", help="list habits with their streaks")
+    list_habits.add_argument("--periodicity", choices=PERIODICITIES)
+    list_habits.add_argument("--json", action="store_true")
+    list_habits.set_defaults(handler=cmd_list)
+
+    streak = subcommands.add_parser("streak", help="show current and longest streaks")
+    streak.add_argument("name", nargs="?")
+    streak.add_argument("--all", action="store_true", help="all habits, computed in one query")
+    streak.add_argument("--json", action="store_true")
+    streak.set_defaults(handler=cmd_streak)
+
+    top = subcommands.add_parser("top", help="show the habits with the highest streaks")
+    top.add_argument("--limit", "-n", type=int, default=10)
+    top.add_argument("--longest", action="store_true", help="rank by longest instead of current streak")
+    top.add_argument("--periodicity", choices=PERIODICITIES)
+    top.add_argument("--json", action="store_true")
+    top.set_defaults(handler=cmd_top)
+    return parser
+
+
+def main(argv=None) -> int:
+    """Runs one subcommand and returns its exit status."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "create" and (args.periodicity == "Custom") != (args.every is not None):
+        parser.error("--every is required for, and only allowed with, --periodicity Custom")
+    if os.environ.get("HABIT_INSTRUMENT"):
+        import config
+        if config.INSTRUMENTATION_ENABLED:
+            import instrumentation
+            instrumentation.enable()
+    ready = time.perf_counter()
+    status = args.handler(args)
+    if args.timing:
+        finished = time.perf_counter()
+        print(f"startup {(ready - _STARTED) * 1000:.1f} ms, command {(finished - ready) * 1000:.1f} ms, "
+              f"total {(finished - _STARTED) * 1000:.1f} ms", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
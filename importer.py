@@ -0,0 +1,187 @@
+"""Streaming import of completion history from CSV or JSONL files of (habit_name, timestamp) rows."""
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import cache as cache_module
+import db as database_module
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# A (habit_name, timestamp) row, or None for a malformed line, which the import counts as skipped.
+Row = Optional[Tuple[str, datetime.datetime]]
+
+
+class ImportResult(NamedTuple):
+    """Summary of an import run."""
+    rows_read: int
+    increments_added: int
+    habits_created: int
+    rows_skipped: int
+
+
+def _detect_format(path: Path) -> str:
+    """Guesses the file format from its extension."""
+    return "jsonl" if path.suffix.lower() in (".jsonl", ".ndjson") else "csv"
+
+
+def _parse_json_line(line: str) -> Optional[dict]:
+    """Parses one JSONL line, or returns None if it is not valid JSON."""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _parse_record(record: Optional[dict]) -> Row:
+    """Turns one parsed line into a row, or None if a field is missing, empty or not a valid value."""
+    try:
+        name = record["habit_name"].strip()
+        timestamp = datetime.datetime.fromisoformat(record["timestamp"]).replace(microsecond=0)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    return (name, timestamp) if name else None
+
+
+def iter_rows(path: Path, file_format: Optional[str] = None) -> Iterator[Row]:
+    """
+    Yields (habit_name, timestamp) pairs from a CSV (with a header row) or JSONL file, one line at a time.
+    A malformed line yields None instead of raising, as earlier chunks of the import may already be committed.
+    """
+    file_format = file_format or _detect_format(path)
+    with open(path, newline="", encoding="utf-8") as handle:
+        if file_format == "jsonl":
+            records: Iterable[Optional[dict]] = (_parse_json_line(line) for line in handle if line.strip())
+        elif file_format == "csv":
+            records = csv.DictReader(handle)
+        else:
+            raise ValueError(f"Unsupported import format '{file_format}'. Use 'csv' or 'jsonl'.")
+        for record in records:
+            yield _parse_record(record)
+
+
+def _resolve_habit_ids(db_conn: sqlite3.Connection, chunk: List[Tuple[str, datetime.datetime]],
+                       habit_ids: Dict[str, Optional[int]], create_missing: Optional[str],
+                       first_seen: Optional[Dict[str, datetime.datetime]] = None, commit: bool = True) -> int:
+    """
+    Looks up the ids of habits not seen before, creating missing ones if requested. Returns habits created.
+    New habits are created at their timestamp in `first_seen`, or else at their earliest one in the chunk.
+    """
+    unknown = {name for name, _ in chunk if name not in habit_ids}
+    for name in unknown:
+        habit_ids[name] = database_module.get_habit_id_by_name(db_conn, name)
+    missing = sorted(name for name in unknown if habit_ids[name] is None)
+    if not missing or not create_missing:
+        return 0
+
+    # A habit's creation date bounds which completions count towards its streaks, so new habits
+    # start at their earliest completion.
+    first_seen = first_seen or {}
+    creation_dates = {name: first_seen.get(name) or min(ts for n, ts in chunk if n == name) for name in missing}
+    changes_before = db_conn.total_changes
+    created = database_module.add_habits_bulk(
+        db_conn, ((name, "Imported habit", create_missing, creation_dates[name]) for name in missing), commit=commit)
+    cache_module.invalidate(db_conn, None, changes_before)  # new habits are not cached yet
+    for name in missing:
+        habit_ids[name] = database_module.get_habit_id_by_name(db_conn, name)
+    return created
+
+
+def import_rows(db_conn: sqlite3.Connection, rows: Iterable[Row],
+                chunk_size: int = DEFAULT_CHUNK_SIZE, create_missing: Optional[str] = None,
+                first_seen: Optional[Dict[str, datetime.datetime]] = None, commit: bool = True) -> ImportResult:
+    """
+    Imports (habit_name, timestamp) rows in chunks of `chunk_size`, one transaction per chunk,
+    so memory stays bounded by the chunk size regardless of the input length.
+    Rows of unknown habits are skipped unless `create_missing` names the periodicity for new habits;
+    malformed rows (None, see iter_rows) are always skipped.
+    Unless `first_seen` gives each habit's earliest timestamp (see earliest_timestamps), a new habit is created
+    at its earliest timestamp in the chunk where it first appears, so for unsorted rows older completions in
+    later chunks would fall before its creation date and not count towards streaks.
+    With commit=False nothing is committed or rolled back, e.g. inside a write queue batch.
+    """
+    if not db_conn:
+        raise ValueError("Database connection is required")
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be a positive integer")
+
+    habit_ids: Dict[str, Optional[int]] = {}
+    rows_read = added = created = skipped = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        rows_read += len(chunk)
+        valid = [row for row in chunk if row is not None]
+        skipped += len(chunk) - len(valid)
+        chunk = valid
+        created += _resolve_habit_ids(db_conn, chunk, habit_ids, create_missing, first_seen, commit)
+
+        by_habit: Dict[int, List[datetime.datetime]] = {}
+        for name, timestamp in chunk:
+            habit_id = habit_ids[name]
+            if habit_id is None:
+                skipped += 1
+            else:
+                by_habit.setdefault(habit_id, []).append(timestamp)
+        try:
+            for habit_id, timestamps in by_habit.items():
+                changes_before = db_conn.total_changes
+                added += database_module.add_increments_bulk(db_conn, habit_id, timestamps, commit=False)
+                cache_module.invalidate(db_conn, habit_id, changes_before)
+            if commit:
+                db_conn.commit()
+        except sqlite3.Error:
+            if commit:
+                db_conn.rollback()
+            raise
+    return ImportResult(rows_read, added, created, skipped)
+
+
+def earliest_timestamps(rows: Iterable[Row]) -> Dict[str, datetime.datetime]:
+    """Returns the earliest timestamp of each habit name in the rows; memory grows with the names, not the rows."""
+    earliest: Dict[str, datetime.datetime] = {}
+    for name, timestamp in filter(None, rows):
+        if name not in earliest or timestamp < earliest[name]:
+            earliest[name] = timestamp
+    return earliest
+
+
+def import_file(db_conn: sqlite3.Connection, path: Path, file_format: Optional[str] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE, create_missing: Optional[str] = None) -> ImportResult:
+    """
+    Streams a CSV or JSONL file of (habit_name, timestamp) rows into the database. When missing habits are
+    created, a first pass over the file finds their earliest timestamps, as the rows need not be sorted.
+    """
+    path = Path(path)
+    first_seen = earliest_timestamps(iter_rows(path, file_format)) if create_missing else None
+    return import_rows(db_conn, iter_rows(path, file_format), chunk_size, create_missing, first_seen)
+
+
+def main() -> None:
+    """Command-line entry point for importing completion history."""
+    parser = argparse.ArgumentParser(description="Import completion history from a CSV or JSONL file.")
+    parser.add_argument("path", type=Path, help="file with habit_name and timestamp (ISO-8601) fields")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="file format (default: from the extension)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per transaction")
+    parser.add_argument("--create-missing", choices=["Daily", "Weekly", "Monthly"],
+                        help="create unknown habits with this periodicity instead of skipping their rows")
+    args = parser.parse_args()
+
+    db_conn = database_module.get_db()
+    try:
+        result = import_file(db_conn, args.path, args.format, args.chunk_size, args.create_missing)
+    finally:
+        db_conn.close()
+    print(f"Read {result.rows_read} row(s): {result.increments_added} completion(s) added, "
+          f"{result.habits_created} habit(s) created, {result.rows_skipped} row(s) skipped.")
+
+
+if __name__ == "__main__":
+    main()
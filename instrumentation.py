@@ -0,0 +1,247 @@
+"""
+Opt-in instrumentation of the hot paths: call counts, wall time and rows returned for every public db and
+streaks function and the Counter streak methods, plus per-statement SQL timings from the sqlite3 trace callback.
+Statements slower than config.SLOW_QUERY_MS go to the slow-query log, and a summary of the hottest
+paths is logged at exit. Enable with HABIT_INSTRUMENT=1 or instrumentation.enable().
+"""
+import atexit
+import functools
+import inspect
+import logging
+import re
+import sqlite3
+import threading
+import time
+import types
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+import connections
+import db as database_module
+import streaks
+import utils
+from counter import Counter
+
+logger = logging.getLogger("habit_tracker.instrumentation")
+slow_query_logger = logging.getLogger("habit_tracker.slow_queries")
+
+COUNTER_METHODS = ("get_current_streak", "get_longest_streak", "load_increment_dates", "increment")
+# The streak engines; per-completion helpers such as period_of are left alone, wrapping them would dominate.
+STREAK_FUNCTIONS = ("compute_all_streaks", "compute_streaks_many", "compute_streaks_from_timestamps",
+                    "compute_streaks_many_from_timestamps",
+                    "load_streak_state", "rebuild_streak_state", "record_increment", "rebuild_all_streak_states",
+                    "verify_streak_states", "build_missing_streak_states")
+
+
+class CallStats:
+    """Aggregated timings of one instrumented function or SQL statement."""
+    __slots__ = ("calls", "total", "max", "rows")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def add(self, elapsed: float, rows: int = 0) -> None:
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.rows += rows
+
+
+_lock = threading.Lock()
+_functions: Dict[str, CallStats] = {}
+_statements: Dict[str, CallStats] = {}
+_originals: List[Tuple[object, str, Callable]] = []
+# Per thread: the running statement with its start time, and how many instrumented calls are active.
+_pending = threading.local()
+_slow_query_seconds = 0.0
+_atexit_registered = False
+
+
+def _record(table: Dict[str, CallStats], key: str, elapsed: float, rows: int = 0) -> None:
+    with _lock:
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = CallStats()
+        stats.add(elapsed, rows)
+
+
+def _count_rows(result: object) -> int:
+    if isinstance(result, sqlite3.Row):
+        return 1
+    if isinstance(result, (list, dict)):
+        return len(result)
+    return 0
+
+
+def normalize_statement(sql: str) -> str:
+    """Replaces literals with '?' and collapses whitespace, so executions of one statement aggregate together."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    return " ".join(sql.split())[:200]
+
+
+def _finish_statement(now: float) -> None:
+    """Closes the interval of this thread's running statement."""
+    pending = getattr(_pending, "statement", None)
+    if pending is None:
+        return
+    _pending.statement = None
+    sql, started = pending
+    elapsed = now - started
+    _record(_statements, normalize_statement(sql), elapsed)
+    if elapsed >= _slow_query_seconds:
+        slow_query_logger.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(sql.split()))
+
+
+def _trace(sql: str) -> None:
+    """
+    sqlite3 trace callback: a statement starts, so the previous one on this thread has finished.
+    The callback only reports starts, so a statement ends at the next one or when the enclosing instrumented
+    call returns; statements outside instrumented calls are not timed, as their end (and any idle time in
+    between) is unknown.
+    """
+    now = time.perf_counter()
+    _finish_statement(now)
+    if getattr(_pending, "depth", 0):
+        _pending.statement = (sql, now)
+
+
+def instrument_connection(db_conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Installs the statement-timing trace callback on a connection."""
+    db_conn.set_trace_callback(_trace)
+    return db_conn
+
+
+def _enter() -> None:
+    _pending.depth = getattr(_pending, "depth", 0) + 1
+
+
+def _exit() -> float:
+    """Ends an instrumented call: closes its last statement and returns the current time."""
+    now = time.perf_counter()
+    _finish_statement(now)
+    _pending.depth -= 1
+    return now
+
+
+def _timed_iterator(name: str, iterator, elapsed: float):
+    """Wraps a streaming result so the time spent producing rows and the row count are attributed to `name`."""
+    rows = 0
+    try:
+        while True:
+            resumed = time.perf_counter()
+            _enter()
+            try:
+                row = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += _exit() - resumed
+            rows += 1
+            yield row
+    finally:
+        _record(_functions, name, elapsed, rows)
+
+
+def _wrap(name: str, func: Callable) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        _enter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            _record(_functions, name, _exit() - started)
+            raise
+        now = _exit()
+        if isinstance(result, types.GeneratorType):
+            return _timed_iterator(name, result, now - started)
+        _record(_functions, name, now - started, _count_rows(result))
+        return result
+    wrapper.__wrapped_by_instrumentation__ = True
+    return wrapper
+
+
+def _patch(owner: object, attribute: str, name: str) -> None:
+    original = getattr(owner, attribute)
+    if getattr(original, "__wrapped_by_instrumentation__", False):
+        return
+    _originals.append((owner, attribute, original))
+    setattr(owner, attribute, _wrap(name, original))
+
+
+_original_open_connection = connections.open_connection
+
+
+def _instrumented_open_connection(*args, **kwargs) -> sqlite3.Connection:
+    return instrument_connection(_original_open_connection(*args, **kwargs))
+
+
+def enable(slow_query_ms: Optional[float] = None, summary_at_exit: bool = True) -> None:
+    """
+    Wraps the public db and streaks functions and Counter's streak methods, traces the statements of every connection
+    opened from now on (instrument_connection() covers existing ones) and configures logging.
+    """
+    global _slow_query_seconds, _atexit_registered
+    utils.setup_logging()
+    _slow_query_seconds = (config.SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms) / 1000
+    for attribute, func in inspect.getmembers(database_module, inspect.isfunction):
+        # Only functions that take the connection; pure converters such as from_timestamp run once per row.
+        parameters = list(inspect.signature(func).parameters)
+        if (not attribute.startswith("_") and func.__module__ == database_module.__name__
+                and (parameters[:1] == ["db"] or attribute == "get_db")):
+            _patch(database_module, attribute, f"db.{attribute}")
+    for function in STREAK_FUNCTIONS:
+        _patch(streaks, function, f"streaks.{function}")
+    for method in COUNTER_METHODS:
+        _patch(Counter, method, f"Counter.{method}")
+    if connections.open_connection is _original_open_connection:
+        _originals.append((connections, "open_connection", _original_open_connection))
+        connections.open_connection = _instrumented_open_connection
+    if summary_at_exit and not _atexit_registered:
+        atexit.register(log_summary)
+        _atexit_registered = True
+
+
+def disable() -> None:
+    """Restores every wrapped function; statistics are kept until reset()."""
+    while _originals:
+        owner, attribute, original = _originals.pop()
+        setattr(owner, attribute, original)
+
+
+def reset() -> None:
+    """Clears the collected statistics."""
+    with _lock:
+        _functions.clear()
+        _statements.clear()
+
+
+def hottest(limit: Optional[int] = None) -> Dict[str, List[Tuple[str, CallStats]]]:
+    """Returns the functions and statements with the highest total time, hottest first."""
+    limit = limit or config.INSTRUMENTATION_TOP_N
+    with _lock:
+        return {kind: sorted(table.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+                for kind, table in (("functions", _functions), ("statements", _statements))}
+
+
+def format_summary(limit: Optional[int] = None) -> str:
+    """Formats the hottest paths as a table."""
+    lines = []
+    for kind, entries in hottest(limit).items():
+        lines.append(f"Hottest {kind}:")
+        lines.append(f"{'calls':>8} {'total ms':>10} {'avg ms':>8} {'max ms':>8} {'rows':>8}  name")
+        for name, stats in entries:
+            rows = stats.rows if kind == "functions" else "-"  # the trace callback does not report rows
+            lines.append(f"{stats.calls:>8} {stats.total * 1000:>10.1f} {stats.total / stats.calls * 1000:>8.2f} "
+                         f"{stats.max * 1000:>8.2f} {rows:>8}  {name}")
+    return "\n".join(lines)
+
+
+def log_summary() -> None:
+    """Logs the hottest paths; registered with atexit by enable()."""
+    if _functions or _statements:
+        logger.info("Instrumentation summary\n%s", format_summary())
@@ -0,0 +1,152 @@
+"""
+Load generator for server.py: drives a running instance over keep-alive connections and reports
+requests/sec and latency percentiles, e.g.:
+
+    python server.py &
+    python loadgen.py --concurrency 8 --requests 5000
+    python loadgen.py --batch-size 100 --requests 500
+"""
+import argparse
+import datetime
+import http.client
+import json
+import math
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class LoadResult(NamedTuple):
+    """Summary of a load-generation run; latencies are in milliseconds."""
+    requests: int
+    errors: int
+    check_ins: int
+    elapsed: float
+    p50_ms: float
+    p99_ms: float
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def check_ins_per_second(self) -> float:
+        return self.check_ins / self.elapsed if self.elapsed else 0.0
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Returns the nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def _request(conn: http.client.HTTPConnection, method: str, path: str,
+             payload: Optional[Dict] = None) -> Tuple[int, bytes]:
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    headers = {"Content-Type": "application/json"} if body else {}
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def _habit_name(prefix: str, index: int) -> str:
+    return f"{prefix}{index}"
+
+
+def setup_habits(host: str, port: int, habits: int, prefix: str) -> None:
+    """Creates the habits the load is spread over; habits that already exist are reused."""
+    conn = http.client.HTTPConnection(host, port)
+    try:
+        for index in range(habits):
+            status, body = _request(conn, "POST", "/habits", {"name": _habit_name(prefix, index),
+                                                              "periodicity": "Daily"})
+            if status not in (201, 409):
+                raise RuntimeError(f"Creating habit failed with HTTP {status}: {body.decode()}")
+    finally:
+        conn.close()
+
+
+def run_load(host: str, port: int, total_requests: int, concurrency: int = 4, habits: int = 10,
+             batch_size: int = 1, prefix: str = "loadgen-") -> LoadResult:
+    """
+    Sends `total_requests` check-in requests from `concurrency` threads, each over one keep-alive connection.
+    With batch_size > 1 every request posts that many completions to /increments instead of one increment.
+    Completions get increasing, distinct timestamps, so none is ignored as a duplicate or recorded as backdated.
+    """
+    counter_lock = threading.Lock()
+    sent = 0
+    latencies: List[float] = []
+    errors = 0
+    base = datetime.datetime.now().replace(microsecond=0)
+
+    def worker() -> None:
+        nonlocal sent, errors
+        conn = http.client.HTTPConnection(host, port)
+        local_latencies = []
+        local_errors = 0
+        try:
+            while True:
+                with counter_lock:
+                    if sent >= total_requests:
+                        break
+                    sequence = sent
+                    sent += 1
+                if batch_size > 1:
+                    path = "/increments"
+                    payload = {"increments": [
+                        {"habit_name": _habit_name(prefix, (sequence * batch_size + i) % habits),
+                         "timestamp": (base + datetime.timedelta(seconds=sequence * batch_size + i)).isoformat()}
+                        for i in range(batch_size)]}
+                else:
+                    path = f"/habits/{_habit_name(prefix, sequence % habits)}/increment"
+                    payload = {"timestamp": (base + datetime.timedelta(seconds=sequence)).isoformat()}
+                started = time.perf_counter()
+                try:
+                    status, _ = _request(conn, "POST", path, payload)
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection(host, port)
+                    status = 0
+                local_latencies.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    local_errors += 1
+        finally:
+            conn.close()
+            with counter_lock:
+                latencies.extend(local_latencies)
+                errors += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return LoadResult(len(latencies), errors, (len(latencies) - errors) * batch_size, elapsed,
+                      percentile(latencies, 0.50), percentile(latencies, 0.99))
+
+
+def main() -> None:
+    """Command-line entry point for the load generator."""
+    parser = argparse.ArgumentParser(description="Measure check-in throughput of a running server.py instance.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=2000, help="total number of requests")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel keep-alive connections")
+    parser.add_argument("--habits", type=int, default=10, help="number of habits the load is spread over")
+    parser.add_argument("--batch-size", type=int, default=1, help="completions per request (uses /increments)")
+    args = parser.parse_args()
+
+    setup_habits(args.host, args.port, args.habits, "loadgen-")
+    result = run_load(args.host, args.port, args.requests, args.concurrency, args.habits, args.batch_size)
+    print(f"{result.requests} requests in {result.elapsed:.2f} s ({result.errors} errors)")
+    print(f"throughput: {result.requests_per_second:.0f} requests/s, {result.check_ins_per_second:.0f} check-ins/s")
+    print(f"latency:    p50 {result.p50_ms:.2f} ms, p99 {result.p99_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
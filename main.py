@@ -1,5 +1,7 @@
 import sqlite3
 import questionary
+import config
+import connections
 import db as database_module
 from counter import Counter, get_counter
 import analyse
@@ -10,10 +12,16 @@ def cli():
         print("Okay, goodbye!")
         return
 
+    if config.INSTRUMENTATION_ENABLED:
+        import instrumentation
+        instrumentation.enable()
+
+    # One connection is reused for the whole session; analysis runs on a separate read-only connection.
+    manager = connections.get_manager()
+    db_conn = manager.connection()
+
     stop = False
     while not stop:
-        db_conn = database_module.get_db()
-
         choice = questionary.select(
             "What do you want to do?",
             choices=["Create a New Habit", "Increment Habit", "Reset Habit",
@@ -24,7 +32,6 @@ def cli():
         if choice is None:
             stop = True
             print("\nExiting application.")
-            db_conn.close()
             continue
 
         try:
@@ -35,7 +42,7 @@ def cli():
             elif choice == "Reset Habit":
                 reset_habit(db_conn)
             elif choice == "Analyse Habits":
-                analyse_habits_menu(db_conn)
+                analyse_habits_menu(manager.read_connection())
             elif choice == "Delete Habit":
                 delete_habit_action(db_conn)
             elif choice == "Exit":
@@ -44,9 +51,8 @@ def cli():
         except Exception as e:
             # A general catch-all for any other unexpected errors.
             print(f"An unexpected error occurred: {e}")
-        finally:
-            if db_conn:
-                db_conn.close()
+            db_conn.rollback()
+    manager.close()
 
 def create_habit(db_conn: sqlite3.Connection):
     """Guides the user through creating a new habit."""
@@ -60,10 +66,17 @@ def create_habit(db_conn: sqlite3.Connection):
     desc = questionary.text("Describe your habit (optional):").ask()
     if desc is None: return
 
-    per = questionary.select("Is this a Daily or a Weekly habit?", choices=["Daily", "Weekly"], qmark="⏳").ask()
+    per = questionary.select("How often should this habit be done?", choices=config.ALLOWED_PERIODICITIES,
+                             qmark="⏳").ask()
     if per is None: return
 
-    new_counter = Counter(name.strip(), desc.strip(), per)
+    interval_days = None
+    if per == "Custom":
+        days = questionary.text("Every how many days?", validate=lambda text: text.isdigit() and int(text) >= 1).ask()
+        if days is None: return
+        interval_days = int(days)
+
+    new_counter = Counter(name.strip(), desc.strip(), per, interval_days=interval_days)
     new_counter.store(db_conn)
 
 def increment_habit(db_conn: sqlite3.Connection):
@@ -114,14 +127,12 @@ def analyse_habits_menu(db_conn: sqlite3.Connection):
 
     print("\n--- Analysis Result ---")
     if analysis_choice == "List all habits (with current & longest streaks)":
-        all_habits = analyse.list_all_habits_details(db_conn)
-        if not all_habits:
+        report = analyse.habit_streak_report(db_conn)
+        if not report:
             print("No habits to display.")
         else:
-            for habit in all_habits:
-                current_s = habit.get_current_streak(db_conn)
-                longest_s = habit.get_longest_streak(db_conn)
-                print(f"- '{habit.name}' ({habit.periodicity}) | Current Streak: {current_s}, Longest: {longest_s}")
+            for habit, current_s, longest_s in report:
+                print(f"- '{habit.name}' ({habit.periodicity_label}) | Current Streak: {current_s}, Longest: {longest_s}")
     else:
         handle_specific_analysis(db_conn, analysis_choice)
     print("-----------------------\n")
@@ -129,7 +140,7 @@ def analyse_habits_menu(db_conn: sqlite3.Connection):
 def handle_specific_analysis(db_conn: sqlite3.Connection, analysis_choice: str):
     """Handles the logic for the specific analysis choices to reduce repetition."""
     if "periodicity" in analysis_choice:
-        periodicity = questionary.select("Filter by periodicity:", choices=["Daily", "Weekly"], qmark="🗓️").ask()
+        periodicity = questionary.select("Filter by periodicity:", choices=config.ALLOWED_PERIODICITIES, qmark="🗓️").ask()
         if periodicity:
             habits = analyse.list_habits_by_periodicity_details(db_conn, periodicity)
             if not habits:
@@ -0,0 +1,432 @@
+"""Versioned schema migrations, tracked with SQLite's PRAGMA user_version."""
+import sqlite3
+from typing import Callable, List, Tuple
+
+import config
+
+# julianday() of 0001-01-01 minus one, so that julianday(date(x)) - offset == date.toordinal().
+JULIAN_ORDINAL_OFFSET = 1721424.5
+MIGRATION_BATCH_SIZE = 5000
+
+
+def period_key_sql(day: str, periodicity: str, interval_days: str) -> str:
+    """
+    SQL expression for the period key of a day ordinal; the counterpart of streaks.period_of_day.
+    Daily: the day ordinal. Weekly: Monday-based week number. Monthly: year * 12 + month - 1.
+    Custom: the number of the interval_days-long block, counted from 0001-01-01 like weeks.
+    """
+    return (f"CASE {periodicity} WHEN 'Weekly' THEN ({day} - 1) / 7 "
+            f"WHEN 'Monthly' THEN CAST(strftime('%Y', ({day}) + {JULIAN_ORDINAL_OFFSET}) AS INTEGER) * 12 "
+            f"+ CAST(strftime('%m', ({day}) + {JULIAN_ORDINAL_OFFSET}) AS INTEGER) - 1 "
+            f"WHEN 'Custom' THEN ({day} - 1) / {interval_days} "
+            f"ELSE {day} END")
+
+
+def period_start_day_sql(period: str, periodicity: str, interval_days: str) -> str:
+    """SQL expression for the day ordinal on which a period starts; the inverse of period_key_sql."""
+    return (f"CASE {periodicity} WHEN 'Weekly' THEN ({period}) * 7 + 1 "
+            f"WHEN 'Monthly' THEN CAST(julianday(printf('%04d-%02d-01', ({period}) / 12, ({period}) % 12 + 1)) "
+            f"- {JULIAN_ORDINAL_OFFSET} AS INTEGER) "
+            f"WHEN 'Custom' THEN ({period}) * {interval_days} + 1 "
+            f"ELSE {period} END")
+
+
+def streak_expiry_day_sql(last_period: str, periodicity: str, interval_days: str) -> str:
+    """
+    SQL expression for the first day on which a streak ending at last_period is broken: the start of the
+    period after next, since the current streak survives while the latest completion is in this or the previous period.
+    """
+    return f"CASE WHEN {last_period} IS NULL THEN NULL ELSE " \
+           f"{period_start_day_sql(f'({last_period}) + 2', periodicity, interval_days)} END"
+
+
+def _create_base_tables(db: sqlite3.Connection):
+    """Version 1: the habits and counters tables of the original application."""
+    cursor = db.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS habits (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT UNIQUE NOT NULL,
+                        description TEXT,
+                        periodicity TEXT NOT NULL CHECK(periodicity IN ('Daily', 'Weekly')),
+                        creation_date TEXT NOT NULL
+                    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS counters (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        habit_id INTEGER NOT NULL,
+                        increment_date TEXT NOT NULL,
+                        FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
+                    )''')
+
+
+def _create_streak_state_table(db: sqlite3.Connection):
+    """Version 2: the persisted per-habit streak state."""
+    db.execute('''CREATE TABLE IF NOT EXISTS streak_state (
+                    habit_id INTEGER PRIMARY KEY,
+                    last_period INTEGER,
+                    current_run INTEGER NOT NULL DEFAULT 0,
+                    longest_run INTEGER NOT NULL DEFAULT 0,
+                    FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
+                )''')
+
+
+def _add_integer_counter_columns(db: sqlite3.Connection):
+    """Version 3: INTEGER epoch-second and day-ordinal columns on counters, backfilled in batches."""
+    cursor = db.cursor()
+    cursor.execute("PRAGMA table_info(counters)")
+    columns = {row[1] for row in cursor.fetchall()}
+    if "increment_ts" not in columns:
+        cursor.execute("ALTER TABLE counters ADD COLUMN increment_ts INTEGER")
+    if "day_ordinal" not in columns:
+        cursor.execute("ALTER TABLE counters ADD COLUMN day_ordinal INTEGER")
+    db.commit()
+    migrate_counters_to_integer_storage(db)
+
+
+def _add_counter_indexes(db: sqlite3.Connection):
+    """
+    Version 4: the uniqueness constraint and lookup indexes declared in schema.sql.
+    Duplicate (habit_id, increment_date) rows are removed first, keeping the oldest one.
+    The unique index also serves every "WHERE habit_id = ? ORDER BY increment_date" query.
+    """
+    cursor = db.cursor()
+    cursor.execute('''DELETE FROM counters WHERE id NOT IN (
+                        SELECT MIN(id) FROM counters GROUP BY habit_id, increment_date
+                    )''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_counters_habit_date ON counters(habit_id, increment_date)")
+
+
+def _create_rollup_tables(db: sqlite3.Connection):
+    """
+    Version 5: per-habit completion counts per day and per Monday-based week, backfilled from counters.
+    The (habit_id, period) primary keys make every date-range query an indexed range scan.
+    """
+    cursor = db.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS daily_rollup (
+                        habit_id INTEGER NOT NULL,
+                        day_ordinal INTEGER NOT NULL,
+                        completions INTEGER NOT NULL,
+                        PRIMARY KEY (habit_id, day_ordinal),
+                        FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
+                    ) WITHOUT ROWID''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS weekly_rollup (
+                        habit_id INTEGER NOT NULL,
+                        week INTEGER NOT NULL,
+                        completions INTEGER NOT NULL,
+                        PRIMARY KEY (habit_id, week),
+                        FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
+                    ) WITHOUT ROWID''')
+    cursor.execute("DELETE FROM daily_rollup")
+    cursor.execute("DELETE FROM weekly_rollup")
+    cursor.execute("INSERT INTO daily_rollup (habit_id, day_ordinal, completions) "
+                   "SELECT habit_id, day_ordinal, COUNT(*) FROM counters GROUP BY habit_id, day_ordinal")
+    cursor.execute("INSERT INTO weekly_rollup (habit_id, week, completions) "
+                   "SELECT habit_id, (day_ordinal - 1) / 7, SUM(completions) FROM daily_rollup "
+                   "GROUP BY habit_id, (day_ordinal - 1) / 7")
+
+
+def _add_period_keys(db: sqlite3.Connection):
+    """
+    Version 6: Monthly and Custom (every interval_days days) periodicities, and a stored period key per completion.
+    SQLite cannot alter a CHECK constraint, so habits is rebuilt with foreign key enforcement switched off;
+    dropping the old table would otherwise cascade to every completion.
+    """
+    foreign_keys = db.execute("PRAGMA foreign_keys").fetchone()[0]
+    db.commit()
+    db.execute("PRAGMA foreign_keys = OFF")
+    try:
+        cursor = db.cursor()
+        cursor.execute('''CREATE TABLE habits_new (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            name TEXT UNIQUE NOT NULL,
+                            description TEXT,
+                            periodicity TEXT NOT NULL CHECK(periodicity IN ('Daily', 'Weekly', 'Monthly', 'Custom')),
+                            creation_date TEXT NOT NULL,
+                            interval_days INTEGER CHECK(interval_days >= 1),
+                            CHECK((periodicity = 'Custom') = (interval_days IS NOT NULL))
+                        )''')
+        cursor.execute("INSERT INTO habits_new (id, name, description, periodicity, creation_date) "
+                       "SELECT id, name, description, periodicity, creation_date FROM habits")
+        # Keep AUTOINCREMENT's high-water mark, so ids of deleted habits are still never reused.
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'habits'")
+        sequence = cursor.fetchone()
+        cursor.execute("DROP TABLE habits")
+        cursor.execute("ALTER TABLE habits_new RENAME TO habits")
+        if sequence:
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'habits'")
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('habits', ?)", (sequence[0],))
+        cursor.execute("PRAGMA table_info(counters)")
+        if "period_key" not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE counters ADD COLUMN period_key INTEGER")
+        db.commit()
+    finally:
+        db.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+    backfill_period_keys(db)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_counters_habit_period ON counters(habit_id, period_key)")
+
+
+def _create_history_bitmaps_table(db: sqlite3.Connection):
+    """Version 7: compacted completion history, one day bitmap per habit (see compaction.py)."""
+    db.execute('''CREATE TABLE IF NOT EXISTS history_bitmaps (
+                    habit_id INTEGER PRIMARY KEY,
+                    base_day INTEGER NOT NULL,
+                    bits BLOB NOT NULL,
+                    FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
+                )''')
+
+
+def _add_leaderboard_columns(db: sqlite3.Connection):
+    """
+    Version 8: the streak leaderboard. live_run is the current run until a lazy sweep zeroes it once
+    expires_day (streak_expiry_day_sql) has passed; both are indexed for top-K reads.
+    """
+    cursor = db.cursor()
+    cursor.execute("PRAGMA table_info(streak_state)")
+    columns = {row[1] for row in cursor.fetchall()}
+    if "live_run" not in columns:
+        cursor.execute("ALTER TABLE streak_state ADD COLUMN live_run INTEGER NOT NULL DEFAULT 0")
+    if "expires_day" not in columns:
+        cursor.execute("ALTER TABLE streak_state ADD COLUMN expires_day INTEGER")
+    cursor.execute(f"""UPDATE streak_state SET live_run = current_run,
+                           expires_day = (SELECT {streak_expiry_day_sql('streak_state.last_period', 'periodicity',
+                                                                        'interval_days')}
+                                          FROM habits WHERE habits.id = streak_state.habit_id)""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_streak_state_live ON streak_state(live_run, expires_day)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_streak_state_longest ON streak_state(longest_run)")
+    # Only rows the sweep still has to demote are in this index, so a sweep reads nothing else.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_streak_state_expiry ON streak_state(expires_day) "
+                   "WHERE live_run > 0")
+
+
+def _add_completion_counts(db: sqlite3.Connection):
+    """Version 9: a completion count per counters row, used by the 'period' increment mode."""
+    cursor = db.cursor()
+    cursor.execute("PRAGMA table_info(counters)")
+    if "completions" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE counters ADD COLUMN completions INTEGER NOT NULL DEFAULT 1")
+
+
+def _create_change_log_tables(db: sqlite3.Connection):
+    """
+    Version 10: the append-only change log tailed by replicator.py, and the checkpoint a replica keeps of it.
+    The log has no foreign key, so the changes of a deleted habit stay in it.
+    """
+    db.execute('''CREATE TABLE IF NOT EXISTS change_log (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    operation TEXT NOT NULL CHECK(operation IN ('add_habit', 'delete_habit', 'increment', 'reset')),
+                    habit_id INTEGER NOT NULL,
+                    payload TEXT,
+                    changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )''')
+    db.execute('''CREATE TABLE IF NOT EXISTS replication_checkpoint (
+                    id INTEGER PRIMARY KEY CHECK(id = 1),
+                    last_seq INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL
+                )''')
+
+
+def _create_period_day_counts_table(db: sqlite3.Connection):
+    """
+    Version 11: per-day check-in counts of the 'period' increment mode, whose counters rows fold a whole
+    period. Databases converted before this version only know each row's total, which is kept on its day.
+    """
+    db.execute('''CREATE TABLE IF NOT EXISTS period_day_counts (
+                    habit_id INTEGER NOT NULL,
+                    day_ordinal INTEGER NOT NULL,
+                    completions INTEGER NOT NULL,
+                    PRIMARY KEY (habit_id, day_ordinal),
+                    FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
+                ) WITHOUT ROWID''')
+    if period_upserts_enabled(db):
+        _record_period_day_counts(db)
+
+
+def _key_counters_by_timestamp(db: sqlite3.Connection):
+    """
+    Version 12: counters is rebuilt without the TEXT increment_date column, and (habit_id, increment_ts) becomes
+    its unique key and sort order; readers derive the ISO-8601 text from increment_ts. Rows that only differed
+    below the second are merged into the oldest one, keeping their summed completion count.
+    """
+    unique_periods = period_upserts_enabled(db)
+    cursor = db.cursor()
+    cursor.execute('''CREATE TABLE counters_new (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        habit_id INTEGER NOT NULL,
+                        increment_ts INTEGER NOT NULL,
+                        day_ordinal INTEGER NOT NULL,
+                        period_key INTEGER,
+                        completions INTEGER NOT NULL DEFAULT 1,
+                        FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
+                    )''')
+    cursor.execute("""INSERT INTO counters_new (id, habit_id, increment_ts, day_ordinal, period_key, completions)
+                      SELECT MIN(id), habit_id, increment_ts, MIN(day_ordinal), MIN(period_key), SUM(completions)
+                      FROM counters GROUP BY habit_id, increment_ts""")
+    cursor.execute("DROP TABLE counters")
+    cursor.execute("ALTER TABLE counters_new RENAME TO counters")
+    cursor.execute("CREATE UNIQUE INDEX idx_counters_habit_ts ON counters(habit_id, increment_ts)")
+    if unique_periods:
+        cursor.execute("CREATE UNIQUE INDEX idx_counters_habit_period_unique ON counters(habit_id, period_key)")
+    else:
+        cursor.execute("CREATE INDEX idx_counters_habit_period ON counters(habit_id, period_key)")
+
+
+def _log_compaction_changes(db: sqlite3.Connection):
+    """
+    Version 13: compaction runs are written to the change log, so replicas fold the same rows. SQLite cannot
+    alter the CHECK constraint on change_log.operation, so the table is rebuilt with its sequence kept.
+    """
+    cursor = db.cursor()
+    cursor.execute('''CREATE TABLE change_log_new (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        operation TEXT NOT NULL
+                            CHECK(operation IN ('add_habit', 'delete_habit', 'increment', 'reset', 'compact')),
+                        habit_id INTEGER NOT NULL,
+                        payload TEXT,
+                        changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )''')
+    cursor.execute("INSERT INTO change_log_new (seq, operation, habit_id, payload, changed_at) "
+                   "SELECT seq, operation, habit_id, payload, changed_at FROM change_log")
+    # Keep AUTOINCREMENT's high-water mark, so a replica's checkpoint never points past a reused number.
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+    sequence = cursor.fetchone()
+    cursor.execute("DROP TABLE change_log")
+    cursor.execute("ALTER TABLE change_log_new RENAME TO change_log")
+    if sequence:
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'change_log'")
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', ?)", (sequence[0],))
+
+
+# Ordered list of (version, migration). Append new migrations; never edit or reorder applied ones.
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _create_base_tables),
+    (2, _create_streak_state_table),
+    (3, _add_integer_counter_columns),
+    (4, _add_counter_indexes),
+    (5, _create_rollup_tables),
+    (6, _add_period_keys),
+    (7, _create_history_bitmaps_table),
+    (8, _add_leaderboard_columns),
+    (9, _add_completion_counts),
+    (10, _create_change_log_tables),
+    (11, _create_period_day_counts_table),
+    (12, _key_counters_by_timestamp),
+    (13, _log_compaction_changes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(db: sqlite3.Connection) -> int:
+    """Returns the schema version recorded in the database file."""
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(db: sqlite3.Connection) -> List[int]:
+    """
+    Upgrades the database in place to the latest schema version.
+    Each migration is committed together with its new user_version. Returns the versions applied.
+    """
+    current_version = get_schema_version(db)
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version <= current_version:
+            continue
+        migration(db)
+        db.execute(f"PRAGMA user_version = {version}")
+        db.commit()
+        applied.append(version)
+    if config.INCREMENT_MODE == "period":
+        enable_period_upserts(db)
+    return applied
+
+
+def period_upserts_enabled(db: sqlite3.Connection) -> bool:
+    """Returns True once counters holds at most one row per habit and period (see enable_period_upserts)."""
+    return db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_counters_habit_period_unique'"
+                      ).fetchone() is not None
+
+
+def _record_period_day_counts(db: sqlite3.Connection):
+    """Replaces period_day_counts with the check-ins per habit and day of the counters rows."""
+    db.execute("DELETE FROM period_day_counts")
+    db.execute("INSERT INTO period_day_counts (habit_id, day_ordinal, completions) "
+               "SELECT habit_id, day_ordinal, SUM(completions) FROM counters WHERE day_ordinal IS NOT NULL "
+               "GROUP BY habit_id, day_ordinal")
+
+
+def enable_period_upserts(db: sqlite3.Connection) -> int:
+    """
+    Switches counters to one row per habit and period: the rows of each period are folded into its earliest
+    one, which keeps their summed completion count, and (habit_id, period_key) becomes a unique index that
+    replaces the plain one. The check-ins per day are kept in period_day_counts first, so rollups can still
+    credit each one to its own day. Runs in one transaction and only once. Returns the number of rows folded.
+    """
+    if period_upserts_enabled(db):
+        return 0
+    cursor = db.cursor()
+    cursor.execute("""CREATE TEMP TABLE counter_periods AS
+                      SELECT id,
+                             ROW_NUMBER() OVER (PARTITION BY habit_id, period_key ORDER BY increment_ts) AS position,
+                             SUM(completions) OVER (PARTITION BY habit_id, period_key) AS total
+                      FROM counters WHERE period_key IS NOT NULL""")
+    try:
+        _record_period_day_counts(db)
+        cursor.execute("UPDATE counters SET completions = (SELECT total FROM counter_periods p WHERE p.id = counters.id) "
+                       "WHERE id IN (SELECT id FROM counter_periods WHERE position = 1 AND total > 1)")
+        cursor.execute("DELETE FROM counters WHERE id IN (SELECT id FROM counter_periods WHERE position > 1)")
+        folded = cursor.rowcount
+        cursor.execute("CREATE UNIQUE INDEX idx_counters_habit_period_unique ON counters(habit_id, period_key)")
+        cursor.execute("DROP INDEX IF EXISTS idx_counters_habit_period")
+        db.commit()
+    except sqlite3.Error:
+        db.rollback()
+        raise
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS temp.counter_periods")
+    return folded
+
+
+def migrate_counters_to_integer_storage(db: sqlite3.Connection, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Backfills the INTEGER columns of rows written before they existed, walking the table by id range.
+    Each batch is committed on its own, so the application can keep reading and writing while it runs.
+    Returns the number of rows migrated.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM counters WHERE increment_ts IS NULL")
+    first_id, last_id = cursor.fetchone()
+    if first_id is None:
+        return 0
+
+    migrated = 0
+    for batch_start in range(first_id, last_id + 1, batch_size):
+        cursor.execute(f"""UPDATE counters
+                           SET increment_ts = CAST(strftime('%s', increment_date) AS INTEGER),
+                               day_ordinal = CAST(julianday(date(increment_date)) - {JULIAN_ORDINAL_OFFSET} AS INTEGER)
+                           WHERE id >= ? AND id < ? AND increment_ts IS NULL""",
+                       (batch_start, batch_start + batch_size))
+        migrated += cursor.rowcount
+        db.commit()
+    return migrated
+
+
+def backfill_period_keys(db: sqlite3.Connection, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Fills in the period key of rows written before the column existed, in committed batches by id range.
+    Returns the number of rows updated.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM counters WHERE period_key IS NULL")
+    first_id, last_id = cursor.fetchone()
+    if first_id is None:
+        return 0
+
+    period_key = period_key_sql("counters.day_ordinal", "h.periodicity", "h.interval_days")
+    updated = 0
+    for batch_start in range(first_id, last_id + 1, batch_size):
+        cursor.execute(f"""UPDATE counters
+                           SET period_key = (SELECT {period_key} FROM habits h WHERE h.id = counters.habit_id)
+                           WHERE id >= ? AND id < ? AND period_key IS NULL""",
+                       (batch_start, batch_start + batch_size))
+        updated += cursor.rowcount
+        db.commit()
+    return updated
@@ -0,0 +1,112 @@
+"""
+Parallel analytics: habits are partitioned into id ranges whose streaks are computed in a process pool,
+each worker reading through its own read-only connection. Small populations stay serial.
+"""
+import argparse
+import datetime
+import sqlite3
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import config
+import connections
+import db as database_module
+import streaks
+from counter import HISTORY_TYPECODE
+
+# Each worker gets several ranges, so one slow range (a few habits with long histories) does not idle the rest.
+RANGES_PER_WORKER = 4
+
+
+def habit_id_ranges(habit_ids: List[int], parts: int) -> List[Tuple[int, int]]:
+    """Splits sorted habit ids into at most `parts` inclusive (first_id, last_id) ranges of similar size."""
+    if not habit_ids:
+        return []
+    parts = max(1, min(parts, len(habit_ids)))
+    size, extra = divmod(len(habit_ids), parts)
+    ranges, start = [], 0
+    for part in range(parts):
+        end = start + size + (1 if part < extra else 0)
+        ranges.append((habit_ids[start], habit_ids[end - 1]))
+        start = end
+    return ranges
+
+
+def streaks_for_id_range(db_conn: sqlite3.Connection, first_id: int, last_id: int,
+                         current_system_date: datetime.datetime) -> List[Tuple[int, Tuple[int, int]]]:
+    """
+    Computes (habit_id, (current, longest)) for the habits in an id range, ordered by id.
+    The epoch seconds go straight into the integer streak path, without creating datetime objects.
+    """
+    habits = database_module.get_habit_details_in_id_range(db_conn, first_id, last_id)
+    histories: Dict[int, array] = {row["id"]: array(HISTORY_TYPECODE) for row in habits}
+    for habit_id, timestamp in database_module.iter_increment_timestamps_in_id_range(db_conn, first_id, last_id):
+        if habit_id in histories:
+            histories[habit_id].append(timestamp)
+    results = streaks.compute_streaks_many_from_timestamps(
+        [(row["periodicity"], datetime.datetime.fromisoformat(row["creation_date"]), histories[row["id"]],
+          row["interval_days"]) for row in habits], current_system_date)
+    return [(row["id"], result) for row, result in zip(habits, results)]
+
+
+def _worker(db_path: str, first_id: int, last_id: int,
+            current_system_date: datetime.datetime) -> List[Tuple[int, Tuple[int, int]]]:
+    """Process-pool entry point: computes one id range on the worker's own read-only connection."""
+    db_conn = connections.open_connection(db_path, read_only=True)
+    try:
+        return streaks_for_id_range(db_conn, first_id, last_id, current_system_date)
+    finally:
+        db_conn.close()
+
+
+def compute_streaks_parallel(db_conn: sqlite3.Connection, current_system_date: Optional[datetime.datetime] = None,
+                             workers: Optional[int] = None,
+                             threshold: Optional[int] = None) -> Dict[int, Tuple[int, int]]:
+    """
+    Returns {habit_id: (current_streak, longest_streak)} for every habit, ordered by habit id.
+    Runs serially on `db_conn` when there are fewer than `threshold` habits, only one worker is configured,
+    or the database has no file the workers could open (e.g. ':memory:'). Each worker reads its own
+    snapshot, so writes committed during the run may be visible to some ranges only.
+    """
+    if not db_conn:
+        raise ValueError("Database connection is required")
+    today = current_system_date or datetime.datetime.now()
+    workers = workers or config.ANALYTICS_WORKERS
+    threshold = config.PARALLEL_ANALYTICS_THRESHOLD if threshold is None else threshold
+
+    habit_ids = database_module.get_habit_ids(db_conn)
+    db_path = connections.database_path(db_conn)
+    if not habit_ids:
+        return {}
+    if workers <= 1 or len(habit_ids) < threshold or db_path is None:
+        return dict(streaks_for_id_range(db_conn, habit_ids[0], habit_ids[-1], today))
+
+    ranges = habit_id_ranges(habit_ids, workers * RANGES_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        futures = [pool.submit(_worker, str(db_path), first_id, last_id, today) for first_id, last_id in ranges]
+        # Ranges are disjoint and submitted in id order, so merging in submission order is deterministic.
+        return {habit_id: result for future in futures for habit_id, result in future.result()}
+
+
+def main() -> None:
+    """Command-line entry point printing a streak report for every habit."""
+    parser = argparse.ArgumentParser(description="Compute the streaks of all habits with a process pool.")
+    parser.add_argument("--workers", type=int, default=config.ANALYTICS_WORKERS)
+    parser.add_argument("--threshold", type=int, default=config.PARALLEL_ANALYTICS_THRESHOLD,
+                        help="habit count below which the report is computed serially")
+    args = parser.parse_args()
+
+    db_conn = database_module.get_db()
+    try:
+        names = {row["id"]: row["name"] for row in database_module.get_all_habit_details(db_conn)}
+        all_streaks = compute_streaks_parallel(db_conn, workers=args.workers, threshold=args.threshold)
+    finally:
+        db_conn.close()
+    for habit_id, (current, longest) in all_streaks.items():
+        print(f"- '{names.get(habit_id, habit_id)}' | Current Streak: {current}, Longest: {longest}")
+    print(f"Longest streak overall: {max((longest for _, longest in all_streaks.values()), default=0)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import datetime
 import random
 import os
 
+import config
 import db as database_module
 
 # The 5 predefined habits from your original project
@@ -20,10 +21,14 @@ def run_preload():
     Ensures a completely fresh start by deleting the old database file,
     creating new tables, and then preloading it with 5 habits and 30 days of sample data.
     """
-    db_path = os.path.join("data", "user_habits.db")
+    db_path = str(config.DB_FILE)
     if os.path.exists(db_path):
         try:
             os.remove(db_path)
+            # In WAL mode the database also keeps a write-ahead log and shared-memory index next to it.
+            for sidecar in (db_path + "-wal", db_path + "-shm"):
+                if os.path.exists(sidecar):
+                    os.remove(sidecar)
             print(f"Successfully deleted old database file at: {db_path}")
         except OSError as e:
             print(f"Error deleting file {db_path}: {e}")
@@ -54,15 +59,14 @@ def run_preload():
                 print(f"Created habit: '{name}'")
 
                 if habit_id:
-                    completions = 0
+                    completion_times = []
                     for i in range(30):
                         day_to_check = today - datetime.timedelta(days=i)
                         chance = 0.8 if period == "Daily" else 0.7
                         if random.random() < chance:
-                            completion_time = datetime.datetime.combine(day_to_check,
-                                                                        datetime.time(random.randint(9, 20)))
-                            database_module.add_increment_date_to_db(db_conn, habit_id, completion_time)
-                            completions += 1
+                            completion_times.append(datetime.datetime.combine(day_to_check,
+                                                                              datetime.time(random.randint(9, 20))))
+                    completions = database_module.add_increments_bulk(db_conn, habit_id, completion_times)
                     print(f"-> Processed {completions} sample increments for '{name}'.")
             except Exception as e:
                 print(f"Error processing '{name}': {e}")
@@ -0,0 +1,198 @@
+"""
+Read replica: a second SQLite file that reports and analytics read instead of the primary database, so
+expensive queries never compete with check-ins for it. The replica starts as a snapshot (SQLite backup API)
+and then follows the primary's change log, applying new changes in batches; compaction runs are logged and
+replayed too, so the replica's history bitmaps match the primary's. Each batch commits together
+with the replica's checkpoint, so an interrupted run resumes exactly where it stopped.
+
+    python replicator.py --once                     # catch up with the change log and exit
+    python replicator.py --replica data/replica.db  # keep following it, polling every few seconds
+"""
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+import config
+import connections
+import db as database_module
+import compaction
+import migrations
+import streaks
+
+
+class ReplicationSummary(NamedTuple):
+    """What one replicate() call did."""
+    changes: int
+    batches: int
+    last_seq: int
+    snapshot: bool
+
+
+def create_snapshot(source_conn: sqlite3.Connection, replica_path: Union[str, Path]) -> int:
+    """
+    Replaces the replica with a consistent copy of the source database and returns the sequence number
+    of the last change the copy contains. The copied change log is emptied; a replica is not a source.
+    """
+    replica_path = Path(replica_path)
+    source_path = connections.database_path(source_conn)
+    if source_path is not None and source_path.resolve() == replica_path.resolve():
+        raise ValueError(f"Refusing to replace the source database at {replica_path} with a replica")
+    for path in (replica_path, Path(f"{replica_path}-wal"), Path(f"{replica_path}-shm")):
+        if path.exists():
+            os.remove(path)
+    replica_conn = connections.open_connection(replica_path)
+    try:
+        # One backup step copies every page under a single read transaction, i.e. one consistent state.
+        source_conn.backup(replica_conn)
+        _, last_seq = database_module.get_change_log_bounds(replica_conn)
+        database_module.prune_change_log(replica_conn, last_seq, commit=False)
+        database_module.save_replication_checkpoint(replica_conn, last_seq)
+    finally:
+        replica_conn.close()
+    return last_seq
+
+
+def apply_change(replica_conn: sqlite3.Connection, change: sqlite3.Row) -> None:
+    """Replays one change_log row on the replica, maintaining rollups and streak state; does not commit."""
+    operation, habit_id = change['operation'], change['habit_id']
+    payload = json.loads(change['payload']) if change['payload'] else {}
+    if operation == "add_habit":
+        database_module.add_habit_to_db(replica_conn, payload['name'], payload['description'], payload['periodicity'],
+                                        datetime.datetime.fromisoformat(payload['creation_date']),
+                                        payload['interval_days'], habit_id=habit_id, commit=False,
+                                        record_change=False)
+    elif operation == "delete_habit":
+        database_module.delete_habit_from_db(replica_conn, habit_id, commit=False, record_change=False)
+    elif operation == "reset":
+        database_module.reset_increments_for_habit(replica_conn, habit_id, commit=False, record_change=False)
+        database_module.save_streak_state(replica_conn, habit_id, *streaks.EMPTY_STREAK_STATE, commit=False)
+    elif operation == "compact":
+        compaction.compact_habit(replica_conn, habit_id, datetime.datetime.fromisoformat(payload['horizon']),
+                                 commit=False, record_change=False)
+    elif operation == "increment":
+        habit = database_module.get_habit_details_by_id(replica_conn, habit_id)
+        if habit is None:
+            raise ValueError(f"Change {change['seq']} increments habit {habit_id}, which the replica does not have")
+        creation_date = datetime.datetime.fromisoformat(habit['creation_date'])
+        dates = [datetime.datetime.fromisoformat(date) for date in payload['dates']]
+        if len(dates) == 1:
+            database_module.add_increment_date_to_db(replica_conn, habit_id, dates[0], commit=False,
+                                                     record_change=False)
+            streaks.record_increment(replica_conn, habit_id, habit['periodicity'], creation_date, dates[0],
+                                     habit['interval_days'])
+        else:
+            database_module.add_increments_bulk(replica_conn, habit_id, dates, commit=False, record_change=False)
+            # Analytics connections to the replica are read-only and could not persist a rebuilt state themselves.
+            streaks.rebuild_streak_state(replica_conn, habit_id, habit['periodicity'], creation_date, commit=False,
+                                         interval_days=habit['interval_days'])
+    else:
+        raise ValueError(f"Unknown change operation: {operation}")
+
+
+def sync(source_conn: sqlite3.Connection, replica_conn: sqlite3.Connection,
+         batch_size: Optional[int] = None) -> ReplicationSummary:
+    """Applies every change after the replica's checkpoint, one transaction per batch of `batch_size` changes."""
+    batch_size = batch_size or config.REPLICATION_BATCH_SIZE
+    last_seq = database_module.get_replication_checkpoint(replica_conn)
+    if last_seq is None:
+        raise ValueError("The target database is not a replica; create it with create_snapshot()")
+    changes = batches = 0
+    while True:
+        batch = database_module.get_changes_after(source_conn, last_seq, batch_size)
+        if not batch:
+            break
+        try:
+            for change in batch:
+                apply_change(replica_conn, change)
+            last_seq = batch[-1]['seq']
+            database_module.save_replication_checkpoint(replica_conn, last_seq, commit=False)
+            replica_conn.commit()
+        except Exception:
+            replica_conn.rollback()
+            raise
+        changes += len(batch)
+        batches += 1
+    return ReplicationSummary(changes, batches, last_seq, False)
+
+
+def _can_resume(source_conn: sqlite3.Connection, checkpoint: Optional[int]) -> bool:
+    """True if the source's change log still holds every change after the checkpoint."""
+    if checkpoint is None:
+        return False
+    first_seq, last_seq = database_module.get_change_log_bounds(source_conn)
+    if last_seq < checkpoint:  # the source was replaced by a different database
+        return False
+    return last_seq == checkpoint or (first_seq is not None and first_seq <= checkpoint + 1)
+
+
+def replicate(source_conn: sqlite3.Connection, replica_path: Union[str, Path, None] = None,
+              batch_size: Optional[int] = None) -> ReplicationSummary:
+    """
+    Brings the replica (default: config.REPLICA_DB_FILE) up to date with the source. It is created from a
+    snapshot if it does not exist yet, or if the source's log was pruned past its checkpoint.
+    """
+    replica_path = Path(replica_path or config.REPLICA_DB_FILE or "")
+    if not replica_path.name:
+        raise ValueError("No replica path given and HABIT_REPLICA_DB_PATH is not set")
+    snapshot = False
+    if replica_path.exists():
+        replica_conn = connections.open_connection(replica_path)
+        migrations.apply_migrations(replica_conn)
+        if not _can_resume(source_conn, database_module.get_replication_checkpoint(replica_conn)):
+            replica_conn.close()
+            replica_conn = None
+    else:
+        replica_conn = None
+    if replica_conn is None:
+        create_snapshot(source_conn, replica_path)
+        snapshot = True
+        replica_conn = connections.open_connection(replica_path)
+    try:
+        summary = sync(source_conn, replica_conn, batch_size)
+    finally:
+        replica_conn.close()
+    return summary._replace(snapshot=snapshot)
+
+
+def main() -> None:
+    """Command-line entry point: keeps the replica of the application database up to date."""
+    parser = argparse.ArgumentParser(description="Maintain a read replica of the habit database from its change log.")
+    parser.add_argument("--replica", type=Path, default=config.REPLICA_DB_FILE,
+                        help="replica file (default: HABIT_REPLICA_DB_PATH)")
+    parser.add_argument("--batch-size", type=int, default=config.REPLICATION_BATCH_SIZE)
+    parser.add_argument("--poll", type=float, default=config.REPLICATION_POLL_SECONDS, help="seconds between polls")
+    parser.add_argument("--once", action="store_true", help="catch up once and exit")
+    parser.add_argument("--prune", action="store_true",
+                        help="delete applied changes from the source log (only with a single replica)")
+    args = parser.parse_args()
+    if args.replica is None:
+        parser.error("give --replica or set HABIT_REPLICA_DB_PATH")
+    if not config.CHANGE_LOG_ENABLED:
+        print("Warning: the change log is off here; processes that write must set HABIT_REPLICA_DB_PATH "
+              "or HABIT_CHANGE_LOG=1, or the replica will not see their changes.")
+
+    source_conn = database_module.get_db()
+    try:
+        while True:
+            summary = replicate(source_conn, args.replica, args.batch_size)
+            if args.prune and summary.last_seq:
+                database_module.prune_change_log(source_conn, summary.last_seq)
+            if summary.snapshot or summary.changes:
+                print(f"{'Snapshot taken; a' if summary.snapshot else 'A'}pplied {summary.changes} change(s) "
+                      f"in {summary.batches} batch(es), up to #{summary.last_seq}.")
+            if args.once:
+                break
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        source_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,100 @@
+-- Reference schema at the latest version (PRAGMA user_version = 13).
+-- The live schema is created and upgraded in place by migrations.py.
+
 CREATE TABLE IF NOT EXISTS habits (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL UNIQUE,
     description TEXT,
-    periodicity TEXT CHECK(periodicity IN ('Daily', 'Weekly')) NOT NULL,
-    creation_date TIMESTAMP NOT NULL
+    periodicity TEXT CHECK(periodicity IN ('Daily', 'Weekly', 'Monthly', 'Custom')) NOT NULL,
+    creation_date TIMESTAMP NOT NULL,
+    interval_days INTEGER CHECK(interval_days >= 1),  -- length in days of a Custom habit's period
+    CHECK((periodicity = 'Custom') = (interval_days IS NOT NULL))
 );
 
 CREATE TABLE IF NOT EXISTS counters (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     habit_id INTEGER NOT NULL,
-    increment_date TIMESTAMP NOT NULL,
-    FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE,
-    -- Prevent duplicate increments for the same habit at the exact same second.
-    UNIQUE(habit_id, increment_date)
+    increment_ts INTEGER NOT NULL,  -- epoch seconds of the completion's wall-clock time
+    day_ordinal INTEGER NOT NULL,   -- proleptic Gregorian day ordinal of increment_ts
+    period_key INTEGER,    -- period of day_ordinal under the habit's periodicity (migrations.period_key_sql)
+    completions INTEGER NOT NULL DEFAULT 1,  -- check-ins folded into this row ('period' increment mode)
+    FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS streak_state (
+    habit_id INTEGER PRIMARY KEY,
+    last_period INTEGER,
+    current_run INTEGER NOT NULL DEFAULT 0,
+    longest_run INTEGER NOT NULL DEFAULT 0,
+    live_run INTEGER NOT NULL DEFAULT 0,  -- current_run, zeroed by the leaderboard sweep once expires_day has passed
+    expires_day INTEGER,                  -- first day ordinal on which the current run is broken
+    FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+);
+
+-- Completion history older than the compaction horizon (compaction.py): bit i of the little-endian
+-- BLOB is set if the habit was completed on day ordinal base_day + i. Readers merge it with counters.
+CREATE TABLE IF NOT EXISTS history_bitmaps (
+    habit_id INTEGER PRIMARY KEY,
+    base_day INTEGER NOT NULL,
+    bits BLOB NOT NULL,
+    FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+);
+
+-- Completion counts per habit and day / Monday-based week ((day_ordinal - 1) / 7), kept up to date by
+-- the write functions in db.py. They answer completion-rate, heatmap and weekday queries by range scan.
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    habit_id INTEGER NOT NULL,
+    day_ordinal INTEGER NOT NULL,
+    completions INTEGER NOT NULL,
+    PRIMARY KEY (habit_id, day_ordinal),
+    FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS weekly_rollup (
+    habit_id INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    completions INTEGER NOT NULL,
+    PRIMARY KEY (habit_id, week),
+    FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- In 'period' increment mode: check-ins per habit and day, as counters keeps one row per period.
+-- rebuild_rollups reads these instead of the period rows so each check-in stays on its own day.
+CREATE TABLE IF NOT EXISTS period_day_counts (
+    habit_id INTEGER NOT NULL,
+    day_ordinal INTEGER NOT NULL,
+    completions INTEGER NOT NULL,
+    PRIMARY KEY (habit_id, day_ordinal),
+    FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Append-only feed of habit adds/deletes, increments, resets and compaction runs, written by db.py and
+-- compaction.py in the transaction of each write and tailed by replicator.py. payload is JSON (the habit
+-- definition, {"dates": [...]} or {"horizon": ...}).
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation TEXT NOT NULL CHECK(operation IN ('add_habit', 'delete_habit', 'increment', 'reset', 'compact')),
+    habit_id INTEGER NOT NULL,
+    payload TEXT,
+    changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
--- Indexes to speed up common lookups
-CREATE INDEX IF NOT EXISTS idx_habits_name ON habits(name);
-CREATE INDEX IF NOT EXISTS idx_counters_habit_id ON counters(habit_id);
\ No newline at end of file
+-- On a read replica: the sequence number of the last change applied, committed with each batch.
+CREATE TABLE IF NOT EXISTS replication_checkpoint (
+    id INTEGER PRIMARY KEY CHECK(id = 1),
+    last_seq INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+-- Prevent duplicate increments for the same habit at the exact same second. The index also
+-- serves every "WHERE habit_id = ? ORDER BY increment_ts" lookup; habits.name is indexed by its UNIQUE constraint.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_counters_habit_ts ON counters(habit_id, increment_ts);
+
+-- Streaks and completion rates read the distinct periods of a habit from this index alone. In 'period'
+-- increment mode it is replaced by the UNIQUE idx_counters_habit_period_unique (migrations.enable_period_upserts).
+CREATE INDEX IF NOT EXISTS idx_counters_habit_period ON counters(habit_id, period_key);
+
+-- Top-K streak leaderboard reads; the partial index holds only the live runs a sweep may have to demote.
+CREATE INDEX IF NOT EXISTS idx_streak_state_live ON streak_state(live_run, expires_day);
+CREATE INDEX IF NOT EXISTS idx_streak_state_longest ON streak_state(longest_run);
+CREATE INDEX IF NOT EXISTS idx_streak_state_expiry ON streak_state(expires_day) WHERE live_run > 0;
@@ -0,0 +1,248 @@
+"""
+Local JSON-over-HTTP service mode built on the standard library:
+
+    GET    /habits[?periodicity=Daily]     habits with their current and longest streaks
+    POST   /habits                         {"name", "periodicity", "description"?, "interval_days"?}
+    GET    /habits/<name>/streak           {"current", "longest"}
+    GET    /leaderboard[?limit=10&by=current|longest&periodicity=Daily]   top habits by streak (limit <= 100)
+    POST   /habits/<name>/increment        {"timestamp"?}  (ISO-8601, default: now)
+    POST   /habits/<name>/reset
+    DELETE /habits/<name>
+    POST   /increments                     {"increments": [{"habit_name", "timestamp"}, ...]}
+
+Connections come from a fixed pool and HTTP/1.1 keep-alive is supported, so a client can
+reuse one TCP connection for many requests.
+"""
+import argparse
+import datetime
+import json
+import logging
+import sqlite3
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import config
+import connections
+import analyse
+import db as database_module
+import importer
+import streaks
+from counter import Counter, get_counter
+
+if TYPE_CHECKING:
+    from writer import WriteQueue
+
+logger = logging.getLogger("habit_tracker.server")
+
+# Upper bound for /leaderboard?limit=, so one request cannot ask for every habit.
+MAX_LEADERBOARD_LIMIT = 100
+
+
+class RequestError(Exception):
+    """An error that is reported to the client with the given HTTP status."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime.datetime]:
+    """Parses an optional ISO-8601 timestamp from a request body."""
+    if value is None:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value).replace(microsecond=0)
+    except (TypeError, ValueError):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid timestamp '{value}'")
+
+
+def _parse_limit(value: Optional[str], default: int = 10) -> int:
+    """Parses the leaderboard limit: a positive integer, capped at MAX_LEADERBOARD_LIMIT."""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid limit '{value}'")
+    if limit < 1:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Limit must be at least 1")
+    return min(limit, MAX_LEADERBOARD_LIMIT)
+
+
+def _require_counter(db_conn: sqlite3.Connection, name: str) -> Counter:
+    """Returns the named habit or fails the request with 404."""
+    counter = get_counter(db_conn, name)
+    if counter is None:
+        raise RequestError(HTTPStatus.NOT_FOUND, f"Habit '{name}' not found")
+    return counter
+
+
+class HabitRequestHandler(BaseHTTPRequestHandler):
+    """Routes JSON requests to Counter, analyse-style queries and the bulk importer."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive; every response therefore carries a Content-Length
+    # Headers and body are written separately; without TCP_NODELAY, Nagle's algorithm and delayed ACKs
+    # would add ~40 ms to every response on a kept-alive connection.
+    disable_nagle_algorithm = True
+    server: "HabitServer"
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+        return body
+
+    def _send_json(self, status: HTTPStatus, payload: object) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            # The body is read up front so that an error response never leaves it unread on a kept-alive socket.
+            body = self._read_json() if method == "POST" else {}
+            with self.server.pool.connection() as db_conn:
+                status, payload = self._route(db_conn, method, parts, query, body)
+        except RequestError as e:
+            status, payload = e.status, {"error": str(e)}
+        except sqlite3.IntegrityError as e:
+            status, payload = HTTPStatus.CONFLICT, {"error": str(e)}
+        except ValueError as e:
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception:
+            # Anything else would drop the connection without a response.
+            logger.exception("Unhandled error in %s %s", method, self.path)
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"}
+        self._send_json(status, payload)
+
+    def _route(self, db_conn: sqlite3.Connection, method: str, parts: List[str], query: Dict[str, str],
+               body: Dict) -> Tuple[HTTPStatus, object]:
+        writer = self.server.writer
+        if parts == ["habits"] and method == "GET":
+            return HTTPStatus.OK, list_habits(db_conn, query.get("periodicity"))
+        if parts == ["habits"] and method == "POST":
+            counter = Counter(body.get("name") or "", body.get("description", ""), body.get("periodicity"),
+                              interval_days=body.get("interval_days"))
+            counter.store(db_conn)
+            return HTTPStatus.CREATED, {"id": counter.habit_id, "name": counter.name}
+        if parts == ["leaderboard"] and method == "GET":
+            limit = _parse_limit(query.get("limit"))
+            return HTTPStatus.OK, [entry._asdict() for entry in analyse.streak_leaderboard(
+                db_conn, limit, query.get("by", "current"), query.get("periodicity"))]
+        if parts == ["increments"] and method == "POST":
+            increments = body.get("increments")
+            if not isinstance(increments, list):
+                raise RequestError(HTTPStatus.BAD_REQUEST, "'increments' must be a list")
+            if not all(isinstance(item, dict) for item in increments):
+                raise RequestError(HTTPStatus.BAD_REQUEST, "Each increment must be a JSON object")
+            rows = [(str(item.get("habit_name", "")).strip(), _parse_timestamp(item.get("timestamp"))
+                     or datetime.datetime.now().replace(microsecond=0)) for item in increments]
+            if writer:
+                return HTTPStatus.OK, writer.submit_import(rows).result()._asdict()
+            return HTTPStatus.OK, importer.import_rows(db_conn, rows)._asdict()
+        if len(parts) == 2 and parts[0] == "habits" and method == "DELETE":
+            _require_counter(db_conn, parts[1]).delete(db_conn, writer=writer)
+            return HTTPStatus.OK, {"deleted": parts[1]}
+        if len(parts) == 3 and parts[0] == "habits":
+            name, action = parts[1], parts[2]
+            if action == "streak" and method == "GET":
+                counter = _require_counter(db_conn, name)
+                return HTTPStatus.OK, {"current": counter.get_current_streak(db_conn),
+                                       "longest": counter.get_longest_streak(db_conn)}
+            if action == "increment" and method == "POST":
+                counter = _require_counter(db_conn, name)
+                counter.increment(db_conn, _parse_timestamp(body.get("timestamp")), writer=writer)
+                return HTTPStatus.OK, {"habit": counter.name}
+            if action == "reset" and method == "POST":
+                _require_counter(db_conn, name).reset(db_conn, writer=writer)
+                return HTTPStatus.OK, {"reset": name}
+        raise RequestError(HTTPStatus.NOT_FOUND, f"No route for {method} {self.path}")
+
+
+def list_habits(db_conn: sqlite3.Connection, periodicity: Optional[str] = None) -> List[Dict[str, object]]:
+    """Returns every habit (optionally of one periodicity) with its streaks, computed for those habits in one query."""
+    all_streaks = streaks.compute_all_streaks(db_conn, periodicity=periodicity)
+    return [{"name": row["name"], "description": row["description"], "periodicity": row["periodicity"],
+             "interval_days": row["interval_days"], "current_streak": all_streaks[row["id"]][0], "longest_streak": all_streaks[row["id"]][1]}
+            for row in database_module.get_all_habit_details(db_conn, periodicity)]
+
+
+class HabitServer(ThreadingHTTPServer):
+    """Threaded HTTP server whose request handlers share a fixed pool of database connections."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], db_path: Union[str, Path, None] = None,
+                 pool_size: Optional[int] = None, writer: Optional["WriteQueue"] = None, verbose: bool = False):
+        self.pool = connections.ConnectionPool(db_path, pool_size or config.SERVER_POOL_SIZE)
+        self.writer = writer
+        self.verbose = verbose
+        try:
+            super().__init__(address, HabitRequestHandler)
+        except OSError:
+            self.pool.close()
+            raise
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.close()
+
+
+def main() -> None:
+    """Command-line entry point for the HTTP service."""
+    parser = argparse.ArgumentParser(description="Serve the habit tracker as a local JSON HTTP API.")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--pool-size", type=int, default=config.SERVER_POOL_SIZE,
+                        help="number of pooled database connections")
+    parser.add_argument("--group-commit", action="store_true",
+                        help="route increments, resets, deletes and batch imports through the group-commit write queue")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    writer = None
+    if args.group_commit:
+        from writer import WriteQueue
+        writer = WriteQueue()
+    server = HabitServer((args.host, args.port), pool_size=args.pool_size, writer=writer, verbose=args.verbose)
+    print(f"Serving habits from {config.DB_FILE} on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if writer:
+            writer.close()
+
+
+if __name__ == "__main__":
+    main()
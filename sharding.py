@@ -0,0 +1,132 @@
+"""
+Multi-tenant storage: each user is routed to one of N SQLite shard files by a stable hash of the user id.
+Writers on different shards never share a database lock, so write throughput grows with the shard count.
+"""
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TypeVar, Union
+
+import config
+import connections
+import db as database_module
+import streaks
+from counter import Counter, get_counter, load_counters
+
+T = TypeVar("T")
+
+# Separates the user id from the habit name in the names stored on a shard; user ids may not contain it.
+NAME_SEPARATOR = "/"
+
+
+class ShardRouter:
+    """
+    Routes users to shard databases and fans admin queries out over all of them.
+    connection(user_id) returns an ordinary connection, so Counter and the db functions work on it unchanged.
+    Shard files are created and migrated on first use. Habit names are unique per shard, so users that
+    share a shard go through store_habit/get_habit/user_habits, which store names as "<user id>/<name>"
+    and hand back Counters carrying the user's own name.
+    """
+
+    def __init__(self, shard_dir: Union[str, Path, None] = None, shard_count: Optional[int] = None,
+                 profile: Optional[str] = None):
+        self.shard_dir = Path(shard_dir or config.SHARD_DIR)
+        self.shard_count = shard_count or config.SHARD_COUNT
+        if self.shard_count < 1:
+            raise ValueError("Shard count must be a positive integer")
+        self.profile = profile
+        self._managers: Dict[int, connections.ConnectionManager] = {}
+        self._lock = threading.Lock()
+
+    def shard_for(self, user_id: Union[str, int]) -> int:
+        """Returns the shard index of a user. Uses blake2b rather than hash(), which is salted per process."""
+        digest = hashlib.blake2b(str(user_id).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.shard_count
+
+    def shard_path(self, shard: int) -> Path:
+        """Returns the database file of a shard."""
+        return self.shard_dir / f"shard_{shard:03d}.db"
+
+    def _manager(self, shard: int) -> connections.ConnectionManager:
+        with self._lock:
+            manager = self._managers.get(shard)
+            if manager is None:
+                manager = connections.ConnectionManager(self.shard_path(shard), self.profile)
+                self._managers[shard] = manager
+            return manager
+
+    def connection(self, user_id: Union[str, int]) -> sqlite3.Connection:
+        """Returns this thread's writer connection to the user's shard, provisioning the shard if needed."""
+        return self._manager(self.shard_for(user_id)).connection()
+
+    def habit_name(self, user_id: Union[str, int], name: str) -> str:
+        """Returns the name a user's habit is stored under on its shard."""
+        user_key = str(user_id)
+        if not user_key or NAME_SEPARATOR in user_key:
+            raise ValueError(f"User id must be non-empty and must not contain '{NAME_SEPARATOR}'")
+        return f"{user_key}{NAME_SEPARATOR}{name.strip()}"
+
+    def store_habit(self, user_id: Union[str, int], habit: Counter) -> Counter:
+        """Stores a new habit for a user on their shard; the Counter keeps the name the user chose."""
+        name = habit.name
+        habit.name = self.habit_name(user_id, name)
+        try:
+            habit.store(self.connection(user_id))
+        finally:
+            habit.name = name
+        return habit
+
+    def get_habit(self, user_id: Union[str, int], name: str) -> Optional[Counter]:
+        """Returns a user's habit by the name they chose, or None."""
+        habit = get_counter(self.connection(user_id), self.habit_name(user_id, name))
+        if habit is not None:
+            habit.name = name.strip()
+        return habit
+
+    def user_habits(self, user_id: Union[str, int]) -> List[Counter]:
+        """Returns all habits of a user; histories load on demand, so other users' increments are not read."""
+        prefix = self.habit_name(user_id, "")
+        habits = [habit for habit in load_counters(self.connection(user_id), with_histories=False)
+                  if habit.name.startswith(prefix)]
+        for habit in habits:
+            habit.name = habit.name[len(prefix):]
+        return habits
+
+    def existing_shards(self) -> List[int]:
+        """Returns the indexes of shards whose database file exists."""
+        return [shard for shard in range(self.shard_count) if self.shard_path(shard).exists()]
+
+    def _query_shard(self, shard: int, query: Callable[[sqlite3.Connection], T]) -> T:
+        db_conn = connections.open_connection(self.shard_path(shard), read_only=True, profile=self.profile)
+        try:
+            return query(db_conn)
+        finally:
+            db_conn.close()
+
+    def fan_out(self, query: Callable[[sqlite3.Connection], T]) -> Dict[int, T]:
+        """Runs query(connection) on a read-only connection to every existing shard in parallel."""
+        shards = self.existing_shards()
+        if not shards:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            results = pool.map(lambda shard: self._query_shard(shard, query), shards)
+            return dict(zip(shards, results))
+
+    def total_habit_count(self) -> int:
+        """Counts the habits of all users on all shards."""
+        return sum(self.fan_out(database_module.count_habits).values())
+
+    def longest_streak_all_shards(self) -> int:
+        """Returns the longest streak of any habit on any shard."""
+        per_shard = self.fan_out(lambda conn: max((longest for _, longest in
+                                                   streaks.compute_all_streaks(conn).values()), default=0))
+        return max(per_shard.values(), default=0)
+
+    def close(self) -> None:
+        """Closes the connections of every shard."""
+        with self._lock:
+            managers, self._managers = list(self._managers.values()), {}
+        for manager in managers:
+            manager.close()
@@ -0,0 +1,519 @@
+"""
+Streak engines: a set-based SQL query that evaluates every habit at once, and the persisted
+per-habit streak state that Counter keeps up to date on every increment, reset and delete.
+"""
+import argparse
+import datetime
+import sqlite3
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import config
+import connections
+import db as database_module
+import migrations
+
+JULIAN_ORDINAL_OFFSET = migrations.JULIAN_ORDINAL_OFFSET
+
+# Gaps-and-islands over the unique completion periods of each habit. Periods are the integer period
+# keys stored on counters (day ordinals, Monday-based week numbers, month numbers or every-N-days
+# blocks, see migrations.period_key_sql), so consecutive periods share the same "period - row_number"
+# island key and the (habit_id, period_key) index serves the scan without touching the table. The run
+# length at each period is its position inside the island, which gives both the longest streak and the
+# streak ending at the latest period on or before today.
+_CREATION_DAY_SQL = f"CAST(julianday(date(creation_date)) - {JULIAN_ORDINAL_OFFSET} AS INTEGER)"
+_ALL_STREAKS_SQL = f'''
+WITH bounds AS (
+    SELECT id AS habit_id,
+           {migrations.period_key_sql(_CREATION_DAY_SQL, "periodicity", "interval_days")} AS first_period,
+           {migrations.period_key_sql(":today_day", "periodicity", "interval_days")} AS today_period
+    FROM habits
+    WHERE :periodicity IS NULL OR periodicity = :periodicity
+),
+periods AS (
+    SELECT DISTINCT c.habit_id, c.period_key AS period, b.today_period
+    FROM bounds b
+    JOIN counters c ON c.habit_id = b.habit_id
+    WHERE c.period_key >= b.first_period
+),
+islands AS (
+    SELECT habit_id, period, today_period,
+           period - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY period) AS island
+    FROM periods
+),
+runs AS (
+    SELECT habit_id, period, today_period,
+           ROW_NUMBER() OVER (PARTITION BY habit_id, island ORDER BY period) AS run_length
+    FROM islands
+),
+longest AS (
+    SELECT habit_id, MAX(run_length) AS longest_streak
+    FROM runs
+    GROUP BY habit_id
+),
+latest AS (
+    -- SQLite returns the bare run_length/today_period columns from the row holding MAX(period).
+    SELECT habit_id, MAX(period) AS period, run_length, today_period
+    FROM runs
+    WHERE period <= today_period
+    GROUP BY habit_id
+)
+SELECT h.id AS habit_id,
+       CASE WHEN la.period >= la.today_period - 1 THEN la.run_length ELSE 0 END AS current_streak,
+       COALESCE(lo.longest_streak, 0) AS longest_streak
+FROM habits h
+LEFT JOIN longest lo ON lo.habit_id = h.id
+LEFT JOIN latest la ON la.habit_id = h.id
+WHERE :periodicity IS NULL OR h.periodicity = :periodicity
+'''
+
+
+def day_ordinal(dt: datetime.date) -> int:
+    """Returns the proleptic Gregorian ordinal of the day of the given date or datetime."""
+    return dt.toordinal()
+
+
+def week_ordinal(dt: datetime.date) -> int:
+    """Returns a Monday-based week number; 0001-01-01 is a Monday, so weeks start at ordinal 1."""
+    return (dt.toordinal() - 1) // 7
+
+
+def month_ordinal(dt: datetime.date) -> int:
+    """Returns a month number, year * 12 + month - 1, so consecutive months differ by one."""
+    return dt.year * 12 + dt.month - 1
+
+
+def period_of(periodicity: str, dt: datetime.date, interval_days: Optional[int] = None) -> int:
+    """Returns the integer period key (day, week, month or every-N-days block) a completion falls into."""
+    return period_of_day(periodicity, dt.toordinal(), interval_days)
+
+
+def period_of_day(periodicity: str, day: int, interval_days: Optional[int] = None) -> int:
+    """
+    Returns the integer period key of a day ordinal; the Python counterpart of migrations.period_key_sql.
+    Custom habits are split into interval_days-long blocks counted from 0001-01-01, the same way weeks are.
+    """
+    if periodicity == "Weekly":
+        return (day - 1) // 7
+    if periodicity == "Monthly":
+        return month_ordinal(datetime.date.fromordinal(day))
+    if periodicity == "Custom":
+        return (day - 1) // interval_days
+    return day
+
+
+class StreakState(NamedTuple):
+    """Persisted streak summary: the latest completed period, the run ending there and the longest run."""
+    last_period: Optional[int]
+    current_run: int
+    longest_run: int
+
+
+EMPTY_STREAK_STATE = StreakState(None, 0, 0)
+
+
+def compute_streak_state(periodicity: str, creation_date: datetime.datetime,
+                         increment_days: Iterable[int], interval_days: Optional[int] = None) -> StreakState:
+    """Recomputes a habit's streak state from the day ordinals of its full completion history."""
+    return streak_state_from_periods((period_of_day(periodicity, day, interval_days) for day in increment_days),
+                                     period_of(periodicity, creation_date, interval_days))
+
+
+def streak_state_from_periods(periods: Iterable[int], first_period: int) -> StreakState:
+    """Computes a streak state from completion period keys in any order; periods before first_period are ignored."""
+    periods = sorted({p for p in periods if p >= first_period})
+    if not periods:
+        return EMPTY_STREAK_STATE
+
+    longest_run = current_run = 0
+    for i, period in enumerate(periods):
+        current_run = current_run + 1 if i > 0 and period == periods[i - 1] + 1 else 1
+        longest_run = max(longest_run, current_run)
+    return StreakState(periods[-1], current_run, longest_run)
+
+
+def period_bitmap(periodicity: str, base_day: int, bits: bytes, periods: Iterable[int] = (),
+                  interval_days: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Returns (base_period, mask) with bit i of the integer mask set if period base_period + i was completed,
+    combining a history bitmap of days with the period keys of raw completions.
+    For Daily habits the day bitmap already is the period bitmap.
+    """
+    if periodicity == "Daily":
+        base, mask = base_day, int.from_bytes(bits, "little")
+    else:
+        base, mask = period_of_day(periodicity, base_day, interval_days), 0
+        for day in database_module.bitmap_days(base_day, bits):
+            mask |= 1 << (period_of_day(periodicity, day, interval_days) - base)
+    for period in periods:
+        if period < base:  # a raw completion older than the bitmap, e.g. backdated after compaction
+            mask <<= base - period
+            base = period
+        mask |= 1 << (period - base)
+    return base, mask
+
+
+def streak_state_from_bitmap(base_period: int, mask: int, first_period: int) -> StreakState:
+    """Computes a streak state from a period bitmap with bit operations; periods before first_period are ignored."""
+    if first_period > base_period:
+        mask >>= first_period - base_period
+        base_period = first_period
+    if not mask:
+        return EMPTY_STREAK_STATE
+    top = mask.bit_length() - 1
+    # The run ending at the latest period reaches down to the highest unset bit below it.
+    gaps = ~mask & ((1 << top) - 1)
+    current_run = top - gaps.bit_length() + 1
+    # Each step shortens every run of set bits by one, so the number of steps is the longest run.
+    longest_run = 0
+    while mask:
+        mask &= mask >> 1
+        longest_run += 1
+    return StreakState(base_period + top, current_run, longest_run)
+
+
+def compute_streaks_from_bitmap(base_period: int, mask: int, first_period: int,
+                                today_period: int) -> Tuple[int, int]:
+    """(current, longest) streak of a period bitmap, with the current streak taken as of today_period."""
+    longest = streak_state_from_bitmap(base_period, mask, first_period).longest_run
+    if today_period < base_period:
+        return 0, longest
+    state = streak_state_from_bitmap(base_period, mask & ((1 << (today_period - base_period + 1)) - 1), first_period)
+    current = state.current_run if state.last_period is not None and state.last_period >= today_period - 1 else 0
+    return current, longest
+
+
+def advance_streak_state(state: StreakState, period: int) -> Optional[StreakState]:
+    """
+    Applies one new completion period to a streak state in O(1).
+    Returns None when the period lies before the last recorded one, in which case a full recompute is needed.
+    """
+    if state.last_period is None:
+        return StreakState(period, 1, max(state.longest_run, 1))
+    if period == state.last_period:
+        return state
+    if period == state.last_period + 1:
+        return StreakState(period, state.current_run + 1, max(state.longest_run, state.current_run + 1))
+    if period > state.last_period:
+        return StreakState(period, 1, max(state.longest_run, 1))
+    return None
+
+
+def current_streak_from_state(state: StreakState, periodicity: str, current_system_date: datetime.datetime,
+                              interval_days: Optional[int] = None) -> Optional[int]:
+    """
+    Derives the current streak from a streak state.
+    Returns None when the state cannot answer, i.e. the last completion lies after the given date.
+    """
+    if state.last_period is None:
+        return 0
+    today_period = period_of(periodicity, current_system_date, interval_days)
+    if state.last_period > today_period:
+        return None
+    return state.current_run if state.last_period >= today_period - 1 else 0
+
+
+def load_streak_state(db_conn: sqlite3.Connection, habit_id: int) -> Optional[StreakState]:
+    """Reads the persisted streak state of a habit, or None if it has never been built."""
+    row = database_module.get_streak_state(db_conn, habit_id)
+    return StreakState(row['last_period'], row['current_run'], row['longest_run']) if row else None
+
+
+def rebuild_streak_state(db_conn: sqlite3.Connection, habit_id: int, periodicity: str,
+                         creation_date: datetime.datetime, commit: bool = True,
+                         interval_days: Optional[int] = None) -> StreakState:
+    """
+    Recomputes a habit's streak state from the stored period keys of its completions, plus its history
+    bitmap if part of the history is compacted, and persists it.
+    """
+    periods = database_module.get_period_keys_for_habit(db_conn, habit_id)
+    first_period = period_of(periodicity, creation_date, interval_days)
+    bitmap = database_module.get_history_bitmap(db_conn, habit_id)
+    if bitmap is None:
+        state = streak_state_from_periods(periods, first_period)
+    else:
+        state = streak_state_from_bitmap(*period_bitmap(periodicity, bitmap['base_day'], bitmap['bits'], periods,
+                                                        interval_days), first_period)
+    if not connections.is_read_only(db_conn):
+        # Analytics connections are read-only; the state is then persisted by the next writer instead.
+        database_module.save_streak_state(db_conn, habit_id, *state, commit=commit)
+    return state
+
+
+def record_increment(db_conn: sqlite3.Connection, habit_id: int, periodicity: str,
+                     creation_date: datetime.datetime, increment_time: datetime.datetime,
+                     interval_days: Optional[int] = None) -> StreakState:
+    """
+    Updates the streak state after a completion has been written to the counters table.
+    Appends are applied in O(1); backdated completions or a missing state trigger a full recompute.
+    Does not commit, so the caller can make the increment and the state change atomic.
+    """
+    period = period_of(periodicity, increment_time, interval_days)
+    state = load_streak_state(db_conn, habit_id)
+    if state is not None and period < period_of(periodicity, creation_date, interval_days):
+        return state  # Completions before the habit was created never count towards a streak.
+    new_state = advance_streak_state(state, period) if state is not None else None
+    if new_state is None:
+        return rebuild_streak_state(db_conn, habit_id, periodicity, creation_date, commit=False,
+                                    interval_days=interval_days)
+    if new_state != state:
+        database_module.save_streak_state(db_conn, habit_id, *new_state, commit=False)
+    return new_state
+
+
+def build_missing_streak_states(db_conn: sqlite3.Connection) -> Dict[int, StreakState]:
+    """
+    Rebuilds the streak state of every habit that has none yet (new, reset or migrated habits) and returns them.
+    The states are persisted unless the connection is read-only.
+    """
+    built = {}
+    for habit_id in database_module.get_habit_ids_without_streak_state(db_conn):
+        row = database_module.get_habit_details_by_id(db_conn, habit_id)
+        built[habit_id] = rebuild_streak_state(db_conn, habit_id, row['periodicity'],
+                                               datetime.datetime.fromisoformat(row['creation_date']),
+                                               commit=False, interval_days=row['interval_days'])
+    if built and not connections.is_read_only(db_conn):
+        db_conn.commit()
+    return built
+
+
+def _expected_streak_states(db_conn: sqlite3.Connection) -> Dict[int, StreakState]:
+    """Recomputes the streak state of every habit from the counters table using two streaming queries."""
+    habits = {row['id']: row for row in database_module.get_all_habit_details(db_conn)}
+    histories: Dict[int, List[int]] = {habit_id: [] for habit_id in habits}
+    for habit_id, timestamp in database_module.iter_all_increment_timestamps(db_conn):
+        if habit_id in histories:
+            histories[habit_id].append(database_module.day_ordinal_from_timestamp(timestamp))
+    return {
+        habit_id: compute_streak_state(row['periodicity'], datetime.datetime.fromisoformat(row['creation_date']),
+                                       histories[habit_id], row['interval_days'])
+        for habit_id, row in habits.items()
+    }
+
+
+def verify_streak_states(db_conn: sqlite3.Connection) -> List[int]:
+    """Returns the ids of habits whose persisted streak state is missing or differs from a full recompute."""
+    return [habit_id for habit_id, expected in _expected_streak_states(db_conn).items()
+            if load_streak_state(db_conn, habit_id) != expected]
+
+
+def rebuild_all_streak_states(db_conn: sqlite3.Connection) -> int:
+    """Recomputes and persists the streak state of every habit. Returns the number of habits rebuilt."""
+    expected_states = _expected_streak_states(db_conn)
+    database_module.clear_streak_states(db_conn, commit=False)
+    for habit_id, state in expected_states.items():
+        database_module.save_streak_state(db_conn, habit_id, *state, commit=False)
+    db_conn.commit()
+    return len(expected_states)
+
+
+# NumPy is optional and slow to import, so it is only loaded the first time the vectorized backend is needed.
+np = None
+_numpy_available: Optional[bool] = None
+
+
+def numpy_enabled() -> bool:
+    """Returns True if the vectorized NumPy backend is installed and not disabled in the configuration."""
+    global np, _numpy_available
+    if config.STREAK_BACKEND == "python":
+        return False
+    if _numpy_available is None:
+        try:
+            import numpy
+            np = numpy
+            _numpy_available = True
+        except ImportError:  # Streaks are then computed by the pure-Python code paths.
+            _numpy_available = False
+    return _numpy_available
+
+
+def _streaks_from_periods(periods: Iterable[int], first_period: int, today_period: int) -> Tuple[int, int]:
+    """Pure-Python (current, longest) streak over integer periods; the reference for the vectorized backend."""
+    unique_periods = sorted({p for p in periods if p >= first_period})
+    longest_run = current_run = current_streak = 0
+    for i, period in enumerate(unique_periods):
+        current_run = current_run + 1 if i > 0 and period == unique_periods[i - 1] + 1 else 1
+        longest_run = max(longest_run, current_run)
+        if period <= today_period:
+            current_streak = current_run if period >= today_period - 1 else 0
+    return current_streak, longest_run
+
+
+def compute_streaks_batch(periods: "np.ndarray", offsets: "np.ndarray", first_periods: "np.ndarray",
+                          today_periods: "np.ndarray") -> List[Tuple[int, int]]:
+    """
+    Vectorized (current, longest) streaks for many habits at once.
+    `periods` holds the period ordinals of all habits concatenated; habit i owns periods[offsets[i]:offsets[i + 1]].
+    """
+    habit_count = len(offsets) - 1
+    current = np.zeros(habit_count, dtype=np.int64)
+    longest = np.zeros(habit_count, dtype=np.int64)
+    segment = np.repeat(np.arange(habit_count, dtype=np.int64), np.diff(offsets))
+    keep = periods >= first_periods[segment]
+
+    # Packing (habit, period) into one int64 lets a single np.unique dedupe and sort every habit's periods.
+    keys = np.unique((segment[keep] << 32) | periods[keep].astype(np.int64))
+    if keys.size:
+        segment = keys >> 32
+        period = keys & 0xFFFFFFFF
+        index = np.arange(keys.size)
+        run_start = np.ones(keys.size, dtype=bool)
+        run_start[1:] = (np.diff(period) != 1) | (np.diff(segment) != 0)
+        run_length = index - np.maximum.accumulate(np.where(run_start, index, 0)) + 1
+        np.maximum.at(longest, segment, run_length)
+
+        eligible = period <= today_periods[segment]
+        last_index = np.full(habit_count, -1, dtype=np.int64)
+        np.maximum.at(last_index, segment[eligible], index[eligible])
+        has_last = last_index >= 0
+        last = last_index[has_last]
+        alive = period[last] >= today_periods[has_last] - 1
+        current[has_last] = np.where(alive, run_length[last], 0)
+    return list(zip(current.tolist(), longest.tolist()))
+
+
+def _periods_from_days(periodicity: str, days: "np.ndarray", interval_days: Optional[int] = None) -> "np.ndarray":
+    """Vectorized period_of_day over an array of day ordinals."""
+    if periodicity == "Weekly":
+        return (days - 1) // 7
+    if periodicity == "Monthly":
+        # datetime64 counts days and months from 1970-01, so truncating to months yields the month number.
+        months = (days.astype(np.int64) - database_module.EPOCH_DAY_ORDINAL).astype("datetime64[D]").astype("datetime64[M]")
+        return months.astype(np.int64) + 1970 * 12
+    if periodicity == "Custom":
+        return (days - 1) // interval_days
+    return days
+
+
+def _period_array(periodicity: str, increment_dates: Sequence[datetime.datetime],
+                  interval_days: Optional[int] = None) -> "np.ndarray":
+    """Converts a completion history into an int64 array of period keys."""
+    days = np.fromiter((d.toordinal() for d in increment_dates), dtype=np.int64, count=len(increment_dates))
+    return _periods_from_days(periodicity, days, interval_days)
+
+
+def compute_streaks_many(histories: Sequence[Tuple],
+                         current_system_date: Optional[datetime.datetime] = None) -> List[Tuple[int, int]]:
+    """
+    Computes (current, longest) streaks for many (periodicity, creation_date, increment_dates[, interval_days])
+    histories; interval_days is only needed for Custom habits. Uses one batched NumPy evaluation when available,
+    otherwise the pure-Python implementation.
+    """
+    today = current_system_date or datetime.datetime.now()
+    histories = [(history[0], history[1], history[2], history[3] if len(history) > 3 else None)
+                 for history in histories]
+    if not numpy_enabled():
+        return [_streaks_from_periods((period_of(periodicity, d, interval_days) for d in increment_dates),
+                                      period_of(periodicity, creation_date, interval_days),
+                                      period_of(periodicity, today, interval_days))
+                for periodicity, creation_date, increment_dates, interval_days in histories]
+
+    lengths = np.fromiter((len(dates) for _, _, dates, _ in histories), dtype=np.int64, count=len(histories))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    periods = np.concatenate([_period_array(periodicity, dates, interval_days)
+                              for periodicity, _, dates, interval_days in histories]
+                             or [np.empty(0, dtype=np.int64)])
+    first_periods = np.array([period_of(p, created, interval) for p, created, _, interval in histories],
+                             dtype=np.int64)
+    today_periods = np.array([period_of(p, today, interval) for p, _, _, interval in histories], dtype=np.int64)
+    return compute_streaks_batch(periods, offsets, first_periods, today_periods)
+
+
+def compute_streaks_from_timestamps(periodicity: str, creation_date: datetime.datetime,
+                                    timestamps: Sequence[int], current_system_date: datetime.datetime,
+                                    interval_days: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Computes (current, longest) streak of a single habit straight from its epoch-second history,
+    e.g. Counter's array('q'), without creating datetime objects.
+    """
+    first_period = period_of(periodicity, creation_date, interval_days)
+    today_period = period_of(periodicity, current_system_date, interval_days)
+    if not numpy_enabled():
+        days = (database_module.EPOCH_DAY_ORDINAL + ts // database_module.SECONDS_PER_DAY for ts in timestamps)
+        return _streaks_from_periods((period_of_day(periodicity, day, interval_days) for day in days),
+                                     first_period, today_period)
+
+    # array('q') exposes its buffer, so this does not copy the history element by element.
+    days = np.asarray(timestamps, dtype=np.int64) // database_module.SECONDS_PER_DAY + database_module.EPOCH_DAY_ORDINAL
+    periods = _periods_from_days(periodicity, days, interval_days)
+    return compute_streaks_batch(periods, np.array([0, len(periods)]), np.array([first_period]),
+                                 np.array([today_period]))[0]
+
+
+def compute_streaks_many_from_timestamps(histories: Sequence[Tuple[str, datetime.datetime, Sequence[int], Optional[int]]],
+                                         current_system_date: datetime.datetime) -> List[Tuple[int, int]]:
+    """
+    Computes (current, longest) streaks for many (periodicity, creation_date, timestamps, interval_days) histories
+    of epoch seconds in one batched NumPy evaluation, like compute_streaks_many but without datetime objects.
+    """
+    if not numpy_enabled():
+        return [compute_streaks_from_timestamps(periodicity, creation_date, timestamps, current_system_date,
+                                                interval_days)
+                for periodicity, creation_date, timestamps, interval_days in histories]
+
+    lengths = np.fromiter((len(timestamps) for _, _, timestamps, _ in histories), dtype=np.int64,
+                          count=len(histories))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    periods = np.concatenate([_periods_from_days(periodicity, np.asarray(timestamps, dtype=np.int64)
+                                                 // database_module.SECONDS_PER_DAY + database_module.EPOCH_DAY_ORDINAL,
+                                                 interval_days)
+                              for periodicity, _, timestamps, interval_days in histories]
+                             or [np.empty(0, dtype=np.int64)])
+    first_periods = np.array([period_of(p, created, interval) for p, created, _, interval in histories],
+                             dtype=np.int64)
+    today_periods = np.array([period_of(p, current_system_date, interval) for p, _, _, interval in histories],
+                             dtype=np.int64)
+    return compute_streaks_batch(periods, offsets, first_periods, today_periods)
+
+
+def compute_all_streaks(db_conn: sqlite3.Connection, current_system_date: Optional[datetime.datetime] = None,
+                        periodicity: Optional[str] = None) -> Dict[int, Tuple[int, int]]:
+    """
+    Computes the current and longest streak of every habit, or of every habit of one periodicity, in one query.
+    Returns a mapping of habit_id -> (current_streak, longest_streak), matching Counter's semantics.
+    """
+    if not db_conn:
+        raise ValueError("Database connection is required")
+
+    today = (current_system_date or datetime.datetime.now()).date()
+    cursor = db_conn.cursor()
+    cursor.execute(_ALL_STREAKS_SQL, {"today_day": day_ordinal(today), "periodicity": periodicity})
+    results = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    # The query only sees raw completions; habits with compacted history are redone on their bitmaps,
+    # with the period keys of their remaining raw completions fetched for all of them at once.
+    raw_periods = database_module.get_period_keys_for_compacted_habits(db_conn, periodicity)
+    for row in database_module.iter_history_bitmaps(db_conn, periodicity):
+        habit_periodicity, interval_days = row['periodicity'], row['interval_days']
+        base_period, mask = period_bitmap(habit_periodicity, row['base_day'], row['bits'],
+                                          raw_periods.get(row['habit_id'], ()), interval_days)
+        first_period = period_of(habit_periodicity, datetime.datetime.fromisoformat(row['creation_date']),
+                                 interval_days)
+        results[row['habit_id']] = compute_streaks_from_bitmap(base_period, mask, first_period,
+                                                               period_of(habit_periodicity, today, interval_days))
+    return results
+
+
+def main() -> None:
+    """Command-line entry point to verify or rebuild the persisted streak states."""
+    parser = argparse.ArgumentParser(description="Verify or rebuild the persisted streak state table.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute every streak state and completion rollup from the counters table")
+    args = parser.parse_args()
+
+    db_conn = database_module.get_db()
+    try:
+        if args.rebuild:
+            print(f"Rebuilt streak state for {rebuild_all_streak_states(db_conn)} habit(s).")
+            print(f"Rebuilt {database_module.rebuild_rollups(db_conn)} daily completion rollup(s).")
+            return
+        mismatches = verify_streak_states(db_conn)
+        if mismatches:
+            print(f"Streak state is out of date for habit ID(s): {', '.join(map(str, mismatches))}. "
+                  f"Run with --rebuild to fix.")
+        else:
+            print("Streak state is consistent with the completion history.")
+    finally:
+        db_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ from analyse import (
     list_habits_by_periodicity_details
 )
 
+
 @pytest.fixture
 def db_conn():
     """Pytest fixture for an in-memory SQLite database for each test."""
@@ -21,6 +22,7 @@ def db_conn():
     yield conn
     conn.close()
 
+
 # --- Core Functionality Tests ---
 
 def test_create_habit_and_store(db_conn):
@@ -34,6 +36,7 @@ def test_create_habit_and_store(db_conn):
     assert loaded_counter.name == "Test Habit"
     assert datetime.datetime.fromisoformat(loaded_counter.creation_date.isoformat()) == creation_ts
 
+
 def test_increment_habit_adds_to_counters_table(db_conn):
     """Tests if incrementing a habit correctly adds a timestamp to its completion records."""
     counter = Counter("Exercise Daily", "Daily exercise routine", "Daily")
@@ -44,6 +47,7 @@ def test_increment_habit_adds_to_counters_table(db_conn):
     reloaded_counter.load_increment_dates(db_conn)
     assert increment_time in reloaded_counter._increment_dates
 
+
 def test_reset_habit_clears_increments(db_conn):
     """Tests if resetting a habit clears all its completion data but keeps the habit."""
     counter = Counter("Read Every Day", "Daily reading goal", "Daily")
@@ -54,6 +58,7 @@ def test_reset_habit_clears_increments(db_conn):
     reloaded_counter.load_increment_dates(db_conn)
     assert len(reloaded_counter._increment_dates) == 0
 
+
 def test_delete_habit_removes_from_db(db_conn):
     """Tests if deleting a habit removes it and its associated data completely."""
     counter = Counter("Old Habit", "To be deleted", "Daily")
@@ -65,6 +70,7 @@ def test_delete_habit_removes_from_db(db_conn):
     cursor.execute("SELECT * FROM counters WHERE habit_id = ?", (habit_id_to_delete,))
     assert len(cursor.fetchall()) == 0
 
+
 # --- Analytics and Streak Logic Tests (Tutor Feedback) ---
 
 @freeze_time("2025-06-22")
@@ -78,6 +84,7 @@ def test_weekly_streak_calculation(db_conn):
     assert calculate_current_streak_for_habit(db_conn, "Weekly Review") == 3
     assert calculate_longest_streak_for_habit(db_conn, "Weekly Review") == 3
 
+
 @freeze_time("2025-06-22")
 def test_broken_streak_logic(db_conn):
     """Tests that streaks are correctly calculated when there is a gap in completions."""
@@ -91,6 +98,7 @@ def test_broken_streak_logic(db_conn):
     assert calculate_longest_streak_for_habit(db_conn, "Read Daily") == 3
     assert calculate_current_streak_for_habit(db_conn, "Read Daily") == 0
 
+
 def test_analyse_list_by_periodicity(db_conn):
     """Tests the analytics function for listing habits by periodicity."""
     Counter("Daily Task", "A daily habit", "Daily").store(db_conn)
@@ -104,6 +112,7 @@ def test_analyse_list_by_periodicity(db_conn):
     assert len(weekly_habits) == 1
     assert "Weekly Task" == weekly_habits[0].name
 
+
 def test_longest_streak_all_habits_logic(db_conn):
     """Tests that the overall longest streak is correctly identified across all habits."""
     habit1 = Counter("Reading", "Books", "Daily", creation_date=datetime.datetime(2024, 6, 1))
@@ -120,6 +129,7 @@ def test_longest_streak_all_habits_logic(db_conn):
     habit2.increment(db_conn, increment_time=datetime.datetime(2024, 6, 6))
     assert longest_streak_all_habits(db_conn) == 5
 
+
 # --- ADDED BACK FOR FULL COVERAGE ---
 def test_get_habits_list_from_db(db_conn):
     """Tests the basic db helper function to retrieve all habit names."""
@@ -128,4 +138,1148 @@ def test_get_habits_list_from_db(db_conn):
     habits = database_module.get_habits_list(db_conn)
     assert "Habit Alpha" in habits
     assert "Habit Beta" in habits
-    assert len(habits) == 2
\ No newline at end of file
+    assert len(habits) == 2
+
+
+# --- Set-based Streak Engine Tests ---
+
+@freeze_time("2025-06-22 18:00:00")
+def test_streak_engine_matches_counter(db_conn):
+    """Tests that the single-query streak engine agrees with Counter for random daily and weekly histories."""
+    import random
+    from streaks import compute_all_streaks
+    rng = random.Random(42)
+    habits = []
+    for i in range(12):
+        periodicity = "Daily" if i % 2 == 0 else "Weekly"
+        habit = Counter(f"Habit {i}", "Random history", periodicity,
+                        creation_date=datetime.datetime(2025, 3, 1, 12, 30))
+        habit.store(db_conn)
+        for day in range(130):
+            if rng.random() < 0.6:
+                habit.increment(db_conn, increment_time=datetime.datetime(2025, 2, 20, rng.randint(6, 22))
+                                + datetime.timedelta(days=day))
+        habits.append(habit)
+    engine_results = compute_all_streaks(db_conn)
+    for habit in habits:
+        expected = (habit.get_current_streak(db_conn), habit.get_longest_streak(db_conn))
+        assert engine_results[habit.habit_id] == expected
+
+
+def test_weekly_streak_ignores_time_of_day(db_conn):
+    """Tests that weekly completions at different times of day still form consecutive weeks."""
+    habit = Counter("Weekly Run", "Long run", "Weekly", creation_date=datetime.datetime(2025, 5, 1, 9, 15))
+    habit.store(db_conn)
+    habit.increment(db_conn, increment_time=datetime.datetime(2025, 6, 3, 7, 0))
+    habit.increment(db_conn, increment_time=datetime.datetime(2025, 6, 12, 19, 45))
+    assert habit.get_longest_streak(db_conn) == 2
+    assert longest_streak_all_habits(db_conn) == 2
+
+
+# --- Bulk Loader Tests ---
+
+@freeze_time("2025-06-22")
+def test_load_counters_preloads_history(db_conn):
+    """Tests that bulk-loaded counters carry their histories and compute streaks without further queries."""
+    from counter import load_counters
+    daily = Counter("Stretch", "Morning stretch", "Daily", creation_date=datetime.datetime(2025, 6, 1))
+    daily.store(db_conn)
+    for day in (19, 20, 21, 22):
+        daily.increment(db_conn, increment_time=datetime.datetime(2025, 6, day, 7))
+    Counter("Plan Week", "Weekly planning", "Weekly", creation_date=datetime.datetime(2025, 6, 1)).store(db_conn)
+
+    counters = load_counters(db_conn)
+    assert [c.name for c in counters] == ["Plan Week", "Stretch"]
+
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+    stretch = counters[1]
+    assert stretch.get_current_streak(db_conn) == 4
+    assert stretch.get_longest_streak(db_conn) == 4
+    assert counters[0].get_longest_streak(db_conn) == 0
+    db_conn.set_trace_callback(None)
+    assert statements == []
+    assert [c.name for c in load_counters(db_conn, "Weekly")] == ["Plan Week"]
+
+
+# --- Persisted Streak State Tests ---
+
+@freeze_time("2025-06-22")
+def test_streak_state_maintained_incrementally(db_conn):
+    """Tests that streak reads come from the streak state, including after a backdated increment and a reset."""
+    from streaks import StreakState, load_streak_state, period_of
+    habit = Counter("Journal", "Write a page", "Daily", creation_date=datetime.datetime(2025, 6, 1))
+    habit.store(db_conn)
+    for day in (18, 19, 21, 22):
+        habit.increment(db_conn, increment_time=datetime.datetime(2025, 6, day, 21))
+    today = period_of("Daily", datetime.date(2025, 6, 22))
+    assert load_streak_state(db_conn, habit.habit_id) == StreakState(today, 2, 2)
+
+    habit.increment(db_conn, increment_time=datetime.datetime(2025, 6, 20, 8))  # Backdated, fills the gap.
+    assert load_streak_state(db_conn, habit.habit_id) == StreakState(today, 5, 5)
+
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+    reloaded = get_counter(db_conn, "Journal")
+    assert reloaded.get_current_streak(db_conn) == 5
+    assert reloaded.get_longest_streak(db_conn) == 5
+    db_conn.set_trace_callback(None)
+    assert not any("counters" in statement for statement in statements)
+
+    habit.reset(db_conn)
+    assert load_streak_state(db_conn, habit.habit_id) == StreakState(None, 0, 0)
+    assert calculate_longest_streak_for_habit(db_conn, "Journal") == 0
+
+
+def test_verify_and_rebuild_streak_states(db_conn):
+    """Tests that out-of-band writes are detected by verification and repaired by a rebuild."""
+    from streaks import verify_streak_states, rebuild_all_streak_states
+    habit = Counter("Meditate", "Ten minutes", "Daily", creation_date=datetime.datetime(2025, 1, 1))
+    habit.store(db_conn)
+    habit.increment(db_conn, increment_time=datetime.datetime(2025, 1, 2))
+    assert verify_streak_states(db_conn) == []
+    database_module.add_increment_date_to_db(db_conn, habit.habit_id, datetime.datetime(2025, 1, 3))
+    assert verify_streak_states(db_conn) == [habit.habit_id]
+    assert rebuild_all_streak_states(db_conn) == 1
+    assert verify_streak_states(db_conn) == []
+    assert calculate_longest_streak_for_habit(db_conn, "Meditate") == 2
+
+
+# --- Vectorized Streak Backend Tests ---
+
+def test_vectorized_streaks_match_pure_python(monkeypatch):
+    """Tests that the batched NumPy backend returns exactly the pure-Python results."""
+    pytest.importorskip("numpy")
+    import random
+    import config
+    from streaks import compute_streaks_many
+    rng = random.Random(7)
+    now = datetime.datetime(2025, 6, 22, 12)
+    histories = []
+    for i in range(40):
+        start = datetime.datetime(2024, 12, 1) + datetime.timedelta(hours=rng.randint(0, 24 * 60))
+        dates = [start + datetime.timedelta(hours=rng.randint(0, 24 * 220)) for _ in range(rng.randint(0, 300))]
+        histories.append(("Daily" if i % 3 else "Weekly", datetime.datetime(2025, 1, rng.randint(1, 28), 15), dates))
+
+    monkeypatch.setattr(config, "STREAK_BACKEND", "numpy")
+    expected = compute_streaks_many(histories, now)
+    monkeypatch.setattr(config, "STREAK_BACKEND", "auto")
+    assert compute_streaks_many(histories, now) == expected
+    assert compute_streaks_many([], now) == []
+
+
+@freeze_time("2025-06-22")
+def test_counter_streaks_identical_across_backends(db_conn, monkeypatch):
+    """Tests that Counter's history-based streaks do not depend on the selected backend."""
+    import config
+    from counter import load_counters
+    habit = Counter("Walk", "Evening walk", "Daily", creation_date=datetime.datetime(2025, 6, 1))
+    habit.store(db_conn)
+    for day in (2, 3, 4, 5, 9, 20, 21, 22):
+        for hour in (7, 19):
+            habit.increment(db_conn, increment_time=datetime.datetime(2025, 6, day, hour))
+    results = []
+    for backend in ("python", "auto"):
+        monkeypatch.setattr(config, "STREAK_BACKEND", backend)
+        preloaded = load_counters(db_conn)[0]
+        results.append((preloaded.get_current_streak(db_conn), preloaded.get_longest_streak(db_conn)))
+    assert results == [(3, 4), (3, 4)]
+
+
+# --- Integer Timestamp Storage Tests ---
+
+def test_integer_storage_migration_of_legacy_rows():
+    """Tests the batched backfill of TEXT-only rows from older databases and reads after the remaining migrations."""
+    import migrations
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE habits (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, "
+                 "description TEXT, periodicity TEXT NOT NULL, creation_date TEXT NOT NULL)")
+    conn.execute("CREATE TABLE counters (id INTEGER PRIMARY KEY AUTOINCREMENT, habit_id INTEGER NOT NULL, "
+                 "increment_date TEXT NOT NULL)")
+    conn.execute("INSERT INTO habits (name, description, periodicity, creation_date) "
+                 "VALUES ('Legacy', '', 'Daily', '2024-01-01T00:00:00')")
+    legacy_dates = [datetime.datetime(2024, 1, day, 23, 59, 1) for day in range(1, 8)]
+    conn.executemany("INSERT INTO counters (habit_id, increment_date) VALUES (1, ?)",
+                     [(d.isoformat(),) for d in legacy_dates])
+    conn.execute("ALTER TABLE counters ADD COLUMN increment_ts INTEGER")
+    conn.execute("ALTER TABLE counters ADD COLUMN day_ordinal INTEGER")
+    migrations._create_streak_state_table(conn)
+
+    expected = [database_module.to_timestamp(d) for d in legacy_dates]
+    assert migrations.migrate_counters_to_integer_storage(conn, batch_size=3) == 7
+    assert migrations.migrate_counters_to_integer_storage(conn) == 0
+    rows = conn.execute("SELECT increment_ts, day_ordinal FROM counters ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows] == [(ts, d.toordinal()) for ts, d in zip(expected, legacy_dates)]
+    conn.execute("PRAGMA user_version = 3")
+    migrations.apply_migrations(conn)
+    assert "increment_date" not in {row[1] for row in conn.execute("PRAGMA table_info(counters)")}
+    assert database_module.get_increment_timestamps_for_habit(conn, 1) == expected
+    assert database_module.get_increment_dates_for_habit(conn, 1) == legacy_dates
+    conn.close()
+
+
+# --- Schema Migration Tests ---
+
+def test_migrations_upgrade_legacy_database_in_place(tmp_path):
+    """Tests that an unversioned database is upgraded, deduplicated and stamped with the latest user_version."""
+    import migrations
+    db_path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE habits (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, "
+                 "description TEXT, periodicity TEXT NOT NULL CHECK(periodicity IN ('Daily', 'Weekly')), "
+                 "creation_date TEXT NOT NULL)")
+    conn.execute("CREATE TABLE counters (id INTEGER PRIMARY KEY AUTOINCREMENT, habit_id INTEGER NOT NULL, "
+                 "increment_date TEXT NOT NULL, FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE)")
+    conn.execute("INSERT INTO habits VALUES (1, 'Floss', '', 'Daily', '2024-01-01T00:00:00')")
+    conn.executemany("INSERT INTO counters (habit_id, increment_date) VALUES (1, ?)",
+                     [("2024-01-02T08:00:00",), ("2024-01-02T08:00:00",), ("2024-01-03T08:00:00",)])
+    conn.commit()
+    conn.close()
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    assert migrations.apply_migrations(conn) == list(range(1, migrations.LATEST_VERSION + 1))
+    assert migrations.get_schema_version(conn) == migrations.LATEST_VERSION
+    assert migrations.apply_migrations(conn) == []
+    assert conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0] == 2
+    assert conn.execute("SELECT SUM(completions) FROM daily_rollup").fetchone()[0] == 2
+    database_module.add_increment_date_to_db(conn, 1, datetime.datetime(2024, 1, 3, 8))
+    assert conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0] == 2
+    assert calculate_longest_streak_for_habit(conn, "Floss") == 2
+    conn.close()
+
+
+def test_hot_queries_use_indexes(db_conn):
+    """Tests via EXPLAIN QUERY PLAN that the hot queries in db.py neither scan tables nor sort."""
+    habit = Counter("Indexed", "Query plans", "Daily", creation_date=datetime.datetime(2025, 1, 1))
+    habit.store(db_conn)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+    database_module.get_habit_details_by_name(db_conn, "Indexed")
+    database_module.get_increment_timestamps_for_habit(db_conn, habit.habit_id)
+    list(database_module.iter_all_increment_timestamps(db_conn))
+    database_module.get_streak_state(db_conn, habit.habit_id)
+    database_module.get_daily_rollup(db_conn, habit.habit_id, 1, 800000)
+    database_module.get_weekly_rollup(db_conn, habit.habit_id, 1, 100000)
+    database_module.get_period_keys_for_habit(db_conn, habit.habit_id)
+    database_module.get_period_keys_for_habit(db_conn, habit.habit_id, 1, 800000)
+    database_module.reset_increments_for_habit(db_conn, habit.habit_id)
+    db_conn.set_trace_callback(None)
+
+    queries = [s for s in statements if s.lstrip().upper().startswith(("SELECT", "DELETE"))]
+    assert len(queries) == 15
+    for query in queries:
+        plan = " | ".join(row[3] for row in db_conn.execute("EXPLAIN QUERY PLAN " + query).fetchall())
+        assert "TEMP B-TREE" not in plan, query
+        for step in plan.split(" | "):
+            assert not step.startswith("SCAN") or "INDEX" in step, (query, plan)
+
+
+# --- Bulk Ingestion Tests ---
+
+def test_add_increments_bulk_is_idempotent_and_rebuilds_streaks(db_conn):
+    """Tests bulk inserts, duplicate handling and that the streak state reflects the bulk-loaded history."""
+    habit = Counter("Bulk", "Bulk loaded", "Daily", creation_date=datetime.datetime(2024, 1, 1))
+    habit.store(db_conn)
+    habit.increment(db_conn, increment_time=datetime.datetime(2024, 1, 1, 9))
+    history = [datetime.datetime(2024, 1, 1, 9) + datetime.timedelta(days=i) for i in range(10)]
+    assert database_module.add_increments_bulk(db_conn, habit.habit_id, history) == 9
+    assert database_module.add_increments_bulk(db_conn, habit.habit_id, history) == 0
+    assert calculate_longest_streak_for_habit(db_conn, "Bulk") == 10
+    overlapping = history[8:] + [datetime.datetime(2024, 1, 11, 18)] * 2 + [datetime.datetime(2024, 1, 12, 9)]
+    assert database_module.add_increments_bulk(db_conn, habit.habit_id, overlapping) == 2
+    rollup = database_module.get_daily_rollup(db_conn, habit.habit_id, 1, 800000)
+    assert sum(row["completions"] for row in rollup) == 12
+    database_module.rebuild_rollups(db_conn, habit.habit_id)
+    assert database_module.get_daily_rollup(db_conn, habit.habit_id, 1, 800000) == rollup
+
+    assert database_module.add_habits_bulk(db_conn, [("A", "", "Daily", datetime.datetime(2024, 1, 1)),
+                                                     ("B", "", "Weekly", datetime.datetime(2024, 1, 1))]) == 2
+    with pytest.raises(sqlite3.IntegrityError):
+        database_module.add_habits_bulk(db_conn, [("C", "", "Daily", datetime.datetime(2024, 1, 1)),
+                                                  ("A", "", "Daily", datetime.datetime(2024, 1, 1))])
+    assert database_module.get_habits_list(db_conn) == ["A", "B", "Bulk"]
+
+
+def test_import_file_streams_csv_and_jsonl(db_conn, tmp_path):
+    """Tests importing CSV and JSONL files in small chunks, creating or skipping unknown habits."""
+    from importer import import_file
+    Counter("Read Daily", "Existing habit", "Daily", creation_date=datetime.datetime(2024, 1, 1)).store(db_conn)
+    csv_path = tmp_path / "history.csv"
+    csv_path.write_text("habit_name,timestamp\n"
+                        + "".join(f"Read Daily,2024-02-0{day}T21:00:00\n" for day in range(1, 6))
+                        + "Unknown,2024-02-01T10:00:00\n")
+    result = import_file(db_conn, csv_path, chunk_size=2)
+    assert (result.rows_read, result.increments_added, result.habits_created, result.rows_skipped) == (6, 5, 0, 1)
+    assert calculate_longest_streak_for_habit(db_conn, "Read Daily") == 5
+
+    jsonl_path = tmp_path / "history.jsonl"
+    jsonl_path.write_text("".join(f'{{"habit_name": "Swim", "timestamp": "2024-03-{day:02d}T07:30:00"}}\n'
+                                  for day in (18, 11, 4)))
+    result = import_file(db_conn, jsonl_path, chunk_size=2, create_missing="Weekly")
+    assert (result.increments_added, result.habits_created) == (3, 1)
+    # The oldest row comes in the last chunk, but the habit is still created at it.
+    assert database_module.get_habit_details_by_name(db_conn, "Swim")["creation_date"] == "2024-03-04T07:30:00"
+    assert calculate_longest_streak_for_habit(db_conn, "Swim") == 3
+
+    # Malformed rows after a committed chunk are skipped instead of aborting the import halfway.
+    bad_path = tmp_path / "bad.jsonl"
+    bad_path.write_text('{"habit_name": "Swim", "timestamp": "2024-03-25T07:30:00"}\n'
+                        '{"habit_name": "Swim", "timestamp": "2024-04-01T07:30:00"}\n'
+                        '{"habit_name": "Swim"}\n{"timestamp": "2024-04-08T07:30:00"}\n'
+                        '{"habit_name": "Swim", "timestamp": "next monday"}\nnot json\n[1, 2]\n'
+                        '{"habit_name": "Swim", "timestamp": "2024-04-15T07:30:00"}\n')
+    result = import_file(db_conn, bad_path, chunk_size=2)
+    assert (result.rows_read, result.increments_added, result.rows_skipped) == (8, 3, 5)
+    assert calculate_longest_streak_for_habit(db_conn, "Swim") == 5  # the week of the bad 04-08 row is missing
+
+
+# --- Streaming Export Tests ---
+
+def test_export_filters_and_round_trips_through_import(db_conn, tmp_path):
+    """Tests filtered CSV/JSONL exports and that an export can be imported into another database."""
+    import io
+    import json
+    from exporter import export
+    from importer import import_file
+    daily = Counter("Code", "Write code", "Daily", creation_date=datetime.datetime(2024, 1, 1))
+    daily.store(db_conn)
+    weekly = Counter("Review", "Weekly review", "Weekly", creation_date=datetime.datetime(2024, 1, 1))
+    weekly.store(db_conn)
+    database_module.add_increments_bulk(db_conn, daily.habit_id,
+                                        [datetime.datetime(2024, 1, day, 20) for day in range(1, 11)])
+    database_module.add_increments_bulk(db_conn, weekly.habit_id, [datetime.datetime(2024, 1, 5, 18)])
+
+    out = io.StringIO()
+    assert export(db_conn, out, "completions", "jsonl", periodicity="Daily",
+                  start=datetime.datetime(2024, 1, 3), end=datetime.datetime(2024, 1, 6), batch_size=2) == 3
+    assert [json.loads(line)["timestamp"] for line in out.getvalue().splitlines()] == [
+        "2024-01-03T20:00:00", "2024-01-04T20:00:00", "2024-01-05T20:00:00"]
+
+    habits_out = io.StringIO()
+    assert export(db_conn, habits_out, "habits", "csv", habit="Review") == 1
+    assert habits_out.getvalue().splitlines()[1].startswith(f"{weekly.habit_id},Review,")
+
+    export_path = tmp_path / "completions.csv"
+    with open(export_path, "w", newline="") as handle:
+        assert export(db_conn, handle, "completions", "csv", batch_size=3) == 11
+    target = sqlite3.connect(':memory:')
+    target.row_factory = sqlite3.Row
+    database_module.create_tables_if_not_exist(target)
+    Counter("Code", "Write code", "Daily", creation_date=datetime.datetime(2024, 1, 1)).store(target)
+    assert import_file(target, export_path).increments_added == 10
+    assert calculate_longest_streak_for_habit(target, "Code") == 10
+    target.close()
+
+
+# --- Connection Manager Tests ---
+
+def test_connection_manager_reuses_thread_local_connections(tmp_path):
+    """Tests connection reuse per thread, the pragma profile and read-only analytics connections."""
+    import threading
+    from connections import ConnectionManager
+    manager = ConnectionManager(tmp_path / "habits.db")
+    conn = manager.connection()
+    assert manager.connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    other_thread_conns = []
+    worker = threading.Thread(target=lambda: other_thread_conns.append(manager.connection()))
+    worker.start()
+    worker.join()
+    assert other_thread_conns[0] is not conn
+
+    habit = Counter("Cascade", "FK check", "Daily", creation_date=datetime.datetime(2025, 1, 1))
+    habit.store(conn)
+    database_module.add_increment_date_to_db(conn, habit.habit_id, datetime.datetime(2025, 1, 2))
+    reader = manager.read_connection()
+    assert calculate_longest_streak_for_habit(reader, "Cascade") == 1
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("DELETE FROM habits")
+
+    habit.delete(conn)
+    assert conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0] == 0
+    manager.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+# --- Group-Commit Writer Tests ---
+
+def test_write_queue_group_commits_concurrent_increments(tmp_path):
+    """Tests that concurrent increments are batched into few commits and that each future confirms durability."""
+    import threading
+    from connections import open_connection
+    from writer import WriteQueue
+    db_path = tmp_path / "habits.db"
+    conn = open_connection(db_path)
+    database_module.create_tables_if_not_exist(conn)
+    habit = Counter("Hydrate", "Glass of water", "Daily", creation_date=datetime.datetime(2024, 1, 1))
+    habit.store(conn)
+
+    with WriteQueue(db_path, max_batch_size=50, max_latency_ms=20) as write_queue:
+        futures = []
+        lock = threading.Lock()
+
+        def submit(offset):
+            for i in range(25):
+                future = write_queue.submit_increment(habit.habit_id, datetime.datetime(2024, 1, 1)
+                                                      + datetime.timedelta(days=offset * 25 + i))
+                with lock:
+                    futures.append(future)
+
+        threads = [threading.Thread(target=submit, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for future in futures:
+            future.result(timeout=10)
+        failed = write_queue.submit_increment(9999)
+        with pytest.raises(ValueError):
+            failed.result(timeout=10)
+        habit.increment(conn, increment_time=datetime.datetime(2024, 7, 19), writer=write_queue)
+        assert write_queue.operations_committed == 201
+        assert write_queue.batches_committed < 201
+
+    assert conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0] == 201
+    assert calculate_longest_streak_for_habit(conn, "Hydrate") == 201
+    conn.close()
+
+
+# --- Scriptable CLI Tests ---
+
+def test_habit_cli_runs_without_interactive_or_optional_imports(tmp_path):
+    """Tests the subcommand CLI end to end in a fresh process and that it skips questionary and NumPy."""
+    import json
+    import os
+    import subprocess
+    import sys
+    env = dict(os.environ, HABIT_DB_PATH=str(tmp_path / "cli.db"))
+    script = ("import sys, habit; status = habit.main(sys.argv[1:]); "
+              "assert 'questionary' not in sys.modules and 'numpy' not in sys.modules; sys.exit(status)")
+
+    def run(*args):
+        return subprocess.run([sys.executable, "-c", script, *args], capture_output=True, text=True, env=env,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    assert run("create", "Read Daily", "--periodicity", "Daily").returncode == 0
+    now = datetime.datetime.now().replace(microsecond=0)
+    for moment in (now, now + datetime.timedelta(days=1)):
+        assert run("inc", "Read Daily", "--at", moment.isoformat()).returncode == 0
+    result = run("--timing", "streak", "--all", "--json")
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout)["Read Daily"]["longest"] == 2
+    assert "startup" in result.stderr
+    assert run("inc", "Missing").returncode == 1
+
+    import config
+    import habit
+    assert habit.PERIODICITIES == config.ALLOWED_PERIODICITIES
+
+
+# --- Async API Tests ---
+
+def test_async_tracker_gathers_increments_across_habits(tmp_path):
+    """Tests concurrent increments through the async facade and that streaks match the sync API."""
+    import asyncio
+    from async_api import AsyncHabitTracker
+
+    async def scenario():
+        async with AsyncHabitTracker(tmp_path / "async.db", max_workers=4) as tracker:
+            start = datetime.datetime(2024, 7, 1, 9, 0)
+            habits = await asyncio.gather(*(tracker.store(Counter(f"Habit {i}", "", "Daily", start))
+                                            for i in range(8)))
+            await asyncio.gather(*(tracker.increment(habit, start + datetime.timedelta(days=day))
+                                   for habit in habits for day in range(3)))
+            now = start + datetime.timedelta(days=2, hours=1)
+            current = await asyncio.gather(*(tracker.get_current_streak(habit, now) for habit in habits))
+            listed = await tracker.list_all_habits_details()
+            return current, listed, await tracker.longest_streak_all_habits()
+
+    current, listed, longest = asyncio.run(scenario())
+    assert current == [3] * 8
+    assert len(listed) == 8 and all(len(habit._increment_dates) == 3 for habit in listed)
+    assert longest == 3
+
+
+# --- HTTP Service Tests ---
+
+def test_http_server_endpoints_and_load_generator(tmp_path, monkeypatch):
+    """Tests the JSON endpoints over one keep-alive connection and a small load-generator run."""
+    import http.client
+    import json
+    import threading
+    import loadgen
+    import server as server_module
+    from server import HabitServer
+
+    server = HabitServer(("127.0.0.1", 0), db_path=tmp_path / "server.db", pool_size=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_port
+    try:
+        client = http.client.HTTPConnection("127.0.0.1", port)
+
+        def call(method, path, payload=None):
+            client.request(method, path, body=json.dumps(payload) if payload is not None else None)
+            response = client.getresponse()
+            return response.status, json.loads(response.read())
+
+        assert call("POST", "/habits", {"name": "Stretch", "periodicity": "Daily"})[0] == 201
+        assert call("POST", "/habits", {"name": "Stretch", "periodicity": "Daily"})[0] == 409
+        assert call("POST", "/habits", {"name": "Bad", "periodicity": "Hourly"})[0] == 400
+        assert call("POST", "/habits/Stretch/increment", {})[0] == 200
+        status, result = call("POST", "/increments", {"increments": [
+            {"habit_name": "Stretch", "timestamp": "2030-01-01T08:00:00"},
+            {"habit_name": "Unknown", "timestamp": "2030-01-01T08:00:00"}]})
+        assert (status, result["increments_added"], result["rows_skipped"]) == (200, 1, 1)
+        assert call("GET", "/habits/Stretch/streak") == (200, {"current": 1, "longest": 1})
+        assert call("GET", "/habits/Missing/streak")[0] == 404
+        assert call("GET", "/habits?periodicity=Daily")[1][0]["name"] == "Stretch"
+        assert call("GET", "/habits?periodicity=Weekly") == (200, [])
+        assert call("POST", "/increments", {"increments": ["Stretch"]})[0] == 400
+        assert call("GET", "/leaderboard?limit=1000")[0] == 200
+        assert call("GET", "/leaderboard?limit=ten")[0] == 400
+        assert call("GET", "/leaderboard?limit=0")[0] == 400
+
+        def fail(*args):
+            raise sqlite3.OperationalError("database is locked")
+        monkeypatch.setattr(server_module, "list_habits", fail)
+        assert call("GET", "/habits") == (500, {"error": "Internal server error"})
+        assert call("GET", "/habits/Stretch/streak")[0] == 200
+        client.close()
+
+        loadgen.setup_habits("127.0.0.1", port, 3, "load-")
+        result = loadgen.run_load("127.0.0.1", port, 30, concurrency=3, habits=3, prefix="load-")
+        assert (result.requests, result.errors, result.check_ins) == (30, 0, 30)
+        assert result.p50_ms <= result.p99_ms
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_batch_increments_go_through_the_write_queue(tmp_path):
+    """Tests that with a write queue, POST /increments is committed by the writer thread, not the pool."""
+    import http.client
+    import json
+    import threading
+    from server import HabitServer, MAX_LEADERBOARD_LIMIT, _parse_limit
+    from writer import WriteQueue
+
+    assert _parse_limit(str(MAX_LEADERBOARD_LIMIT + 1)) == MAX_LEADERBOARD_LIMIT
+    db_path = tmp_path / "server.db"
+    writer = WriteQueue(db_path)
+    server = HabitServer(("127.0.0.1", 0), db_path=db_path, pool_size=1, writer=writer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        client.request("POST", "/habits", body=json.dumps({"name": "Stretch", "periodicity": "Daily"}))
+        assert client.getresponse().read()
+        client.request("POST", "/increments", body=json.dumps({"increments": [
+            {"habit_name": "Stretch", "timestamp": "2030-01-01T08:00:00"},
+            {"habit_name": "Stretch", "timestamp": "2030-01-02T08:00:00"}]}))
+        response = client.getresponse()
+        assert (response.status, json.loads(response.read())["increments_added"]) == (200, 2)
+        assert writer.operations_committed == 1
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        writer.close()
+
+
+# --- Sharding Tests ---
+
+def test_shard_router_routes_users_and_fans_out(tmp_path):
+    """Tests stable user routing, on-demand shard files and merged cross-shard admin queries."""
+    from sharding import ShardRouter
+    router = ShardRouter(tmp_path / "shards", shard_count=4)
+    assert router.shard_for("alice") == ShardRouter(tmp_path / "other", shard_count=4).shard_for("alice")
+    assert router.total_habit_count() == 0
+
+    start = datetime.datetime(2025, 1, 1, 7, 0)
+    for n in range(12):
+        user = f"user-{n}"
+        conn = router.connection(user)
+        habit = router.store_habit(user, Counter("Walk", "", "Daily", creation_date=start))
+        for day in range(n % 5 + 1):
+            habit.increment(conn, increment_time=start + datetime.timedelta(days=day))
+
+    shards = router.existing_shards()
+    assert 1 < len(shards) <= 4
+    assert sorted(path.name for path in (tmp_path / "shards").glob("*.db")) == \
+        [router.shard_path(shard).name for shard in shards]
+    assert router.total_habit_count() == 12
+    assert router.longest_streak_all_shards() == 5
+    walk = router.get_habit("user-3", "Walk")
+    assert walk.name == "Walk" and walk.get_longest_streak(router.connection("user-3")) == 4
+    assert router.get_habit("user-3", "Run") is None
+    router.close()
+
+
+def test_shard_router_same_shard_users_can_reuse_habit_names(tmp_path):
+    """Tests that two users on one shard can each create a habit with the same name."""
+    from sharding import ShardRouter
+    router = ShardRouter(tmp_path / "shards", shard_count=2)
+    first = "user-0"
+    second = next(f"user-{n}" for n in range(1, 50) if router.shard_for(f"user-{n}") == router.shard_for(first))
+
+    router.store_habit(first, Counter("Read", "Novels", "Daily"))
+    router.store_habit(second, Counter("Read", "Papers", "Weekly"))
+    router.get_habit(second, "Read").increment(router.connection(second))
+
+    assert router.get_habit(first, "Read").description == "Novels"
+    assert router.get_habit(second, "Read").periodicity == "Weekly"
+    assert router.get_habit(second, "Read").get_longest_streak(router.connection(second)) == 1
+    assert router.get_habit(first, "Read").get_longest_streak(router.connection(first)) == 0
+    assert [(habit.name, habit.description) for habit in router.user_habits(second)] == [("Read", "Papers")]
+    with pytest.raises(ValueError):
+        router.habit_name("team/one", "Read")
+    router.close()
+
+
+# --- Parallel Analytics Tests ---
+
+def test_parallel_streaks_match_serial_and_sql_engine(tmp_path, db_conn, monkeypatch):
+    """Tests that the process-pool engine merges id ranges into the same results as the serial paths."""
+    import random
+    import connections
+    import parallel
+    import streaks
+    from connections import open_connection
+    conn = open_connection(tmp_path / "parallel.db")
+    database_module.create_tables_if_not_exist(conn)
+    rng = random.Random(15)
+    start = datetime.datetime(2024, 1, 1, 6, 0)
+    for n in range(30):
+        periodicity = "Weekly" if n % 3 == 0 else "Daily"
+        database_module.add_habit_to_db(conn, f"Habit {n}", "", periodicity, start)
+        habit_id = database_module.get_habit_id_by_name(conn, f"Habit {n}")
+        database_module.add_increments_bulk(conn, habit_id, (start + datetime.timedelta(days=rng.randrange(120))
+                                                             for _ in range(rng.randrange(60))))
+    now = start + datetime.timedelta(days=100)
+
+    assert parallel.habit_id_ranges([1, 2, 5, 9, 10], 2) == [(1, 5), (9, 10)]
+    assert connections.database_path(db_conn) is None
+    result = parallel.compute_streaks_parallel(conn, now, workers=2, threshold=0)
+    assert list(result) == sorted(result)
+    assert result == parallel.compute_streaks_parallel(conn, now, workers=1)
+    assert result == streaks.compute_all_streaks(conn, now)
+    vectorized = parallel.streaks_for_id_range(conn, 1, 30, now)
+    monkeypatch.setattr(streaks.config, "STREAK_BACKEND", "python")
+    assert parallel.streaks_for_id_range(conn, 1, 30, now) == vectorized == list(result.items())
+
+    import analyse
+    monkeypatch.setattr(parallel.config, "PARALLEL_ANALYTICS_THRESHOLD", 0)
+    monkeypatch.setattr(parallel.config, "ANALYTICS_WORKERS", 2)
+    today = parallel.compute_streaks_parallel(conn)
+    assert analyse.streaks_for_all_habits(conn) == today
+    assert analyse.longest_streak_all_habits(conn) == max(longest for _, longest in today.values())
+    report = analyse.habit_streak_report(conn)
+    assert [habit.name for habit, _, _ in report] == sorted(f"Habit {n}" for n in range(30))
+    assert {habit.habit_id: (current, longest) for habit, current, longest in report} == today
+    conn.close()
+
+
+# --- Cache Tests ---
+
+def test_counter_cache_hits_and_invalidation(tmp_path):
+    """Tests cache hits on repeated reads, precise invalidation by increment and data_version checks."""
+    import cache
+    from connections import open_connection
+    conn = open_connection(tmp_path / "cache.db")
+    database_module.create_tables_if_not_exist(conn)
+    start = datetime.datetime(2025, 3, 1, 8, 0)
+    for name in ("Read", "Run", "Swim"):
+        Counter(name, "", "Daily", creation_date=start).store(conn)
+    counter_cache = cache.enable(conn, max_entries=2)
+    assert cache.enable(conn) is counter_cache
+
+    now = start + datetime.timedelta(days=1, hours=2)
+    habit = get_counter(conn, "Read")
+    habit.increment(conn, increment_time=start)
+    assert get_counter(conn, "Read").get_current_streak(conn, now) == 1
+    hits_before = counter_cache.stats.hits
+    assert get_counter(conn, "Read").get_current_streak(conn, now) == 1
+    assert counter_cache.stats.hits == hits_before + 2
+
+    habit.increment(conn, increment_time=start + datetime.timedelta(days=1))
+    assert get_counter(conn, "Read").get_current_streak(conn, now) == 2
+
+    other = open_connection(tmp_path / "cache.db")
+    get_counter(other, "Read").increment(other, increment_time=start + datetime.timedelta(days=2))
+    other.close()
+    assert get_counter(conn, "Read").get_longest_streak(conn) == 3
+
+    get_counter(conn, "Run")
+    get_counter(conn, "Swim")
+    assert counter_cache.stats.size == 2
+    assert counter_cache.stats.invalidations >= 2
+    cache.disable(conn)
+    assert cache.get_cache(conn) is None
+    conn.close()
+
+
+def test_counter_cache_does_not_absorb_untracked_writes(db_conn):
+    """Tests that a tracked write does not hide an earlier untracked write on the same connection."""
+    import cache
+    start = datetime.datetime(2025, 3, 1, 8)
+    for name in ("A", "B"):
+        Counter(name, "", "Daily", creation_date=start).store(db_conn)
+    cache.enable(db_conn)
+    try:
+        a, b = get_counter(db_conn, "A"), get_counter(db_conn, "B")
+        assert b.get_longest_streak(db_conn) == 0
+        database_module.add_increments_bulk(db_conn, b.habit_id, [start + datetime.timedelta(days=d) for d in range(5)])
+        a.increment(db_conn, increment_time=start)
+        assert get_counter(db_conn, "B").get_longest_streak(db_conn) == 5
+    finally:
+        cache.disable(db_conn)
+
+
+# --- Compact History Tests ---
+
+def test_counter_uses_slots_and_integer_history(db_conn):
+    """Tests the __slots__ layout, the sorted epoch-second history and its lazy datetime view."""
+    from array import array
+    from counter import load_counters
+    habit = Counter("Floss", "", "Daily", creation_date=datetime.datetime(2025, 2, 1))
+    habit.store(db_conn)
+    assert not hasattr(habit, "__dict__")
+    for day in (5, 3, 4, 4):
+        habit.increment(db_conn, increment_time=datetime.datetime(2025, 2, day, 21, 30))
+
+    loaded = load_counters(db_conn)[0]
+    assert isinstance(loaded._timestamps, array) and loaded._timestamps.itemsize == 8
+    assert list(loaded._timestamps) == sorted(loaded._timestamps) and len(loaded._timestamps) == 3
+    assert loaded._increment_dates[0] == datetime.datetime(2025, 2, 3, 21, 30)
+    assert loaded.get_current_streak(db_conn, datetime.datetime(2025, 2, 6)) == 3
+    assert loaded.get_longest_streak(db_conn) == 3
+
+
+# --- Benchmark Suite Tests ---
+
+def test_benchmark_generator_is_seedable_and_scenarios_report(tmp_path):
+    """Tests that the synthetic generator is deterministic per seed and that scenarios produce timings."""
+    from benchmarks.generator import DatasetSpec, create_database
+    import migrations
+    from benchmarks.run import compare, run_scenarios
+    spec = DatasetSpec(habits=12, years=0.25, density=0.5, weekly_ratio=0.25, seed=3, monthly_ratio=0.25,
+                       custom_ratio=0.25)
+    end = datetime.datetime(2025, 6, 1)
+    first = create_database(tmp_path / "a.db", spec, end)
+    assert create_database(tmp_path / "b.db", spec, end) == first
+    assert first.habits == 12 and 0 < first.completions < 12 * 91
+    conn = sqlite3.connect(tmp_path / "a.db")
+    assert {row[0] for row in conn.execute("SELECT periodicity FROM habits")} == {"Daily", "Weekly", "Monthly",
+                                                                                 "Custom"}
+    assert conn.execute("SELECT COUNT(*) FROM habits WHERE periodicity = 'Custom' AND interval_days > 1").fetchone()[0]
+    # A reused database from an older schema version is migrated before the scenarios run.
+    conn.execute("PRAGMA user_version = 12")
+    conn.close()
+
+    results = run_scenarios(tmp_path / "a.db", repeat=1, sample=4, increments=3)
+    conn = sqlite3.connect(tmp_path / "a.db")
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == migrations.LATEST_VERSION
+    conn.close()
+    assert {"get_current_streak", "longest_streak_all_habits", "increment", "startup_cli_streak"} <= set(results)
+    assert results["increment"]["ops"] == 3 and results["increment"]["min_ms"] > 0
+    assert "(+0.0%)" in compare(results, results)[0]
+    with pytest.raises(ValueError):
+        create_database(database_module.DATABASE_NAME, spec)
+
+
+# --- Instrumentation Tests ---
+
+def test_instrumentation_records_calls_statements_and_slow_queries(db_conn, monkeypatch, caplog):
+    """Tests call/row accounting of wrapped functions, traced statement timings and the slow-query log."""
+    import logging
+    import instrumentation
+    import utils
+    monkeypatch.setattr(utils, "setup_logging", lambda: None)
+    instrumentation.reset()
+    instrumentation.enable(slow_query_ms=0, summary_at_exit=False)
+    try:
+        instrumentation.instrument_connection(db_conn)
+        habit = Counter("Journal", "", "Daily", creation_date=datetime.datetime(2025, 4, 1))
+        with caplog.at_level(logging.WARNING, logger="habit_tracker.slow_queries"):
+            habit.store(db_conn)
+            habit.increment(db_conn, increment_time=datetime.datetime(2025, 4, 2, 22))
+            assert get_counter(db_conn, "Journal").get_longest_streak(db_conn) == 1
+            list(database_module.iter_habits(db_conn))
+        functions = dict(instrumentation.hottest(100)["functions"])
+        statements = dict(instrumentation.hottest(100)["statements"])
+        assert functions["Counter.get_longest_streak"].calls == 1
+        assert functions["db.get_habit_details_by_name"].rows == 1
+        assert functions["db.iter_habits"].rows == 1
+        assert "db.to_timestamp" not in functions
+        assert any(sql.startswith("INSERT OR IGNORE INTO counters") for sql in statements)
+        assert any("slow query" in record.message for record in caplog.records)
+        assert "Hottest functions" in instrumentation.format_summary()
+    finally:
+        instrumentation.disable()
+        db_conn.set_trace_callback(None)
+    assert not hasattr(database_module.get_db, "__wrapped_by_instrumentation__")
+    assert not hasattr(Counter.increment, "__wrapped_by_instrumentation__")
+
+
+# --- Rollup Analytics Tests ---
+
+def test_rollups_follow_writes_and_answer_range_analytics(db_conn, monkeypatch):
+    """Tests that rollups track increments, bulk loads and resets, and the completion-rate/heatmap/weekday APIs."""
+    from analyse import completion_rate, completion_heatmap, completion_heatmaps, weekday_distribution
+    daily = Counter("Stretch", "", "Daily", creation_date=datetime.datetime(2025, 3, 3))  # a Monday
+    weekly = Counter("Review", "", "Weekly", creation_date=datetime.datetime(2025, 3, 3))
+    daily.store(db_conn)
+    weekly.store(db_conn)
+    daily.increment(db_conn, increment_time=datetime.datetime(2025, 3, 3, 8))
+    daily.increment(db_conn, increment_time=datetime.datetime(2025, 3, 3, 20))
+    daily.increment(db_conn, increment_time=datetime.datetime(2025, 3, 3, 20))  # same second, ignored
+    database_module.add_increments_bulk(db_conn, daily.habit_id, [datetime.datetime(2025, 3, 5, 7),
+                                                                  datetime.datetime(2025, 3, 10, 7)])
+    weekly.increment(db_conn, increment_time=datetime.datetime(2025, 3, 7, 9))
+
+    start, end = datetime.date(2025, 3, 1), datetime.date(2025, 3, 10)
+    assert completion_rate(db_conn, "Stretch", start, end) == 3 / 8  # counted from the creation day
+    assert completion_rate(db_conn, "Review", start, end) == 1 / 2
+    with monkeypatch.context() as patch:  # Weekly rates come from weekly_rollup alone
+        patch.setattr(database_module, "get_period_keys_for_habit", None)
+        assert completion_rate(db_conn, "Review", start, datetime.date(2025, 3, 16)) == 1 / 2
+    heatmap = completion_heatmap(db_conn, "Stretch", start, end)
+    assert len(heatmap) == 10 and heatmap[2] == (datetime.date(2025, 3, 3), 2) and heatmap[3][1] == 0
+    assert completion_heatmaps(db_conn, start, end)["Stretch"] == [count for _, count in heatmap]
+    distribution = weekday_distribution(db_conn, "Stretch")
+    assert distribution["Monday"] == 3 and distribution["Wednesday"] == 1 and sum(distribution.values()) == 4
+
+    expected = db_conn.execute("SELECT * FROM daily_rollup ORDER BY habit_id, day_ordinal").fetchall()
+    assert database_module.rebuild_rollups(db_conn) == len(expected) == 4
+    assert db_conn.execute("SELECT * FROM daily_rollup ORDER BY habit_id, day_ordinal").fetchall() == expected
+    daily.reset(db_conn)
+    assert completion_heatmaps(db_conn, start, end)["Stretch"] == [0] * 10
+    assert database_module.get_weekly_rollup(db_conn, daily.habit_id, 0, 10 ** 6) == []
+
+
+# --- Periodicity Tests ---
+
+def test_monthly_and_custom_periodicities_use_stored_period_keys(db_conn, monkeypatch):
+    """Tests Monthly and every-N-days habits across the streak engines and the widened CHECK constraint."""
+    import streaks
+    from analyse import completion_rate
+    from counter import load_counters
+    now = datetime.datetime(2025, 6, 10, 12)
+    monthly = Counter("Budget", "", "Monthly", creation_date=datetime.datetime(2025, 1, 15))
+    custom = Counter("Water plants", "", "Custom", creation_date=datetime.datetime(2025, 5, 1), interval_days=3)
+    monthly.store(db_conn)
+    custom.store(db_conn)
+    for day in (datetime.datetime(2025, 1, 20), datetime.datetime(2025, 3, 1), datetime.datetime(2025, 3, 31),
+                datetime.datetime(2025, 4, 2), datetime.datetime(2025, 5, 30)):
+        monthly.increment(db_conn, increment_time=day)
+    first_block = streaks.period_of("Custom", datetime.date(2025, 5, 1), 3)
+    for block in (first_block, first_block + 1, first_block + 3, first_block + 4, first_block + 5):
+        custom.increment(db_conn, increment_time=datetime.datetime.fromordinal(block * 3 + 1) + datetime.timedelta(hours=9))
+
+    stored = [row[0] for row in db_conn.execute("SELECT period_key FROM counters WHERE habit_id = ? ORDER BY id",
+                                                (monthly.habit_id,))]
+    assert stored == [2025 * 12 + month - 1 for month in (1, 3, 3, 4, 5)]
+    expected = {monthly.habit_id: (3, 3), custom.habit_id: (0, 3)}
+    assert streaks.compute_all_streaks(db_conn, now) == expected
+    assert streaks.verify_streak_states(db_conn) == []
+    for backend in ("python", "auto"):
+        monkeypatch.setattr(streaks.config, "STREAK_BACKEND", backend)
+        for counter in load_counters(db_conn):
+            assert (counter.get_current_streak(db_conn, now), counter.get_longest_streak(db_conn)) \
+                == expected[counter.habit_id]
+    assert get_counter(db_conn, "Water plants").get_current_streak(db_conn, datetime.datetime(2025, 5, 17)) == 3
+    assert completion_rate(db_conn, "Budget", datetime.date(2025, 1, 1), datetime.date(2025, 6, 30)) == 4 / 6
+
+    with pytest.raises(ValueError):
+        Counter("No interval", "", "Custom")
+    with pytest.raises(sqlite3.IntegrityError):
+        database_module.add_habit_to_db(db_conn, "Bad", "", "Custom", now)
+    with pytest.raises(sqlite3.IntegrityError):
+        database_module.add_habit_to_db(db_conn, "Bad", "", "Yearly", now)
+
+
+# --- Compaction Tests ---
+
+def test_compaction_folds_old_history_into_bitmaps_transparently(db_conn, monkeypatch):
+    """Tests that streaks, histories and analytics are unchanged by compaction and that backdated increments count."""
+    import compaction
+    import streaks
+    from analyse import completion_rate
+    from counter import load_counters
+    monkeypatch.setattr(streaks.config, "STREAK_BACKEND", "python")
+    now = datetime.datetime(2025, 6, 30, 12)
+    start = datetime.datetime(2024, 1, 1, 7)
+    daily = Counter("Walk", "", "Daily", creation_date=start)
+    weekly = Counter("Call family", "", "Weekly", creation_date=start)
+    daily.store(db_conn)
+    weekly.store(db_conn)
+    skipped = {10, 11, 40, 41, 42, 300, 520}
+    database_module.add_increments_bulk(db_conn, daily.habit_id, [start + datetime.timedelta(days=d, hours=d % 5)
+                                                                  for d in range(547) if d not in skipped])
+    database_module.add_increments_bulk(db_conn, weekly.habit_id, [start + datetime.timedelta(weeks=w)
+                                                                   for w in range(78) if w not in (20, 21)])
+
+    def snapshot():
+        counters = {c.name: (c.get_current_streak(db_conn, now), c.get_longest_streak(db_conn))
+                    for c in load_counters(db_conn)}
+        states = {c.name: (c.get_current_streak(db_conn, now), c.get_longest_streak(db_conn))
+                  for c in (get_counter(db_conn, "Walk"), get_counter(db_conn, "Call family"))}
+        days = {ts // 86400 for ts in database_module.get_increment_timestamps_for_habit(db_conn, daily.habit_id)}
+        return (streaks.compute_all_streaks(db_conn, now), counters, states, days,
+                completion_rate(db_conn, "Walk", datetime.date(2024, 1, 1), datetime.date(2025, 6, 30)),
+                completion_rate(db_conn, "Call family", datetime.date(2024, 1, 1), datetime.date(2025, 6, 30)))
+
+    database_module.clear_streak_states(db_conn)
+    before = snapshot()
+    summary = compaction.compact_all(db_conn, horizon_days=90, now=now)
+    assert summary.habits == 2 and summary.bitmap_bytes < 150
+    assert db_conn.execute("SELECT COUNT(*) FROM counters WHERE habit_id = ?", (daily.habit_id,)).fetchone()[0] < 100
+    database_module.clear_streak_states(db_conn)
+    assert snapshot() == before
+    assert streaks.verify_streak_states(db_conn) == []
+    exported = list(database_module.iter_completions(db_conn, name="Walk"))
+    assert len(exported) == len(before[3]) and exported[0]["increment_date"] == "2024-01-01T00:00:00"
+
+    # Filling the gap at days 40-42 joins two runs inside the compacted range.
+    for day in (40, 41, 42):
+        get_counter(db_conn, "Walk").increment(db_conn, increment_time=start + datetime.timedelta(days=day))
+    longest = before[0][daily.habit_id][1]
+    assert get_counter(db_conn, "Walk").get_longest_streak(db_conn) == 300 - 12 == longest + 3 + 28
+    assert streaks.compute_all_streaks(db_conn, now)[daily.habit_id][1] == 288
+    assert compaction.compact_all(db_conn, horizon_days=90, now=now).rows == 3
+    assert streaks.compute_all_streaks(db_conn, now)[daily.habit_id][1] == 288
+    assert database_module.rebuild_rollups(db_conn, daily.habit_id) == 547 - len(skipped) + 3
+    daily.reset(db_conn)
+    assert database_module.get_history_bitmap(db_conn, daily.habit_id) is None
+
+
+def test_compute_all_streaks_query_count_does_not_grow_with_compacted_habits(db_conn):
+    """Tests that the streaks of compacted habits are computed with a fixed number of queries."""
+    import compaction
+    import streaks
+    from counter import load_counters
+    now = datetime.datetime(2025, 6, 30, 12)
+    start = datetime.datetime(2025, 1, 1, 7)
+
+    def add_habits(first, count):
+        for number in range(first, first + count):
+            habit = Counter(f"Habit {number}", "", "Weekly" if number % 2 else "Daily", creation_date=start)
+            habit.store(db_conn)
+            database_module.add_increments_bulk(db_conn, habit.habit_id, [start + datetime.timedelta(days=d)
+                                                                          for d in range(180) if d % 17])
+        compaction.compact_all(db_conn, horizon_days=30, now=now)
+
+    def count_selects():
+        statements = []
+        db_conn.set_trace_callback(statements.append)
+        results = streaks.compute_all_streaks(db_conn, now)
+        db_conn.set_trace_callback(None)
+        return len([s for s in statements if s.lstrip().upper().startswith("SELECT")]), results
+
+    add_habits(0, 2)
+    few, _ = count_selects()
+    add_habits(2, 6)
+    many, results = count_selects()
+    assert few == many
+    assert results == {c.habit_id: (c.get_current_streak(db_conn, now), c.get_longest_streak(db_conn))
+                       for c in load_counters(db_conn)}
+
+
+# --- Leaderboard Tests ---
+
+def test_streak_leaderboard_ranks_sweeps_and_follows_writes(db_conn):
+    """Tests the top-K leaderboard over persisted streak states, its expiry sweep and updates on writes."""
+    import streaks
+    from analyse import streak_leaderboard
+    created = datetime.datetime(2025, 1, 1)
+    history = {
+        ("Run", "Daily"): [datetime.datetime(2025, 6, d, 7) for d in range(18, 23)],
+        ("Read", "Daily"): [datetime.datetime(2025, 6, d, 7) for d in range(1, 11)],
+        ("Call", "Weekly"): [datetime.datetime(2025, 6, d, 7) for d in (2, 9, 16)],
+        ("Budget", "Monthly"): [datetime.datetime(2025, 4, 3), datetime.datetime(2025, 5, 3)],
+        ("Stretch", "Daily"): [datetime.datetime(2025, 6, d, 7) for d in range(19, 22)],
+    }
+    for (name, periodicity), dates in history.items():
+        counter = Counter(name, "", periodicity, creation_date=created)
+        counter.store(db_conn)
+        for date in dates:
+            counter.increment(db_conn, increment_time=date)
+
+    with freeze_time("2025-06-22 12:00:00"):
+        assert streak_leaderboard(db_conn) == [("Run", "Daily", 5), ("Call", "Weekly", 3), ("Stretch", "Daily", 3),
+                                               ("Budget", "Monthly", 2)]
+        assert streak_leaderboard(db_conn, 2, by="longest") == [("Read", "Daily", 10), ("Run", "Daily", 5)]
+        assert [entry.name for entry in streak_leaderboard(db_conn, periodicity="Daily")] == ["Run", "Stretch"]
+    read_id = get_counter(db_conn, "Read").habit_id
+    assert db_conn.execute("SELECT live_run FROM streak_state WHERE habit_id = ?", (read_id,)).fetchone()[0] == 0
+    assert streaks.verify_streak_states(db_conn) == []
+
+    with freeze_time("2025-06-24 09:00:00"):
+        assert [entry.name for entry in streak_leaderboard(db_conn)] == ["Call", "Budget"]
+        get_counter(db_conn, "Stretch").increment(db_conn)
+        get_counter(db_conn, "Call").reset(db_conn)
+        get_counter(db_conn, "Budget").delete(db_conn)
+        assert streak_leaderboard(db_conn) == [("Stretch", "Daily", 1)]
+        assert streak_leaderboard(db_conn, 10, by="longest")[0] == ("Read", "Daily", 10)
+    with pytest.raises(ValueError):
+        streak_leaderboard(db_conn, by="fastest")
+
+
+# --- Period Upsert Tests ---
+
+def test_period_increment_mode_dedupes_and_counts_per_period(db_conn, monkeypatch):
+    """Tests the dedupe of existing rows and one counted row per period in 'period' increment mode."""
+    import migrations
+    created = datetime.datetime(2025, 6, 1)
+    daily = Counter("Water", "", "Daily", creation_date=created)
+    weekly = Counter("Call", "", "Weekly", creation_date=created)
+    daily.store(db_conn)
+    weekly.store(db_conn)
+    for hour in (8, 12, 20):
+        daily.increment(db_conn, increment_time=datetime.datetime(2025, 6, 20, hour))
+    daily.increment(db_conn, increment_time=datetime.datetime(2025, 6, 21, 9))
+    database_module.add_increments_bulk(db_conn, weekly.habit_id, [datetime.datetime(2025, 6, d, 9) for d in (16, 18, 22)])
+    streaks_before = (daily.get_longest_streak(db_conn), weekly.get_longest_streak(db_conn))
+
+    monkeypatch.setattr(migrations.config, "INCREMENT_MODE", "period")
+    database_module.create_tables_if_not_exist(db_conn)
+    assert migrations.period_upserts_enabled(db_conn)
+    assert migrations.enable_period_upserts(db_conn) == 0
+    rows = db_conn.execute("SELECT habit_id, increment_ts, completions FROM counters ORDER BY habit_id, period_key")
+    to_ts = database_module.to_timestamp
+    assert [tuple(row) for row in rows] == [(daily.habit_id, to_ts(datetime.datetime(2025, 6, 20, 8)), 3),
+                                             (daily.habit_id, to_ts(datetime.datetime(2025, 6, 21, 9)), 1),
+                                             (weekly.habit_id, to_ts(datetime.datetime(2025, 6, 16, 9)), 3)]
+
+    # A bot double-firing and an earlier check-in on the same day all count; only the stored time is deduplicated.
+    for moment in (datetime.datetime(2025, 6, 21, 18), datetime.datetime(2025, 6, 21, 18),
+                   datetime.datetime(2025, 6, 21, 7)):
+        get_counter(db_conn, "Water").increment(db_conn, increment_time=moment)
+    assert database_module.add_increments_bulk(db_conn, weekly.habit_id, [datetime.datetime(2025, 6, 16, 9),
+                                                                         datetime.datetime(2025, 6, 17, 9)]) == 1
+    assert database_module.get_increment_dates_for_habit(db_conn, daily.habit_id) == [
+        datetime.datetime(2025, 6, 20, 8), datetime.datetime(2025, 6, 21, 7)]
+    assert db_conn.execute("SELECT SUM(completions) FROM counters").fetchone()[0] == 4 + 3 + 4
+    assert (get_counter(db_conn, "Water").get_longest_streak(db_conn),
+            get_counter(db_conn, "Call").get_longest_streak(db_conn)) == streaks_before
+    database_module.rebuild_rollups(db_conn)
+    assert db_conn.execute("SELECT SUM(completions) FROM daily_rollup").fetchone()[0] == 11
+
+
+def test_period_increment_mode_keeps_check_ins_on_their_own_day(db_conn, monkeypatch):
+    """Tests that rollups credit each check-in of a folded period to its own day, also after a rebuild."""
+    import io
+    import json
+    import migrations
+    from exporter import export
+    weekly = Counter("Gym", "", "Weekly", creation_date=datetime.datetime(2025, 1, 1))
+    weekly.store(db_conn)
+    weekly.increment(db_conn, increment_time=datetime.datetime(2025, 1, 6, 18))
+    weekly.increment(db_conn, increment_time=datetime.datetime(2025, 1, 7, 18))
+
+    monkeypatch.setattr(migrations.config, "INCREMENT_MODE", "period")
+    database_module.create_tables_if_not_exist(db_conn)
+    weekly.increment(db_conn, increment_time=datetime.datetime(2025, 1, 8, 18))
+    assert database_module.add_increments_bulk(db_conn, weekly.habit_id, [datetime.datetime(2025, 1, 8, 7),
+                                                                         datetime.datetime(2025, 1, 9, 7)]) == 2
+    first_day = datetime.date(2025, 1, 6).toordinal()
+    expected = [(first_day, 1), (first_day + 1, 1), (first_day + 2, 2), (first_day + 3, 1)]
+    assert [tuple(row) for row in database_module.get_daily_rollup(db_conn, weekly.habit_id, first_day, first_day + 6)] == expected
+    database_module.rebuild_rollups(db_conn)
+    assert [tuple(row) for row in database_module.get_daily_rollup(db_conn, weekly.habit_id, first_day, first_day + 6)] == expected
+
+    out = io.StringIO()
+    assert export(db_conn, out, "completions", "jsonl") == 1
+    assert json.loads(out.getvalue()) == {"habit_name": "Gym", "timestamp": "2025-01-06T18:00:00", "completions": 5}
+    weekly.reset(db_conn)
+    assert db_conn.execute("SELECT COUNT(*) FROM period_day_counts").fetchone()[0] == 0
+
+
+# --- Replication Tests ---
+
+def test_change_log_is_only_written_when_enabled(db_conn, monkeypatch):
+    """Tests that writes skip the change log unless a replica is configured or it is switched on."""
+    import config
+    monkeypatch.setattr(config, "CHANGE_LOG_ENABLED", False)
+    walk = Counter("Walk", "", "Daily")
+    walk.store(db_conn)
+    walk.increment(db_conn)
+    assert db_conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+
+    monkeypatch.setattr(config, "CHANGE_LOG_ENABLED", True)
+    walk.reset(db_conn)
+    assert [row[0] for row in db_conn.execute("SELECT operation FROM change_log")] == ["reset"]
+
+
+def test_change_log_feeds_a_resumable_read_replica(tmp_path, monkeypatch):
+    """Tests the change log written by db.py and a replica that follows it, resumes and re-snapshots."""
+    import config
+    import connections
+    import replicator
+    import streaks
+    from analyse import streak_leaderboard
+    monkeypatch.setattr(config, "CHANGE_LOG_ENABLED", True)
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    db_conn = connections.open_connection(primary)
+    database_module.create_tables_if_not_exist(db_conn)
+    created = datetime.datetime(2025, 6, 1)
+    walk = Counter("Walk", "", "Daily", creation_date=created)
+    walk.store(db_conn)
+    walk.increment(db_conn, increment_time=datetime.datetime(2025, 6, 1, 8))
+    assert replicator.replicate(db_conn, replica) == (0, 0, 2, True)
+
+    read = Counter("Read", "", "Weekly", creation_date=created)
+    read.store(db_conn)
+    database_module.add_increments_bulk(db_conn, read.habit_id, [datetime.datetime(2025, 6, d) for d in (2, 9, 16)])
+    for day in (2, 3, 4):
+        walk.increment(db_conn, increment_time=datetime.datetime(2025, 6, day, 8))
+    gone = Counter("Gone", "", "Custom", creation_date=created, interval_days=3)
+    gone.store(db_conn)
+    gone.increment(db_conn, increment_time=datetime.datetime(2025, 6, 2))
+    gone.delete(db_conn)
+    read.reset(db_conn)
+    read.increment(db_conn, increment_time=datetime.datetime(2025, 6, 20))
+    operations = [row[0] for row in db_conn.execute("SELECT operation FROM change_log ORDER BY seq")]
+    assert operations == ["add_habit", "increment", "add_habit", "increment", "increment", "increment", "increment",
+                          "add_habit", "increment", "delete_habit", "reset", "increment"]
+
+    assert replicator.replicate(db_conn, replica, batch_size=4) == (10, 3, 12, False)
+    assert replicator.replicate(db_conn, replica) == (0, 0, 12, False)
+    replica_conn = connections.open_analytics_connection(primary, replica)
+    try:
+        assert connections.is_read_only(replica_conn)
+        now = datetime.datetime(2025, 6, 21)
+        assert streaks.compute_all_streaks(replica_conn, now) == streaks.compute_all_streaks(db_conn, now)
+        assert streaks.verify_streak_states(replica_conn) == []
+        assert [tuple(row) for row in db_conn.execute("SELECT id, name FROM habits")] == \
+               [tuple(row) for row in replica_conn.execute("SELECT id, name FROM habits")]
+        assert streak_leaderboard(replica_conn, by="longest", current_system_date=now) == [("Walk", "Daily", 4),
+                                                                                           ("Read", "Weekly", 1)]
+        assert replica_conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+    finally:
+        replica_conn.close()
+
+    # Pruning what the replica has applied keeps it resumable; pruning past its checkpoint forces a snapshot.
+    database_module.prune_change_log(db_conn, 12)
+    walk.increment(db_conn, increment_time=datetime.datetime(2025, 6, 5, 8))
+    assert replicator.replicate(db_conn, replica) == (1, 1, 13, False)
+    walk.increment(db_conn, increment_time=datetime.datetime(2025, 6, 6, 8))
+    database_module.prune_change_log(db_conn, 14)
+    assert replicator.replicate(db_conn, replica) == (0, 0, 14, True)
+
+    # Compaction is replayed, so the replica folds the same rows into the same bitmaps.
+    import compaction
+    assert compaction.compact_all(db_conn, horizon_days=10, now=datetime.datetime(2025, 6, 21)).habits == 1
+    assert replicator.replicate(db_conn, replica) == (1, 1, 15, False)
+    replica_conn = connections.open_connection(replica, read_only=True)
+    try:
+        for query in ("SELECT habit_id, base_day, bits FROM history_bitmaps", "SELECT * FROM counters ORDER BY id"):
+            assert [tuple(row) for row in replica_conn.execute(query)] == [tuple(row) for row in db_conn.execute(query)]
+    finally:
+        replica_conn.close()
+    db_conn.close()
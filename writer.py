@@ -0,0 +1,170 @@
+"""Optional single-writer mode: a background thread that group-commits increments, resets, deletes and imports."""
+import datetime
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+import config
+import connections
+import db as database_module
+import importer
+import migrations
+import streaks
+
+# A queued operation: the function applying it on the writer's connection, and the caller's future.
+_Operation = Tuple[Callable[[sqlite3.Connection], object], Future]
+_STOP = object()
+
+
+def _apply_increment(db_conn: sqlite3.Connection, habit_id: int, increment_time: datetime.datetime) -> None:
+    """Writes one completion and advances the habit's streak state, without committing."""
+    habit = database_module.get_habit_details_by_id(db_conn, habit_id)
+    if habit is None:
+        raise ValueError(f"Cannot increment habit with ID {habit_id}: it does not exist.")
+    database_module.add_increment_date_to_db(db_conn, habit_id, increment_time, commit=False)
+    streaks.record_increment(db_conn, habit_id, habit['periodicity'],
+                             datetime.datetime.fromisoformat(habit['creation_date']), increment_time,
+                             habit['interval_days'])
+
+
+def _apply_reset(db_conn: sqlite3.Connection, habit_id: int) -> None:
+    """Deletes a habit's completions and clears its streak state, without committing."""
+    database_module.reset_increments_for_habit(db_conn, habit_id, commit=False)
+    database_module.save_streak_state(db_conn, habit_id, *streaks.EMPTY_STREAK_STATE, commit=False)
+
+
+class WriteQueue:
+    """
+    Serializes writes through one background thread and connection. Operations are grouped into batches
+    bounded by `max_batch_size` and `max_latency_ms`, each committed with a single transaction (one fsync).
+    Every submit_* call returns a Future that resolves once the operation is durable, or raises if it failed.
+    """
+
+    def __init__(self, db_path: Union[str, Path, None] = None, max_batch_size: Optional[int] = None,
+                 max_latency_ms: Optional[float] = None, profile: Optional[str] = None):
+        self.db_path = Path(db_path or config.DB_FILE)
+        self.max_batch_size = max_batch_size or config.WRITE_QUEUE_MAX_BATCH_SIZE
+        if max_latency_ms is None:
+            max_latency_ms = config.WRITE_QUEUE_MAX_LATENCY_MS
+        self.max_latency = max_latency_ms / 1000
+        self.profile = profile
+        self.batches_committed = 0
+        self.operations_committed = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._ready = threading.Event()
+        self._startup_error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="habit-write-queue", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error:
+            raise self._startup_error
+
+    def _submit(self, operation: Callable[[sqlite3.Connection], object]) -> Future:
+        if self._closed:
+            raise RuntimeError("Write queue is closed")
+        future: Future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def submit_increment(self, habit_id: int, increment_time: Optional[datetime.datetime] = None) -> Future:
+        """Queues a completion for a habit."""
+        increment_time = (increment_time or datetime.datetime.now()).replace(microsecond=0)
+        return self._submit(lambda conn: _apply_increment(conn, habit_id, increment_time))
+
+    def submit_reset(self, habit_id: int) -> Future:
+        """Queues the deletion of all completions of a habit."""
+        return self._submit(lambda conn: _apply_reset(conn, habit_id))
+
+    def submit_delete(self, habit_id: int) -> Future:
+        """Queues the deletion of a habit and all its data."""
+        return self._submit(lambda conn: database_module.delete_habit_from_db(conn, habit_id, commit=False))
+
+    def submit_import(self, rows: Iterable[Tuple[str, datetime.datetime]]) -> Future:
+        """Queues a batch of (habit_name, timestamp) rows; the future resolves to its importer.ImportResult."""
+        rows = list(rows)
+        return self._submit(lambda conn: importer.import_rows(conn, rows, commit=False))
+
+    def close(self) -> None:
+        """Commits everything still queued, then stops the writer thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def __enter__(self) -> "WriteQueue":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _next_batch(self) -> Tuple[List[_Operation], bool]:
+        """Blocks for the first operation, then collects more until the batch is full or its deadline passes."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List[_Operation]) -> None:
+        """Applies a batch in one transaction. A failing operation is rolled back alone via its savepoint."""
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for operation, future in batch:
+                conn.execute("SAVEPOINT operation")
+                try:
+                    results.append((future, operation(conn), None))
+                    conn.execute("RELEASE operation")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO operation")
+                    conn.execute("RELEASE operation")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches_committed += 1
+        for future, result, error in results:
+            if error is None:
+                self.operations_committed += 1
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _run(self) -> None:
+        try:
+            conn = connections.open_connection(self.db_path, profile=self.profile)
+            migrations.apply_migrations(conn)
+            conn.isolation_level = None  # Transactions are managed explicitly, one per batch.
+        except sqlite3.Error as e:
+            self._startup_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._commit_batch(conn, batch)
+        finally:
+            conn.close()